@@ -0,0 +1,6 @@
+"""
+righteous benchmarks
+
+Timings of the client hot paths against `righteous.testing.FakeRightScale`,
+run offline with ``python -m benchmarks``
+"""
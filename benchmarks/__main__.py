@@ -0,0 +1,58 @@
+"""
+Run the righteous benchmarks against a local fake RightScale API, with
+python -m benchmarks
+
+Usage:
+  benchmarks [options] [<benchmark>...]
+  benchmarks --list
+
+Options:
+  -l --list                  List the available benchmarks.
+  -n N --repeat=N            Timed iterations of each benchmark, defaults to
+                             the benchmark's own.
+  --latency=SECONDS          Simulated request latency [default: 0.005]
+  -o FILE --output=FILE      Save results as JSON [default: benchmark.json]
+  --compare=FILE             Compare median timings with saved results.
+  --threshold=FRACTION       Slow down reported as a regression [default: 0.2]
+  -h --help                  Show this screen.
+"""
+import json
+import sys
+
+from docopt import docopt
+
+from . import client, startup
+from .harness import BENCHMARKS, run, save, compare
+
+hush_pyflakes = (client, startup)
+
+
+def main():
+    arguments = docopt(__doc__)
+    if arguments['--list']:
+        for name in BENCHMARKS:
+            print(name)
+        return 0
+
+    names = arguments['<benchmark>']
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        sys.exit('Unknown benchmarks: %s' % ', '.join(unknown))
+
+    baseline = None
+    if arguments['--compare']:
+        with open(arguments['--compare']) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    repeat = arguments['--repeat'] and int(arguments['--repeat'])
+    results = run(names, float(arguments['--latency']), repeat)
+    save(results, arguments['--output'])
+
+    if baseline and compare(
+            results, baseline, float(arguments['--threshold'])):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
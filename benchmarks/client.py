@@ -0,0 +1,90 @@
+"""
+benchmarks.client
+
+API and CLI benchmarks
+"""
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+from six import StringIO
+
+import righteous
+from righteous import cli
+from righteous.api.base import lookup_by_href_or_nickname, _lookup_cache
+from .harness import benchmark
+
+
+def _list_servers(fake, iteration):
+    righteous.list_servers()
+
+
+def _iter_servers(fake, iteration):
+    for server in righteous.iter_servers():
+        pass
+
+
+for servers, repeat in ((10, 50), (1000, 20), (10000, 5)):
+    benchmark('list_servers[%s]' % servers, servers, repeat)(_list_servers)
+    benchmark('iter_servers[%s]' % servers, servers, repeat)(_iter_servers)
+
+
+@benchmark('iter_servers[10000][typed]', servers=10000, repeat=5)
+def iter_servers_typed(fake, iteration):
+    for server in righteous.iter_servers(typed=True):
+        pass
+
+
+@benchmark('lookup_nickname', servers=1000)
+def lookup_nickname(fake, iteration):
+    _lookup_cache().clear()
+    lookup_by_href_or_nickname(
+        None, 'server-0-%s' % max(iteration, 0), righteous.find_server,
+        resource='server')
+
+
+@benchmark('lookup_nickname[cached]', servers=1000, repeat=200)
+def lookup_nickname_cached(fake, iteration):
+    lookup_by_href_or_nickname(
+        None, 'server-0-1', righteous.find_server, resource='server')
+
+
+@benchmark('create_and_start_server')
+def create_and_start_server(fake, iteration):
+    righteous.create_and_start_server(
+        'benchmark-%s' % iteration, 'm1.small',
+        server_template_parameters={'EMAIL': 'text:user@example.com'})
+
+
+def _cli(arguments):
+    """
+    Runs the CLI with a configuration pointing at the fake API, discarding
+    its output
+    """
+    argv, stdout = sys.argv, sys.stdout
+    sys.argv = ['righteous', '--config', _cli.config_file,
+                '--no-daemon'] + arguments
+    sys.stdout = StringIO()
+    try:
+        cli.main()
+    finally:
+        sys.argv, sys.stdout = argv, stdout
+
+
+def _write_cli_config(fake):
+    directory = tempfile.mkdtemp(prefix='righteous-benchmark')
+    atexit.register(shutil.rmtree, directory, True)
+    _cli.config_file = os.path.join(directory, 'righteous.config')
+    fake.write_config(_cli.config_file)
+
+
+@benchmark('cli_list', servers=10, setup=_write_cli_config)
+def cli_list(fake, iteration):
+    _cli(['list'])
+
+
+@benchmark('cli_status', servers=10, setup=_write_cli_config)
+def cli_status(fake, iteration):
+    _cli(['status', 'server-0-0', 'server-0-1', 'server-0-2'])
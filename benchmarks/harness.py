@@ -0,0 +1,148 @@
+"""
+benchmarks.harness
+
+Registry, measurement and reporting of benchmarks
+"""
+import json
+import math
+import platform
+import sys
+import time
+from collections import OrderedDict
+
+import righteous
+from righteous.testing import FakeRightScale
+
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(name, servers=10, repeat=20, setup=None):
+    """
+    Registers a benchmark, a function called with the running fake API and
+    the iteration number, once per timed iteration
+
+    :param name: String identifying the benchmark
+    :param servers: (optional) number of servers in the fake deployment
+    :param repeat: (optional) default number of timed iterations
+    :param setup: (optional) function called with the fake API before the
+                  warm up iteration
+    """
+    def register(function):
+        BENCHMARKS[name] = dict(
+            name=name, function=function, servers=servers, repeat=repeat,
+            setup=setup)
+        return function
+    return register
+
+
+def percentile(samples, percent):
+    """
+    Nearest rank percentile of a list of samples
+    """
+    ordered = sorted(samples)
+    index = int(math.ceil(percent / 100.0 * len(ordered))) - 1
+    return ordered[max(0, index)]
+
+
+def measure(definition, latency=0, repeat=None):
+    """
+    Runs a benchmark against a fresh fake API
+
+    :param definition: dict of a registered benchmark
+    :param latency: (optional) seconds of simulated latency per request
+    :param repeat: (optional) number of timed iterations, defaults to the
+                   benchmark's own
+    :return: dict of timings in seconds (`min`, `mean`, `p50`, `p90`,
+             `p99`, `max`) and of the requests and body bytes per iteration
+    """
+    repeat = repeat or definition['repeat']
+    fake = FakeRightScale(servers=definition['servers'], latency=latency,
+                          boot_time=0)
+    with fake:
+        fake.initialise()
+        righteous.login()
+        if definition['setup']:
+            definition['setup'](fake)
+        # warm up the connection pool and caches
+        definition['function'](fake, -1)
+
+        fake.reset_stats()
+        samples = []
+        for iteration in range(repeat):
+            start = time.time()
+            definition['function'](fake, iteration)
+            samples.append(time.time() - start)
+        stats = dict(fake.stats)
+    righteous.close_session()
+
+    return OrderedDict([
+        ('servers', definition['servers']),
+        ('repeat', repeat),
+        ('min', min(samples)),
+        ('mean', sum(samples) / len(samples)),
+        ('p50', percentile(samples, 50)),
+        ('p90', percentile(samples, 90)),
+        ('p99', percentile(samples, 99)),
+        ('max', max(samples)),
+        ('requests', stats['requests'] / float(repeat)),
+        ('request_bytes', stats['bytes_received'] / float(repeat)),
+        ('response_bytes', stats['bytes_sent'] / float(repeat)),
+    ])
+
+
+def run(names=None, latency=0, repeat=None, output=sys.stdout):
+    """
+    Runs benchmarks and reports each as it completes
+
+    :param names: (optional) list of benchmark names, all by default
+    :return: dict of the environment and results, as saved by `save`
+    """
+    results = OrderedDict()
+    for name in names or BENCHMARKS:
+        results[name] = measure(BENCHMARKS[name], latency, repeat)
+        output.write(format_result(name, results[name]) + '\n')
+        output.flush()
+    return OrderedDict([
+        ('righteous', righteous.__version__),
+        ('python', platform.python_version()),
+        ('implementation', platform.python_implementation()),
+        ('timestamp', time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())),
+        ('latency', latency),
+        ('benchmarks', results),
+    ])
+
+
+def format_result(name, result):
+    return '%-32s p50 %9.2fms  p90 %9.2fms  p99 %9.2fms  %6.1f req  %10d B' % (
+        name, result['p50'] * 1000, result['p90'] * 1000,
+        result['p99'] * 1000, result['requests'],
+        result['request_bytes'] + result['response_bytes'])
+
+
+def save(results, path):
+    with open(path, 'w') as output_file:
+        json.dump(results, output_file, indent=2)
+
+
+def compare(results, baseline, threshold=0.2, output=sys.stdout):
+    """
+    Reports the median timing ratio of each benchmark to a baseline
+
+    :param results: dict returned by `run`
+    :param baseline: dict of previously saved results
+    :param threshold: (optional) fraction of slow down reported as a
+                      regression
+    :return: list of the names of regressed benchmarks
+    """
+    regressions = []
+    for name, result in results['benchmarks'].items():
+        previous = baseline['benchmarks'].get(name)
+        if not previous:
+            continue
+        ratio = result['p50'] / previous['p50'] if previous['p50'] else 1
+        regressed = ratio > 1 + threshold
+        if regressed:
+            regressions.append(name)
+        output.write('%-32s %5.2fx%s\n' % (
+            name, ratio, '  REGRESSION' if regressed else ''))
+    return regressions
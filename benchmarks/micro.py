@@ -0,0 +1,111 @@
+"""
+Micro-benchmarks of the per-request overhead of reading settings, comparing
+`righteous.config.Settings` with the previous shared dict settings object
+that overrode `__getattribute__`, with python -m benchmarks.micro
+
+Usage:
+  micro [options]
+
+Options:
+  -n N --number=N            Calls timed per repeat [default: 100000]
+  -r N --repeat=N            Repeats, the fastest is reported [default: 5]
+  -o FILE --output=FILE      Save the results as JSON.
+  -h --help                  Show this screen.
+"""
+import json
+import timeit
+from collections import OrderedDict
+
+from docopt import docopt
+
+from righteous import config
+from righteous.api.base import _build_headers, _build_url
+
+
+class LegacySettings(object):
+    """
+    The settings object before slots, all instances share one dict and
+    every attribute read goes through `__getattribute__`
+    """
+    _singleton = {}
+    __attrs__ = []
+
+    def __init__(self, **kwargs):
+        self.__dict__ = self._singleton
+
+    def __getattribute__(self, key):
+        if key in object.__getattribute__(self, '__attrs__'):
+            try:
+                return object.__getattribute__(self, key)
+            except AttributeError:
+                return None
+        return object.__getattribute__(self, key)
+
+
+def _read_settings():
+    settings = config.active_settings()
+    return (settings.account_id, settings.cookies, settings.debug,
+            settings.hooks, settings.response_cache, settings.session)
+
+
+def _prepare_request():
+    _build_url('/servers.js')
+    _build_headers({'Content-Type': 'application/x-www-form-urlencoded'})
+
+
+BENCHMARKS = OrderedDict([
+    ('read_settings', _read_settings),
+    ('build_url_and_headers', _prepare_request),
+])
+
+
+def _settings(settings_class):
+    settings = settings_class()
+    for name, default in config.DEFAULTS:
+        setattr(settings, name, default)
+    settings.account_id = '1234'
+    settings.cookies = '_session_id=cookie'
+    return settings
+
+
+def run(number, repeat):
+    """
+    Times each benchmark with both settings objects
+
+    :return: dict of benchmark name to the nanoseconds per call with each
+             settings class and their ratio
+    """
+    results = OrderedDict()
+    original = config.settings
+    try:
+        for name, function in BENCHMARKS.items():
+            timings = {}
+            for settings_class in (LegacySettings, config.Settings):
+                config.settings = _settings(settings_class)
+                timings[settings_class] = min(timeit.repeat(
+                    function, number=number, repeat=repeat)) / number * 1e9
+            results[name] = OrderedDict([
+                ('legacy_ns', timings[LegacySettings]),
+                ('slotted_ns', timings[config.Settings]),
+                ('speedup', timings[LegacySettings] /
+                 timings[config.Settings]),
+            ])
+    finally:
+        config.settings = original
+    return results
+
+
+def main():
+    arguments = docopt(__doc__)
+    results = run(int(arguments['--number']), int(arguments['--repeat']))
+    for name, result in results.items():
+        print('%-24s legacy %8.1fns  slotted %8.1fns  %5.2fx' % (
+            name, result['legacy_ns'], result['slotted_ns'],
+            result['speedup']))
+    if arguments['--output']:
+        with open(arguments['--output'], 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
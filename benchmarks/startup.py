@@ -0,0 +1,47 @@
+"""
+benchmarks.startup
+
+Start up time of new interpreters importing righteous and running the CLI,
+against a bare interpreter as a reference
+"""
+import os
+import subprocess
+import sys
+
+import righteous
+from .harness import benchmark
+
+# the tree benchmarked, rather than any installed righteous
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(righteous.__file__)))
+
+
+def _python(*arguments):
+    """
+    Runs a new interpreter importing this tree, discarding its output
+    """
+    environment = dict(os.environ)
+    environment['PYTHONPATH'] = os.pathsep.join(
+        path for path in (ROOT, environment.get('PYTHONPATH')) if path)
+    with open(os.devnull, 'w') as devnull:
+        subprocess.check_call(
+            (sys.executable,) + arguments, env=environment, stdout=devnull)
+
+
+@benchmark('startup[python]', repeat=10)
+def startup_python(fake, iteration):
+    _python('-c', 'pass')
+
+
+@benchmark('startup[import]', repeat=10)
+def startup_import(fake, iteration):
+    _python('-c', 'import righteous')
+
+
+@benchmark('startup[cli --version]', repeat=10)
+def startup_cli_version(fake, iteration):
+    _python('-m', 'righteous.cli', '--version')
+
+
+@benchmark('startup[import API]', repeat=10)
+def startup_import_api(fake, iteration):
+    _python('-c', 'import righteous; righteous.list_servers')
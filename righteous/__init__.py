@@ -1,27 +1,72 @@
 __version__ = '0.5.0'
 __author__ = 'Michael Joseph'
 
-from .api.base import init, initialise, login
-from .api.server import (
-    list_servers, find_server, server_info,
-    server_settings, create_and_start_server, create_server,
-    set_server_parameters, start_server, stop_server, delete_server
-)
-from .api.server_template import (
-    list_server_templates, server_template_info, create_server_template,
-    delete_server_template
-)
-from .api.deployment import (
-    find_deployment, list_deployments, deployment_info, create_deployment,
-    delete_deployment, duplicate_deployment
-)
+import sys
+from importlib import import_module
 
-hush_pyflakes = (
-    init, initialise, login, list_servers, find_server, server_info,
-    server_settings, create_and_start_server, create_server,
-    set_server_parameters, start_server, stop_server, delete_server,
-    list_server_templates, server_template_info, create_server_template,
-    delete_server_template,
-    find_deployment, list_deployments, deployment_info, create_deployment,
-    delete_deployment, duplicate_deployment
+# modules of the public API, imported on first access of one of their names
+# so `import righteous` (and `righteous --version`) does not load requests.
+# Lazy loading needs module __getattr__ (PEP 562, Python 3.7+), older
+# versions import every module up front
+EXPORTS = (
+    ('api.base', (
+        'init', 'initialise', 'login', 'close_session', 'lookup_cache_stats',
+        'retry_stats',
+    )),
+    ('api.hooks', ('add_hook', 'remove_hook')),
+    ('api.server', (
+        'list_servers', 'iter_servers', 'find_server', 'find_servers',
+        'server_info', 'server_settings', 'server_details',
+        'create_and_start_server', 'create_and_start_servers',
+        'create_server', 'set_server_parameters', 'start_server',
+        'stop_server', 'delete_server', 'start_servers', 'stop_servers',
+        'delete_servers', 'wait_for_state',
+    )),
+    ('api.server_template', (
+        'list_server_templates', 'iter_server_templates',
+        'server_template_info', 'create_server_template',
+        'delete_server_template',
+    )),
+    ('api.deployment', (
+        'find_deployment', 'list_deployments', 'iter_deployments',
+        'deployment_info', 'create_deployment', 'delete_deployment',
+        'duplicate_deployment',
+    )),
+    ('client', ('Client',)),
 )
+
+_MODULES = dict(
+    (name, module) for module, names in EXPORTS for name in names)
+__all__ = sorted(_MODULES)
+
+# submodules readable as attributes before they are imported, e.g.
+# `righteous.config.settings`
+SUBMODULES = ('api', 'client', 'config', 'util')
+
+
+def _load(name):
+    """
+    Internal helper importing the module of an exported name (or a
+    submodule) and caching the name as a module attribute
+    """
+    if name in _MODULES:
+        value = getattr(
+            import_module('.' + _MODULES[name], __name__), name)
+    elif name in SUBMODULES:
+        value = import_module('.' + name, __name__)
+    else:
+        raise AttributeError(
+            'module %r has no attribute %r' % (__name__, name))
+    globals()[name] = value
+    return value
+
+
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        return _load(name)
+
+    def __dir__():
+        return sorted(set(globals()) | set(_MODULES) | set(SUBMODULES))
+else:
+    for _name in _MODULES:
+        _load(_name)
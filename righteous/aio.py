@@ -0,0 +1,662 @@
+# coding: utf-8
+"""
+righteous.aio
+
+asyncio implementation of the core righteous API for Python 3.8+ (settings
+are resolved per task through contextvars). Requests are made with aiohttp
+(installed separately) on a pooled session, sharing URL and header
+construction, request bodies, settings, the nickname lookup cache, rate
+limiting, retries and instrumentation hooks with the synchronous API.
+
+Not available asynchronously: the conditional GET response cache, typed
+results, `filters` and `fields` of the list functions, the `deployment_id`
+of `find_servers`, `iter_*`, `create_and_start_servers` and
+`wait_for_state`.
+"""
+import asyncio
+import json
+import sys
+import time
+
+if sys.version_info < (3, 8):
+    raise ImportError('righteous.aio requires Python 3.8+')
+
+from requests.structures import CaseInsensitiveDict
+
+from . import config
+from .compat import urlencode, quote
+from .api.base import (
+    init, initialise, debug, _build_url, _build_headers, _build_auth_headers,
+    _cookie_expiry, _lookup_cache, _cache_lookup, _invalidate_lookup,
+    _rate_limiter, _retry_counter, _retry_delay, _retry_limit,
+    lookup_cache_stats,
+    retry_stats, REAUTHENTICATE_STATUS_CODES
+)
+from .api.hooks import RequestEvent, emit, calling_function, working_for
+from .api.server import (
+    NICKNAME_LOOKUPS, SERVER_OPERATIONS, _create_server_data,
+    _server_parameters_data
+)
+from .api.server_template import _extract_template_id
+
+hush_pyflakes = (init, initialise, lookup_cache_stats, retry_stats)
+
+
+class Response(object):
+    """
+    The parts of `requests.Response` used by righteous, read from an aiohttp
+    response
+    """
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = content
+
+
+async def _session():
+    """
+    Internal coroutine returning the pooled `aiohttp.ClientSession` of the
+    running event loop, created from the connection pool settings on first
+    use. Sessions of event loops that were closed, e.g. by a previous
+    `asyncio.run`, are discarded.
+    """
+    settings = config.active_settings()
+    loop = asyncio.get_event_loop()
+    sessions = await _sessions(settings)
+    session = sessions.get(loop)
+    if session is None or session.closed:
+        import aiohttp
+        connector = aiohttp.TCPConnector(
+            limit=settings.pool_connections * settings.pool_maxsize,
+            limit_per_host=settings.pool_maxsize,
+            force_close=not settings.keep_alive)
+        session = sessions[loop] = aiohttp.ClientSession(connector=connector)
+    return session
+
+
+async def _sessions(settings):
+    """
+    Internal coroutine returning the sessions of settings by event loop,
+    after closing those of loops closed without `close_session`: their
+    connections are released without waiting on the closed loop
+    """
+    sessions = settings.aio_sessions
+    for loop in [loop for loop in sessions if loop.is_closed()]:
+        await sessions.pop(loop).close()
+    return sessions
+
+
+async def close_session():
+    """
+    Closes the pooled aiohttp session of the running event loop and its
+    connections
+    """
+    sessions = await _sessions(config.active_settings())
+    session = sessions.pop(asyncio.get_event_loop(), None)
+    if session is not None:
+        await session.close()
+
+
+async def _request(
+        path, method='GET', body=None, headers={}, prepend_api_base=True):
+    """
+    Internal coroutine to make API requests
+    """
+    settings = config.active_settings()
+    path = _build_url(path, prepend_api_base)
+    headers = _build_headers(headers=headers)
+    debug('%s to %s with data=%s, headers=%s', method, path, body, headers,
+          method=method, url=path, body=body, headers=headers)
+    # the calling API function is only looked up for instrumentation hooks
+    function = calling_function() if settings.hooks else None
+    response = await _send(method, path, body, headers, function)
+
+    if (response.status_code in REAUTHENTICATE_STATUS_CODES and
+            settings.cookies and not path.endswith('/login')):
+        debug('%s: session expired, logging in again', response.status_code)
+        if await _login_once(settings, headers.get('Cookie')):
+            headers['Cookie'] = settings.cookies
+            response = await _send(method, path, body, headers, function)
+    return response
+
+
+async def _login_once(settings, expired_cookies):
+    """
+    Internal coroutine logging in again after `expired_cookies` were
+    rejected, only one of the concurrent tasks logs in
+    """
+    # asyncio locks can only be used by the event loop they were used in
+    loop = asyncio.get_event_loop()
+    loop_and_lock = settings.aio_login_lock
+    if loop_and_lock is None or loop_and_lock[0] is not loop:
+        loop_and_lock = settings.aio_login_lock = (loop, asyncio.Lock())
+    async with loop_and_lock[1]:
+        if settings.cookies != expired_cookies:
+            return bool(settings.cookies)
+        return await login()
+
+
+async def _send(method, url, body, headers, function=None):
+    """
+    Internal coroutine sending a request on the pooled session, rate limited,
+    retried and reported to hooks like `righteous.api.base._send`
+    """
+    import aiohttp
+    settings = config.active_settings()
+    retries = _retry_limit(settings, method)
+    limiter = _rate_limiter()
+    attempt = 0
+    while True:
+        if limiter is not None:
+            await asyncio.sleep(limiter.reserve())
+        hooks = settings.hooks
+        if hooks:
+            event = RequestEvent(
+                method, url, function, attempt, len(body) if body else 0)
+            emit(hooks, 'before_send', event)
+            start = time.time()
+        try:
+            session = await _session()
+            async with session.request(
+                    method, url, data=body, headers=headers) as response:
+                content = await response.read()
+        except Exception as e:
+            if hooks:
+                event.elapsed = time.time() - start
+                event.error = e
+                emit(hooks, 'on_error', event)
+            if (not isinstance(e, (aiohttp.ClientConnectionError,
+                                   asyncio.TimeoutError))
+                    or attempt >= retries):
+                raise
+            reason, delay = e.__class__.__name__, _retry_delay(attempt)
+        else:
+            debug('response: %s', response.headers, method=method, url=url,
+                  status_code=response.status)
+            response = Response(response.status, response.headers, content)
+            if hooks:
+                event.elapsed = time.time() - start
+                event.status_code = response.status_code
+                event.response_bytes = len(content)
+                emit(hooks, 'after_response', event)
+            if (attempt >= retries or response.status_code not in
+                    settings.retry_status_codes):
+                return response
+            reason = response.status_code
+            delay = _retry_delay(attempt, response)
+
+        attempt += 1
+        _retry_counter().increment(method, reason)
+        if hooks:
+            event.reason, event.delay = reason, delay
+            emit(hooks, 'on_retry', event)
+        debug('Retrying %s %s (%s) in %.2fs, attempt %s of %s',
+              method, url, reason, delay, attempt, retries, method=method,
+              url=url, reason=reason, delay=delay, attempt=attempt)
+        await asyncio.sleep(delay)
+
+
+async def _gather(coroutine_function, items, jobs=None):
+    """
+    Internal helper awaiting a coroutine per item, at most `jobs` at a time
+
+    :return: list of `(item, result, exception)` tuples in the order of items
+    """
+    settings = config.active_settings()
+    semaphore = asyncio.Semaphore(jobs or settings.concurrency)
+    # requests of the tasks are attributed to the gathering API coroutine
+    caller = calling_function() if settings.hooks else None
+
+    async def call(item):
+        async with semaphore:
+            try:
+                with working_for(caller):
+                    return item, await coroutine_function(item), None
+            except Exception as e:
+                return item, None, e
+
+    return await asyncio.gather(*[call(item) for item in items])
+
+
+async def login(username=None, password=None, account_id=None):
+    """
+    Logins to RightScale and stores the auth cookie for future requests,
+    see `righteous.login`
+    """
+    settings = config.active_settings()
+    if not username or not password or not account_id:
+        username = settings.username
+        password = settings.password
+        account_id = settings.account_id
+
+    if not username or not password or not account_id:
+        raise Exception(
+            'Username, password or account_id not specified in configuration '
+            'or as an API parameter')
+
+    response = await _request(
+        '/login', headers=_build_auth_headers(username, password))
+
+    if response.status_code == 204:
+        settings.cookies = response.headers['set-cookie']
+        settings.cookies_expires = _cookie_expiry(settings.cookies)
+        settings.username = username
+        settings.password = password
+        return True
+
+    return False
+
+
+async def _lookup(href, nickname, find_function, resource):
+    """
+    Asynchronous `righteous.api.base.lookup_by_href_or_nickname`
+    """
+    if not nickname and not href:
+        raise ValueError('Either nickname or href must be specified')
+
+    if href:
+        return href
+    href = _lookup_cache().get(resource, nickname)
+    if href:
+        return href
+
+    item = await find_function(nickname)
+    if item and 'href' in item:
+        _cache_lookup(resource, nickname, item['href'])
+        return item['href']
+    raise Exception('No item nicknamed %s found' % nickname)
+
+
+async def _lookup_server(server_href, nickname):
+    return await _lookup(server_href, nickname, find_server, 'server')
+
+
+async def _lookup_deployment(deployment_href, nickname):
+    return await _lookup(
+        deployment_href, nickname, find_deployment, 'deployment')
+
+
+async def list_servers(deployment_id=None):
+    """
+    Lists servers in a deployment, see `righteous.list_servers`
+    """
+    if not deployment_id:
+        deployment_id = config.active_settings().default_deployment_id
+
+    if not deployment_id:
+        raise Exception(
+            'Deployment id not specified in configuration or as an API '
+            'parameter')
+
+    response = await _request('/deployments/%s.js' % deployment_id)
+    return json.loads(response.content)
+
+
+async def find_server(nickname):
+    """
+    Finds a server based on nickname, see `righteous.find_server`
+    """
+    response = await _request(
+        '/servers.js?filter=nickname=%s' % quote(nickname))
+    servers = json.loads(response.content)
+    return servers[0] if len(servers) else None
+
+
+async def _find_exact_server(nickname):
+    """
+    Asynchronous `righteous.api.server._find_exact_server`
+    """
+    response = await _request(
+        '/servers.js?filter=nickname=%s' % quote(nickname))
+    for server in json.loads(response.content):
+        if server.get('nickname') == nickname:
+            return server
+    return None
+
+
+async def find_servers(nicknames):
+    """
+    Finds many servers based on nickname, see `righteous.find_servers`
+    """
+    nicknames = set(nicknames)
+    if not nicknames:
+        return {}
+
+    found = {}
+    if len(nicknames) <= NICKNAME_LOOKUPS:
+        for nickname, server, error in await _gather(
+                _find_exact_server, sorted(nicknames)):
+            if error:
+                raise error
+            if server:
+                found[nickname] = server
+                _cache_lookup('server', nickname, server['href'])
+        return found
+
+    response = await _request('/servers.js')
+    for server in json.loads(response.content):
+        nickname = server.get('nickname')
+        if nickname in nicknames and nickname not in found:
+            found[nickname] = server
+            _cache_lookup('server', nickname, server['href'])
+    return found
+
+
+async def server_info(server_href, nickname=None):
+    """
+    Detailed server information, see `righteous.server_info`
+    """
+    response = await _request(
+        '%s.js' % await _lookup_server(server_href, nickname),
+        prepend_api_base=False)
+    return json.loads(response.content)
+
+
+async def server_settings(server_href, nickname=None):
+    """
+    Current server settings, see `righteous.server_settings`
+    """
+    response = await _request(
+        '%s/settings.js' % await _lookup_server(server_href, nickname),
+        prepend_api_base=False)
+    return json.loads(response.content)
+
+
+async def server_details(server_hrefs, jobs=None):
+    """
+    Concurrently retrieves the information and settings of many servers,
+    see `righteous.server_details`
+    """
+    details = [
+        dict(href=server_href, info=None, settings=None, error=None)
+        for server_href in server_hrefs
+    ]
+    queries = [
+        (index, key, function)
+        for index in range(len(details))
+        for key, function in (('info', server_info),
+                              ('settings', server_settings))
+    ]
+
+    async def query(arguments):
+        index, key, function = arguments
+        return await function(details[index]['href'])
+
+    for arguments, result, error in await _gather(query, queries, jobs):
+        index, key, _ = arguments
+        if error:
+            details[index]['error'] = details[index]['error'] or error
+        else:
+            details[index][key] = result
+    return details
+
+
+async def start_server(server_href, nickname=None):
+    """
+    Starts a server, see `righteous.start_server`
+    """
+    return await _request(
+        '%s/start' % await _lookup_server(server_href, nickname),
+        method='POST', prepend_api_base=False)
+
+
+async def stop_server(server_href, nickname=None):
+    """
+    Stops a server, see `righteous.stop_server`
+    """
+    response = await _request(
+        '%s/stop' % await _lookup_server(server_href, nickname),
+        method='POST', prepend_api_base=False)
+    return response.status_code == 201
+
+
+async def delete_server(server_href, nickname=None):
+    """
+    Deletes a server from RightScale, see `righteous.delete_server`
+    """
+    server_href = await _lookup_server(server_href, nickname)
+    _invalidate_lookup('server', nickname=nickname, href=server_href)
+    response = await _request(
+        server_href, method='DELETE', prepend_api_base=False)
+    return response.status_code == 200
+
+
+async def _server_operations(operation, server_hrefs, nicknames, jobs):
+    """
+    Asynchronous `righteous.api.server._server_operations`
+    """
+    path, method, success_code = SERVER_OPERATIONS[operation]
+    results = {}
+    targets = [
+        (server_href, server_href) for server_href in server_hrefs or []]
+
+    nicknames = nicknames or []
+    cache = _lookup_cache()
+    hrefs = dict((nickname, cache.get('server', nickname))
+                 for nickname in nicknames)
+    found = await find_servers(
+        [nickname for nickname, href in hrefs.items() if not href])
+    for nickname in nicknames:
+        href = hrefs[nickname] or found.get(nickname, {}).get('href')
+        if href:
+            targets.append((nickname, href))
+        else:
+            results[nickname] = dict(
+                href=None, success=False, status_code=None, location=None,
+                error=Exception('No server nicknamed %s found' % nickname))
+
+    async def perform(target):
+        return await _request(
+            path % target[1], method=method, prepend_api_base=False)
+
+    for target, response, error in await _gather(perform, targets, jobs):
+        key, server_href = target
+        if operation == 'delete':
+            _invalidate_lookup('server', href=server_href)
+        if error:
+            results[key] = dict(
+                href=server_href, success=False, status_code=None,
+                location=None, error=error)
+        else:
+            results[key] = dict(
+                href=server_href,
+                success=response.status_code == success_code,
+                status_code=response.status_code,
+                location=response.headers.get('location'), error=None)
+    return results
+
+
+async def start_servers(server_hrefs=None, nicknames=None, jobs=None):
+    """
+    Starts many servers concurrently, see `righteous.start_servers`
+    """
+    return await _server_operations('start', server_hrefs, nicknames, jobs)
+
+
+async def stop_servers(server_hrefs=None, nicknames=None, jobs=None):
+    """
+    Stops many servers concurrently, see `righteous.stop_servers`
+    """
+    return await _server_operations('stop', server_hrefs, nicknames, jobs)
+
+
+async def delete_servers(server_hrefs=None, nicknames=None, jobs=None):
+    """
+    Deletes many servers concurrently, see `righteous.delete_servers`
+    """
+    return await _server_operations('delete', server_hrefs, nicknames, jobs)
+
+
+async def create_server(
+        nickname, instance_type, create_server_parameters=None):
+    """
+    Create a server, see `righteous.create_server`
+    """
+    create_data = _create_server_data(
+        nickname, instance_type, create_server_parameters)
+
+    response = await _request(
+        '/servers', method='POST', body=urlencode(create_data))
+    _invalidate_lookup('server', nickname=nickname)
+    location = response.headers.get('location')
+    debug('Created server %s: %s (%s:%s)',
+          nickname, location, response.status_code, response.content)
+    return location
+
+
+async def set_server_parameters(server_href, parameters):
+    """
+    Updates/sets any ServerTemplate parameters for a server,
+    see `righteous.set_server_parameters`
+    """
+    return await _request(
+        server_href, method='PUT', body=_server_parameters_data(parameters),
+        headers={'Content-Type': 'application/x-www-form-urlencoded'},
+        prepend_api_base=False)
+
+
+async def create_and_start_server(
+        nickname, instance_type, create_server_parameters=None,
+        server_template_parameters=None):
+    """
+    Creates and starts a server, see `righteous.create_and_start_server`
+    """
+    server_href = await create_server(
+        nickname, instance_type, create_server_parameters)
+
+    if not server_href:
+        return False, None
+
+    location = None
+    if server_template_parameters:
+        await set_server_parameters(server_href, server_template_parameters)
+
+    start_server_response = await start_server(server_href)
+    success = start_server_response.status_code == 201
+    if success:
+        location = start_server_response.headers['location']
+    else:
+        debug('Start server %s failed with %s',
+              server_href, start_server_response.content)
+    return success, location
+
+
+async def list_server_templates():
+    """
+    Lists ServerTemplates, see `righteous.list_server_templates`
+    """
+    response = await _request('/server_templates.js')
+    return json.loads(response.content)
+
+
+async def server_template_info(template_href):
+    """
+    Details ServerTemplate information, see `righteous.server_template_info`
+    """
+    response = await _request(
+        '/server_templates/%s.js' % _extract_template_id(template_href))
+    template = json.loads(response.content)
+    return template if template else None
+
+
+async def create_server_template(
+        nickname, description, multi_cloud_image_href):
+    """
+    Create a new ServerTemplate, see `righteous.create_server_template`
+    """
+    location = None
+    create_data = {
+        'server_template[nickname]': nickname,
+        'server_template[description]': description,
+        'server_template[multi_cloud_image_href]': multi_cloud_image_href,
+    }
+
+    response = await _request(
+        '/server_templates', method='POST', body=urlencode(create_data))
+    success = response.status_code == 201
+    if success:
+        location = response.headers.get('location')
+    return success, location
+
+
+async def delete_server_template(server_template_href):
+    """
+    Deletes a ServerTemplate, see `righteous.delete_server_template`
+    """
+    response = await _request(
+        '/server_templates/%s.js' % _extract_template_id(server_template_href),
+        method='DELETE')
+    return response.status_code == 200
+
+
+async def list_deployments():
+    """
+    Lists server deployment in an account, see `righteous.list_deployments`
+    """
+    response = await _request('/deployments.js')
+    return json.loads(response.content)
+
+
+async def find_deployment(nickname):
+    """
+    Finds a server deployment based on nickname,
+    see `righteous.find_deployment`
+    """
+    response = await _request(
+        '/deployments.js?filter=nickname=%s' % quote(nickname))
+    deployments = json.loads(response.content)
+    return deployments[0] if len(deployments) else None
+
+
+async def deployment_info(deployment_href, nickname=None):
+    """
+    Detailed server deployment information, see `righteous.deployment_info`
+    """
+    response = await _request(
+        '%s.js' % await _lookup_deployment(deployment_href, nickname),
+        prepend_api_base=False)
+    return json.loads(response.content)
+
+
+async def create_deployment(nickname, description):
+    """
+    Creates a server deployment, see `righteous.create_deployment`
+    """
+    location = None
+    create_data = {'deployment[nickname]': nickname,
+                   'deployment[description]': description}
+    response = await _request(
+        '/deployments', method='POST', body=urlencode(create_data))
+    _invalidate_lookup('deployment', nickname=nickname)
+
+    success = response.status_code == 201
+    if success:
+        location = response.headers.get('location')
+    return success, location
+
+
+async def delete_deployment(deployment_href, nickname=None):
+    """
+    Deletes a server deployment, see `righteous.delete_deployment`
+    """
+    deployment_href = await _lookup_deployment(deployment_href, nickname)
+    _invalidate_lookup('deployment', nickname=nickname, href=deployment_href)
+    response = await _request(
+        deployment_href, method='DELETE', prepend_api_base=False)
+    return response.status_code == 200
+
+
+async def duplicate_deployment(deployment_href, nickname=None):
+    """
+    Duplicates a server deployment, see `righteous.duplicate_deployment`
+    """
+    location = None
+    response = await _request(
+        '%s/duplicate' % await _lookup_deployment(deployment_href, nickname),
+        method='POST', prepend_api_base=False)
+
+    success = response.status_code == 201
+    if success:
+        location = response.headers.get('location')
+    return success, location
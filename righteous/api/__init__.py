@@ -0,0 +1,14 @@
+import sys
+from importlib import import_module
+
+# modules of the functions exported by `righteous`, readable as attributes
+# before they are imported, e.g. `righteous.api.deployment`, on Python 3.7+
+# (PEP 562), older versions import them all with `righteous`
+SUBMODULES = ('base', 'hooks', 'server', 'server_template', 'deployment')
+
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        if name not in SUBMODULES:
+            raise AttributeError(
+                'module %r has no attribute %r' % (__name__, name))
+        return import_module('.' + name, __name__)
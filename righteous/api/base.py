@@ -4,24 +4,89 @@ righteous.api
 
 Implements the RightScale API for EC2 instance management.
 """
+import json
 import warnings
 import sys
 import base64
+import codecs
+import re
+import random
+import threading
+import time
+from email.utils import parsedate_tz, mktime_tz
 import six
-from logging import getLogger
+from six.moves import collections_abc
+from logging import getLogger, DEBUG
 from .. import config
+from .cache import LookupCache
+from .retry import TokenBucket, RetryCounter, retry_after
+from .hooks import RequestEvent, emit, calling_function
+from .filters import matches, project
 import requests
+from requests.exceptions import ConnectionError as RequestConnectionError
+from requests.exceptions import Timeout as RequestTimeout
 
 log = getLogger(__name__)
+_state_lock = threading.Lock()
 
+# responses triggering a transparent login when a session cookie has expired
+REAUTHENTICATE_STATUS_CODES = (401, 403)
 
-def debug(message, *args):
+# `initialise` key word arguments stored as settings, the others are server
+# creation parameters
+INITIALISE_SETTINGS = tuple(
+    name for name, _ in config.DEFAULTS if name not in (
+        'username', 'password', 'account_id', 'api_base',
+        'default_deployment_id', 'create_server_parameters'))
+
+# retries per request method when `config.settings.retries` omits it
+DEFAULT_RETRIES = dict(config.DEFAULTS)['retries']
+
+# bytes read at a time from streamed list responses
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _loggable(value):
+    """
+    Internal helper redacting `config.settings.debug_redact_headers` from
+    header mappings and truncating strings to `config.settings.debug_limit`
+    """
+    settings = config.active_settings()
+    if isinstance(value, collections_abc.Mapping):
+        redact = settings.debug_redact_headers
+        return dict(
+            (key, '<redacted>' if key.lower() in redact else item)
+            for key, item in value.items())
+    limit = settings.debug_limit
+    if (limit and isinstance(value, (six.binary_type, six.text_type)) and
+            len(value) > limit):
+        suffix = '... (%s more)' % (len(value) - limit)
+        if isinstance(value, six.binary_type):
+            suffix = suffix.encode('ascii')
+        return value[:limit] + suffix
+    return value
+
+
+def debug(message, *args, **fields):
     """
-    Logs debug messages
+    Logs debug messages, formatted only when `config.settings.debug` is set
+    or the logger is enabled for debug messages. Arguments are redacted and
+    truncated, keyword `fields` are added to structured (json) records.
     """
-    log.debug(message, *args)
-    if config.settings.debug:
-        config.settings.debug.write('%s\n' % (message % args))
+    settings = config.active_settings()
+    stream = settings.debug
+    if not stream and not log.isEnabledFor(DEBUG):
+        return
+
+    args = tuple(_loggable(arg) for arg in args)
+    fields = dict((key, _loggable(value)) for key, value in fields.items())
+    log.debug(message, *args, extra={'righteous': fields})
+    if stream:
+        if settings.debug_format == 'json':
+            fields.update(time=time.time(), message=message % args)
+            stream.write(json.dumps(fields, default=repr) + '\n')
+        else:
+            stream.write('%s\n' % (message % args))
 
 
 def _build_headers(headers=None):
@@ -31,24 +96,495 @@ def _build_headers(headers=None):
     request_headers = {'X-API-VERSION': '1.0'}
     if headers:
         request_headers.update(headers)
-    if config.settings.cookies:
-        request_headers['Cookie'] = config.settings.cookies
+    cookies = config.active_settings().cookies
+    if cookies:
+        request_headers['Cookie'] = cookies
     return request_headers
 
 
-def _request(path, method='GET', body=None, headers={}, prepend_api_base=True):
+def _session():
+    """
+    Internal helper returning the pooled, keep-alive `requests.Session` shared
+    by all API requests, created from the connection pool settings on first use
+    """
+    settings = config.active_settings()
+    session = settings.session
+    if session is not None:
+        return session
+
+    with _state_lock:
+        session = settings.session
+        if session is not None:
+            return session
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=settings.pool_connections,
+            pool_maxsize=settings.pool_maxsize,
+            max_retries=settings.max_retries,
+            pool_block=settings.pool_block)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        if not settings.keep_alive:
+            session.headers['Connection'] = 'close'
+        settings.session = session
+    return session
+
+
+def close_session():
+    """
+    Closes the pooled HTTP session and its connections, the next API request
+    opens a new session using the current connection pool settings
+    """
+    settings = config.active_settings()
+    session = settings.session
+    settings.session = None
+    if session is not None:
+        session.close()
+
+
+def _lookup_cache():
+    """
+    Internal helper returning the nickname to href `LookupCache`, created
+    from the lookup cache settings on first use
+    """
+    settings = config.active_settings()
+    cache = settings.lookup_cache
+    if cache is not None:
+        return cache
+
+    with _state_lock:
+        if settings.lookup_cache is None:
+            settings.lookup_cache = LookupCache(
+                max_size=settings.lookup_cache_size,
+                ttl=settings.lookup_cache_ttl)
+        return settings.lookup_cache
+
+
+def _cache_lookup(resource, nickname, href):
+    """
+    Internal helper to cache a nickname to href lookup
+    """
+    _lookup_cache().set(resource, nickname, href)
+
+
+def _invalidate_lookup(resource, nickname=None, href=None):
+    """
+    Internal helper to drop cached lookups of a created or deleted item
+    """
+    _lookup_cache().invalidate(resource, nickname=nickname, href=href)
+
+
+def lookup_cache_stats():
     """
-    Internal method to make API requests
+    Statistics of the nickname to href lookup cache
+
+    :return: dict with the keys `hits`, `misses`, `evictions` and `size`
+    """
+    return _lookup_cache().stats()
+
+
+def _account_url(settings):
+    """
+    Internal helper returning the API root of a settings object, defaulting
+    to `config.account_url`
+    """
+    return settings.account_url or config.account_url
+
+
+def _build_url(path, prepend_api_base=True):
+    """
+    Internal helper to build request URLs
     """
     if prepend_api_base:
-        path = config.account_url + config.settings.account_id + path
+        settings = config.active_settings()
+        return _account_url(settings) + settings.account_id + path
+    return path
+
+
+def _build_auth_headers(username, password):
+    """
+    Internal helper to build the basic authentication headers used to login
+    """
+    auth_hash = base64.b64encode(six.b('%s:%s' % (username, password)))
+    return {'Authorization': 'Basic %s' % auth_hash.decode('ascii')}
+
+
+class CachedResponse(object):
+    """
+    Response served from `config.settings.response_cache` when the API
+    answers a conditional GET with 304 Not Modified
+    """
+    status_code = 200
+
+    def __init__(self, response, entry):
+        self.headers = response.headers
+        self.content = entry['content']
+
+
+def _parse_json(response):
+    """
+    Internal helper to parse JSON responses, responses served from the
+    response cache are parsed again so callers get their own objects
+    """
+    return json.loads(response.content)
+
+
+class _JSONReader(object):
+    """
+    Internal helper decoding JSON values one at a time from an iterable of
+    byte chunks, only buffering the chunks of the value being decoded
+    """
+    decoder = json.JSONDecoder()
+    whitespace = re.compile(r'\s*')
+    digits = u'-0123456789'
+    delimiters = u' \t\n\r,:]}'
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.text = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = u''
+        self.position = 0
+        self.finished = False
+
+    def _read(self, size=0):
+        """
+        Appends the next chunk to the buffer, and more until it holds `size`
+        characters from the current position, returns False at the end
+        """
+        if self.finished:
+            return False
+        texts = [self.buffer[self.position:]]
+        length = len(texts[0])
+        while True:
+            chunk = next(self.chunks, None)
+            self.finished = chunk is None
+            texts.append(self.text.decode(chunk or b'', final=self.finished))
+            length += len(texts[-1])
+            if self.finished or length >= size:
+                break
+        self.buffer = u''.join(texts)
+        self.position = 0
+        return True
+
+    def peek(self):
+        """
+        Skips whitespace and returns the next character, '' at the end
+        """
+        while True:
+            self.position = self.whitespace.match(
+                self.buffer, self.position).end()
+            if self.position < len(self.buffer) or not self._read():
+                return self.buffer[self.position:self.position + 1]
+
+    def expect(self, characters):
+        """
+        Consumes and returns the next character, one of `characters`
+        """
+        character = self.peek()
+        if not character or character not in characters:
+            raise ValueError('Expecting one of %r, got %r' % (
+                characters, character))
+        self.position += 1
+        return character
+
+    def value(self):
+        """
+        Decodes and returns the next JSON value
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(
+                    self.buffer, self.position)
+            except ValueError:
+                # retried once the buffered value doubled in length, not on
+                # every chunk of it
+                if not self._read(2 * (len(self.buffer) - self.position)):
+                    raise
+                continue
+            # a number is only complete once followed by a delimiter, '[1.'
+            # of '[1.5]' may continue in the next chunk
+            if (self.buffer[self.position] not in self.digits or
+                    self.finished or (end < len(self.buffer) and
+                                      self.buffer[end] in self.delimiters)):
+                self.position = end
+                return value
+            self._read()
+
+
+def _iter_json(response, key=None, resource=None, filters=None, fields=None):
+    """
+    Internal helper incrementally parsing the items of a streamed JSON array
+    response, or of the array under `key` of a JSON object response, yielding
+    the items matching `filters` one at a time, projected to `fields` and as
+    `resource` records when given. The response is closed once the array is
+    read.
+    """
+    reader = _JSONReader(response.iter_content(STREAM_CHUNK_SIZE))
+    try:
+        if key is not None:
+            reader.expect('{')
+            if reader.peek() == '}':
+                return
+            while True:
+                name = reader.value()
+                reader.expect(':')
+                if name == key:
+                    break
+                reader.value()
+                if reader.expect(',}') == '}':
+                    return
+        reader.expect('[')
+        if reader.peek() == ']':
+            return
+        while True:
+            item = reader.value()
+            if not filters or matches(item, filters):
+                item = project(item, fields)
+                yield item if resource is None else resource.from_json(item)
+            if reader.expect(',]') == ']':
+                return
+    finally:
+        response.close()
+
+
+def _request(path, method='GET', body=None, headers={}, prepend_api_base=True,
+             stream=False):
+    """
+    Internal method to make API requests, GET responses are revalidated with
+    `config.settings.response_cache` when one is configured. Streamed
+    responses (`stream=True`) are not cached and their body is only read
+    when accessed.
+    """
+    settings = config.active_settings()
+    path = _build_url(path, prepend_api_base)
     headers = _build_headers(headers=headers)
-    debug('%s to %s with data=%s, headers=%s', method, path, body, headers)
-    response = requests.request(method, path, data=body, headers=headers)
-    debug('response: %s', response.headers)
+
+    response_cache = settings.response_cache
+    if method != 'GET' or stream or path.endswith('/login'):
+        response_cache = None
+    entry = response_cache.get(path) if response_cache is not None else None
+    if entry is not None:
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+
+    debug('%s to %s with data=%s, headers=%s', method, path, body, headers,
+          method=method, url=path, body=body, headers=headers)
+    # the calling API function is only looked up for instrumentation hooks
+    function = calling_function() if settings.hooks else None
+    response = _send(method, path, body, headers, function, stream)
+
+    if (response.status_code in REAUTHENTICATE_STATUS_CODES and
+            settings.cookies and not path.endswith('/login')):
+        debug('%s: session expired, logging in again', response.status_code)
+        if _login_once(settings, headers.get('Cookie')):
+            if stream:
+                response.close()
+            headers['Cookie'] = settings.cookies
+            response = _send(method, path, body, headers, function, stream)
+
+    if entry is not None and response.status_code == 304:
+        debug('%s not modified, using cached response', path)
+        return CachedResponse(response, entry)
+    if response_cache is not None and response.status_code == 200:
+        _cache_response(response_cache, path, response)
     return response
 
 
+def _login_once(settings, expired_cookies):
+    """
+    Internal helper logging in again after `expired_cookies` were rejected.
+    Only one of the threads sharing the settings logs in, the others wait
+    for it and reuse its session cookie.
+    """
+    lock = settings.login_lock
+    if lock is None:
+        with _state_lock:
+            if settings.login_lock is None:
+                settings.login_lock = threading.Lock()
+            lock = settings.login_lock
+
+    with lock:
+        if settings.cookies != expired_cookies:
+            debug('Session already renewed by another thread')
+            return bool(settings.cookies)
+        return login()
+
+
+def _rate_limiter():
+    """
+    Internal helper returning the `TokenBucket` shared by all threads, or
+    None when `config.settings.rate_limit` is not set
+    """
+    settings = config.active_settings()
+    if not settings.rate_limit:
+        return None
+    limiter = settings.rate_limiter
+    if limiter is not None:
+        return limiter
+
+    with _state_lock:
+        if settings.rate_limiter is None:
+            settings.rate_limiter = TokenBucket(
+                settings.rate_limit, settings.rate_limit_burst)
+        return settings.rate_limiter
+
+
+def _retry_counter():
+    """
+    Internal helper returning the `RetryCounter`, created on first use
+    """
+    settings = config.active_settings()
+    counter = settings.retry_counter
+    if counter is not None:
+        return counter
+
+    with _state_lock:
+        if settings.retry_counter is None:
+            settings.retry_counter = RetryCounter()
+        return settings.retry_counter
+
+
+def retry_stats():
+    """
+    Statistics of the requests retried
+
+    :return: dict with the keys `retries` (total), `methods` and `reasons`
+             (dicts of retries per HTTP method and per status code or
+             exception name)
+    """
+    return _retry_counter().stats()
+
+
+def _retry_delay(attempt, response=None):
+    """
+    Internal helper returning the seconds to wait before a retry, honouring
+    the Retry-After header of a response
+    """
+    settings = config.active_settings()
+    delay = min(settings.retry_max_backoff,
+                settings.retry_backoff * 2 ** attempt)
+    delay = random.uniform(delay / 2.0, delay)
+    if response is not None:
+        after = retry_after(response.headers.get('retry-after'))
+        if after is not None:
+            delay = max(delay, after)
+    return delay
+
+
+def _retry_limit(settings, method):
+    """
+    Internal helper returning the retries of a request method, the methods
+    missing from `config.settings.retries` keep their default
+    """
+    if method in settings.retries:
+        return settings.retries[method]
+    return DEFAULT_RETRIES.get(method, 0)
+
+
+def _response_bytes(response, stream=False):
+    """
+    Internal helper returning the size of a response body, None for streamed
+    responses without a Content-Length
+    """
+    length = response.headers.get('content-length')
+    if length is not None:
+        return int(length)
+    if stream:
+        return None
+    return len(response.content or b'')
+
+
+def _send(method, url, body, headers, function=None, stream=False):
+    """
+    Internal helper sending a request on the pooled session, rate limited by
+    `config.settings.rate_limit` and retried on connection errors and
+    `config.settings.retry_status_codes` up to `config.settings.retries`
+    times for the request method. Every attempt is reported to the
+    `config.settings.hooks` registered, on behalf of the API `function`.
+    """
+    settings = config.active_settings()
+    retries = _retry_limit(settings, method)
+    limiter = _rate_limiter()
+    attempt = 0
+    while True:
+        if limiter is not None:
+            limiter.acquire()
+        hooks = settings.hooks
+        if hooks:
+            event = RequestEvent(
+                method, url, function, attempt, len(body) if body else 0)
+            emit(hooks, 'before_send', event)
+            start = time.time()
+        try:
+            response = _session().request(
+                method, url, data=body, headers=headers, stream=stream)
+        except Exception as e:
+            if hooks:
+                event.elapsed = time.time() - start
+                event.error = e
+                emit(hooks, 'on_error', event)
+            if (not isinstance(e, (RequestConnectionError, RequestTimeout))
+                    or attempt >= retries):
+                raise
+            reason, delay = e.__class__.__name__, _retry_delay(attempt)
+        else:
+            debug('response: %s', response.headers, method=method, url=url,
+                  status_code=response.status_code)
+            if hooks:
+                event.elapsed = time.time() - start
+                event.status_code = response.status_code
+                event.response_bytes = _response_bytes(response, stream)
+                emit(hooks, 'after_response', event)
+            if (attempt >= retries or response.status_code not in
+                    settings.retry_status_codes):
+                return response
+            reason = response.status_code
+            delay = _retry_delay(attempt, response)
+            if stream:
+                response.close()
+
+        attempt += 1
+        _retry_counter().increment(method, reason)
+        if hooks:
+            event.reason, event.delay = reason, delay
+            emit(hooks, 'on_retry', event)
+        debug('Retrying %s %s (%s) in %.2fs, attempt %s of %s',
+              method, url, reason, delay, attempt, retries, method=method,
+              url=url, reason=reason, delay=delay, attempt=attempt)
+        time.sleep(delay)
+
+
+def _cache_response(response_cache, path, response):
+    """
+    Internal helper storing a GET response that carries validators
+    """
+    etag = response.headers.get('etag')
+    last_modified = response.headers.get('last-modified')
+    if etag or last_modified:
+        entry = dict(
+            etag=etag, last_modified=last_modified, content=response.content)
+        response_cache.set(path, entry)
+
+
+def _cookie_expiry(set_cookie):
+    """
+    Internal helper returning the expiry timestamp of a Set-Cookie header
+
+    :param set_cookie: String of the Set-Cookie header
+    :return: Timestamp of the cookie expiry or None for session cookies
+    """
+    for attribute in set_cookie.split(';'):
+        name, _, value = attribute.strip().partition('=')
+        if name.lower() == 'expires':
+            date = parsedate_tz(value.strip())
+            if date:
+                return mktime_tz(date)
+    return None
+
+
 def init(username, password, account_id, **kwargs):
     warnings.warn(
         'init deprecated, use initialise instead.', DeprecationWarning)
@@ -62,34 +598,45 @@ def initialise(username, password, account_id, **kwargs):
     :param username: String of a Rightscale username
     :param password: String of the user's password
     :param account_id: String of the Rightscale account_id
-    :params kwargs: Key word arguments for additional configuration
+    :params kwargs: Key word arguments for additional configuration, names
+                    of `config.DEFAULTS` are stored as settings (e.g.
+                    `pool_maxsize`, `concurrency`, `retries`, `rate_limit`,
+                    `response_cache` or `lookup_cache_ttl`), the others are
+                    server creation parameters: instance types to server
+                    template hrefs and `default_deployment_id`
     """
-
     if not username or not password or not account_id:
         raise Exception(
             'Username, password and account_id are required parameters')
 
-    config.settings.username = username
-    config.settings.password = password
-    config.settings.account_id = account_id
-    config.settings.api_base = config.account_url + account_id
+    settings = config.active_settings()
 
-    config.settings.default_deployment_id = kwargs.get(
-        'default_deployment_id', None)
-    config.settings.debug = kwargs.get('debug', False)
+    settings.username = username
+    settings.password = password
+    settings.account_id = account_id
+    settings.api_base = _account_url(settings) + account_id
 
-    config.settings.create_server_parameters = {}
+    settings.default_deployment_id = kwargs.get('default_deployment_id')
+    settings.debug = kwargs.get('debug', False)
+
+    close_session()
+    settings.lookup_cache = None
+    for key in INITIALISE_SETTINGS:
+        if key in kwargs:
+            setattr(settings, key, kwargs.pop(key))
+
+    settings.create_server_parameters = {}
     for key, value in kwargs.items():
-        config.settings.create_server_parameters[key] = value
+        settings.create_server_parameters[key] = value
         if key == 'default_deployment_id':
             href = '%s%s/deployments/%s' % (
-                config.account_url, account_id,
-                config.settings.default_deployment_id)
-            config.settings.create_server_parameters['deployment_href'] = href
+                _account_url(settings), account_id,
+                settings.default_deployment_id)
+            settings.create_server_parameters['deployment_href'] = href
 
-    if config.settings.debug:
-        config.settings.requests_config = {'verbose': sys.stderr}
-        config.settings.debug = sys.stderr
+    if settings.debug:
+        settings.requests_config = {'verbose': sys.stderr}
+        settings.debug = sys.stderr
 
 
 def login(username=None, password=None, account_id=None):
@@ -101,38 +648,40 @@ def login(username=None, password=None, account_id=None):
     :param account_id: (optional) String of the Rightscale account_id
     :return: Boolean indicating successful login
     """
+    settings = config.active_settings()
     if not username or not password or not account_id:
-        username = config.settings.username
-        password = config.settings.password
-        account_id = config.settings.account_id
+        username = settings.username
+        password = settings.password
+        account_id = settings.account_id
 
     if not username or not password or not account_id:
         raise Exception(
             'Username, password or account_id not specified in configuration '
             'or as an API parameter')
 
-    auth_hash = '%s:%s' % (username, password)
-
-    response = _request('/login', headers={
-        'Authorization': 'Basic %s' % base64.b64encode(six.b(auth_hash))
-    })
+    response = _request(
+        '/login', headers=_build_auth_headers(username, password))
 
     if response.status_code == 204:
-        config.settings.cookies = response.headers['set-cookie']
-        config.settings.username = username
-        config.settings.password = password
+        settings.cookies = response.headers['set-cookie']
+        settings.cookies_expires = _cookie_expiry(settings.cookies)
+        settings.username = username
+        settings.password = password
         return True
 
     return False
 
 
-def lookup_by_href_or_nickname(href, nickname, find_function):
+def lookup_by_href_or_nickname(href, nickname, find_function, resource=None):
     """
-    Helper to retrieve items by href or nickname
+    Helper to retrieve items by href or nickname, nickname lookups are cached
+    for `config.settings.lookup_cache_ttl` seconds
 
     :param href (optional): String of the item href
     :param nickname (optional): String of the item nickname
     :param find_function: The function to use to find by nickname
+    :param resource: (optional) String of the resource type to cache the
+                     lookup under, defaults to the name of `find_function`
     :return: String of the item href
     """
     if not nickname and not href:
@@ -141,8 +690,15 @@ def lookup_by_href_or_nickname(href, nickname, find_function):
     if href:
         return href
     elif nickname:
+        resource = resource or getattr(
+            find_function, '__name__', repr(find_function))
+        href = _lookup_cache().get(resource, nickname)
+        if href:
+            return href
+
         item = find_function(nickname)
         if item and 'href' in item:
+            _cache_lookup(resource, nickname, item['href'])
             return item['href']
         else:
             raise Exception('No item nicknamed %s found' % nickname)
@@ -0,0 +1,219 @@
+"""
+righteous.api.cache
+
+Caches used to avoid repeating API requests
+"""
+import base64
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+class LookupCache(object):
+    """
+    Thread safe cache of nickname to href lookups per resource type (server,
+    deployment), bounded to `max_size` entries by evicting the least recently
+    used and expiring entries `ttl` seconds after they were stored
+    """
+
+    def __init__(self, max_size=1024, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = self.misses = self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, resource, nickname):
+        """
+        Returns the cached href of a nickname or None
+        """
+        key = (resource, nickname)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None or entry[1] < time.time():
+                self.misses += 1
+                return None
+            # re-insert to mark as most recently used
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[0]
+
+    def set(self, resource, nickname, href):
+        """
+        Caches the href of a nickname
+        """
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+        key = (resource, nickname)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (href, time.time() + self.ttl)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, resource, nickname=None, href=None):
+        """
+        Removes the entries of a resource type matching a nickname or href
+        """
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if key[0] == resource and (
+                        key[1] == nickname or entry[0] == href):
+                    del self._entries[key]
+
+    def clear(self):
+        """
+        Removes all entries
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Cache statistics
+
+        :return: dict with the keys `hits`, `misses`, `evictions` and `size`
+        """
+        with self._lock:
+            return dict(
+                hits=self.hits, misses=self.misses, evictions=self.evictions,
+                size=len(self._entries))
+
+
+class MemoryResponseCache(object):
+    """
+    Thread safe in-memory cache of GET responses with their validators (ETag,
+    Last-Modified), bounded to `max_entries` responses and `max_bytes` of
+    response content by evicting the least recently used. Only the response
+    content is kept, parsed again on every use.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        """
+        Returns the cached entry of a URL or None
+        """
+        with self._lock:
+            entry = self._entries.pop(url, None)
+            if entry is not None:
+                self._entries[url] = entry
+            return entry
+
+    def set(self, url, entry):
+        """
+        Caches an entry, a dict with the keys `etag`, `last_modified` and
+        `content`
+        """
+        with self._lock:
+            previous = self._entries.pop(url, None)
+            if previous is not None:
+                self.size -= len(previous['content'])
+            self._entries[url] = entry
+            self.size += len(entry['content'])
+            while self._entries and (
+                    len(self._entries) > self.max_entries or
+                    self.size > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted['content'])
+
+    def clear(self):
+        """
+        Removes all entries
+        """
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+class FileResponseCache(object):
+    """
+    On-disk cache of GET responses with their validators, one JSON file per
+    URL in `directory`, bounded to `max_entries` files by removing the least
+    recently used. A missing directory is created only accessible to the
+    current user.
+    """
+
+    def __init__(self, directory, max_entries=1024):
+        self.directory = directory = os.path.expanduser(directory)
+        self.max_entries = max_entries
+        if not os.path.isdir(directory):
+            os.makedirs(directory, 0o700)
+
+    def _path(self, url):
+        return os.path.join(
+            self.directory,
+            hashlib.sha1(url.encode('utf-8')).hexdigest() + '.cache')
+
+    def get(self, url):
+        """
+        Returns the cached entry of a URL or None
+        """
+        path = self._path(url)
+        try:
+            with open(path, 'rb') as cache_file:
+                stored = json.loads(cache_file.read().decode('utf-8'))
+            if stored['url'] != url:
+                return None
+            entry = dict(
+                etag=stored['etag'], last_modified=stored['last_modified'],
+                content=base64.b64decode(stored['content']))
+            os.utime(path, None)
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            return None
+        return entry
+
+    def set(self, url, entry):
+        """
+        Caches an entry, a dict with the keys `etag`, `last_modified` and
+        `content`
+        """
+        stored = dict(
+            url=url, etag=entry['etag'], last_modified=entry['last_modified'],
+            content=base64.b64encode(entry['content']).decode('ascii'))
+        # a unique file per writer, renamed over the entry once complete
+        descriptor, temporary_path = tempfile.mkstemp(
+            suffix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(descriptor, 'wb') as cache_file:
+                cache_file.write(json.dumps(stored).encode('utf-8'))
+            os.rename(temporary_path, self._path(url))
+        except Exception:
+            os.remove(temporary_path)
+            raise
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.cache'):
+                path = os.path.join(self.directory, name)
+                try:
+                    entries.append((os.path.getmtime(path), path))
+                except OSError:
+                    pass
+        if len(entries) <= self.max_entries:
+            return
+        for _, path in sorted(entries)[:len(entries) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def clear(self):
+        """
+        Removes all entries
+        """
+        for name in os.listdir(self.directory):
+            if name.endswith('.cache'):
+                os.remove(os.path.join(self.directory, name))
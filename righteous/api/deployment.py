@@ -1,6 +1,10 @@
-import json
 from ..compat import urlencode, quote
-from .base import _request, debug, lookup_by_href_or_nickname
+from .base import (
+    _request, _parse_json, _iter_json, debug, lookup_by_href_or_nickname,
+    _invalidate_lookup
+)
+from .filters import filter_query, select
+from .resources import Deployment, typed as _typed
 
 
 def _lookup_deployment(deployment_href, nickname):
@@ -8,13 +12,18 @@ def _lookup_deployment(deployment_href, nickname):
     Convenience wrapper around `righteous.base.lookup_by_href_or_nickname`
     """
     return lookup_by_href_or_nickname(
-        deployment_href, nickname, find_deployment)
+        deployment_href, nickname, find_deployment, resource='deployment')
 
 
-def list_deployments():
+def list_deployments(typed=False, filters=None, fields=None):
     """
     Lists server deployment in an account
 
+    :param typed: (optional) Boolean, return `Deployment` records of
+                  `righteous.api.resources` instead of dicts
+    :param filters: (optional) dict of field to value of the deployments to
+                    list, see `righteous.api.filters`
+    :param fields: (optional) list of the fields of the deployments to return
     :return: dict of server deployment information with the following keys:
 
     ::
@@ -23,8 +32,34 @@ def list_deployments():
          u'default_vpc_subnet_href', u'created_at', u'nickname', u'updated_at',
          u'servers']
     """
-    response = _request('/deployments.js')
-    return json.loads(response.content)
+    query = filter_query(filters)
+    response = _request('/deployments.js' + (query and '?' + query))
+    deployments = _parse_json(response)
+    if filters or fields is not None:
+        deployments = select(deployments, filters, fields)
+    if typed:
+        return _typed(Deployment, deployments)
+    return deployments
+
+
+def iter_deployments(typed=False, filters=None, fields=None):
+    """
+    Iterates over the server deployments in an account, parsing the streamed
+    response incrementally so only one deployment is held in memory at a time
+
+    :param typed: (optional) Boolean, yield `Deployment` records of
+                  `righteous.api.resources` instead of dicts
+    :param filters: (optional) dict of field to value of the deployments to
+                    list, see `righteous.api.filters`
+    :param fields: (optional) list of the fields of the deployments to return
+    :return: generator of dicts of server deployment information (see
+             `list_deployments`)
+    """
+    query = filter_query(filters)
+    response = _request(
+        '/deployments.js' + (query and '?' + query), stream=True)
+    return _iter_json(response, resource=Deployment if typed else None,
+                      filters=filters, fields=fields)
 
 
 def find_deployment(nickname):
@@ -42,11 +77,11 @@ def find_deployment(nickname):
          u'servers']
     """
     response = _request('/deployments.js?filter=nickname=%s' % quote(nickname))
-    deployments = json.loads(response.content)
+    deployments = _parse_json(response)
     return deployments[0] if len(deployments) else None
 
 
-def deployment_info(deployment_href, nickname=None):
+def deployment_info(deployment_href, nickname=None, typed=False):
     """
     Detailed server deployment information
 
@@ -54,6 +89,8 @@ def deployment_info(deployment_href, nickname=None):
                             information about
     :param nickname: (optional) String representing the nickname of the
                      deployment
+    :param typed: (optional) Boolean, return `Deployment` records of
+                  `righteous.api.resources` instead of dicts
     :return: dict of deployment information with the following keys
 
     ::
@@ -65,7 +102,9 @@ def deployment_info(deployment_href, nickname=None):
     response = _request(
         '%s.js' % _lookup_deployment(deployment_href, nickname),
         prepend_api_base=False)
-    return json.loads(response.content)
+    if typed:
+        return _typed(Deployment, _parse_json(response))
+    return _parse_json(response)
 
 
 def create_deployment(nickname, description):
@@ -80,17 +119,15 @@ def create_deployment(nickname, description):
                    'deployment[description]': description}
     response = _request(
         '/deployments', method='POST', body=urlencode(create_data))
+    _invalidate_lookup('deployment', nickname=nickname)
 
     success = response.status_code == 201
     if success:
         location = response.headers.get('location')
-        debug(
-            'Created deployment %s: %s (%s:%s)' %
-            (nickname, location, response.status_code, response.content)
-        )
+        debug('Created deployment %s: %s (%s:%s)',
+              nickname, location, response.status_code, response.content)
     else:
-        debug(
-            'Error creating deployment %s: %s' % (nickname, response.content))
+        debug('Error creating deployment %s: %s', nickname, response.content)
     # TODO: error responses
     return success, location
 
@@ -104,9 +141,11 @@ def delete_deployment(deployment_href, nickname=None):
                      deployment
     :return: Boolean of operation success/failure
     """
+    deployment_href = _lookup_deployment(deployment_href, nickname)
+    _invalidate_lookup('deployment', nickname=nickname, href=deployment_href)
     return _request(
-        _lookup_deployment(deployment_href, nickname),
-        method='DELETE', prepend_api_base=False).status_code == 200
+        deployment_href, method='DELETE', prepend_api_base=False
+    ).status_code == 200
 
 
 def duplicate_deployment(deployment_href, nickname=None):
@@ -127,14 +166,10 @@ def duplicate_deployment(deployment_href, nickname=None):
     success = response.status_code == 201
     if success:
         location = response.headers.get('location')
-        debug(
-            'Duplicated deployment %s: %s (%s:%s)' %
-            (nickname, location, response.status_code, response.content)
-        )
+        debug('Duplicated deployment %s: %s (%s:%s)',
+              nickname, location, response.status_code, response.content)
     else:
-        debug(
-            'Error duplicating deployment %s: %s' %
-            (nickname, response.content)
-        )
+        debug('Error duplicating deployment %s: %s',
+              nickname, response.content)
     # TODO: error responses
     return success, location
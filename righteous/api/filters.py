@@ -0,0 +1,86 @@
+"""
+righteous.api.filters
+
+Filters and projections of listed resources. RightScale API 1.0 filters on
+a field containing a value, a value ending with `*` matches the field
+prefix. Index endpoints filter server side and results are checked again
+client side, which also applies prefix matches the API does not support.
+"""
+import six
+from ..compat import quote
+
+PREFIX = '*'
+
+
+def _expressions(filters):
+    """
+    Internal helper returning `(field, value)` pairs of a dict or iterable
+    of pairs of filters
+    """
+    if not filters:
+        return []
+    if isinstance(filters, dict):
+        filters = sorted(filters.items())
+    return [(field, six.text_type(value)) for field, value in filters]
+
+
+def filter_query(filters):
+    """
+    Query string of filters for the API 1.0 index endpoints, `filter=` for a
+    single filter and `filter[]=` for many
+
+    :param filters: dict of field to value, or iterable of `(field, value)`
+                    pairs to filter on a field more than once
+    :return: String of the query, empty without filters
+    """
+    expressions = [
+        '%s=%s' % (quote(field), quote(value.rstrip(PREFIX).encode('utf-8')))
+        for field, value in _expressions(filters)]
+    name = 'filter' if len(expressions) == 1 else 'filter[]'
+    return '&'.join('%s=%s' % (name, expression)
+                    for expression in expressions)
+
+
+def matches(item, filters):
+    """
+    Whether a resource matches all filters
+
+    :param item: dict of a resource
+    :param filters: filters (see `filter_query`)
+    :return: Boolean
+    """
+    for field, value in _expressions(filters):
+        actual = item.get(field)
+        actual = u'' if actual is None else six.text_type(actual)
+        if value.endswith(PREFIX):
+            if not actual.startswith(value[:-len(PREFIX)]):
+                return False
+        elif value not in actual:
+            return False
+    return True
+
+
+def project(item, fields):
+    """
+    Resource with only the requested fields
+
+    :param item: dict of a resource
+    :param fields: iterable of the fields to keep, all fields when None
+    :return: dict
+    """
+    if fields is None:
+        return item
+    return dict((field, item[field]) for field in fields if field in item)
+
+
+def select(items, filters=None, fields=None):
+    """
+    Projections of the resources matching the filters
+
+    :param items: iterable of resource dicts
+    :param filters: (optional) filters (see `filter_query`)
+    :param fields: (optional) iterable of the fields to keep
+    :return: list of dicts
+    """
+    return [project(item, fields) for item in items
+            if not filters or matches(item, filters)]
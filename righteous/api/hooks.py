@@ -0,0 +1,191 @@
+"""
+righteous.api.hooks
+
+Instrumentation hooks called around every API request
+"""
+import re
+import sys
+import threading
+from logging import getLogger
+from six.moves.urllib.parse import urlsplit
+from .. import config
+try:
+    from contextvars import ContextVar
+except ImportError:  # Python < 3.7
+    ContextVar = None
+
+log = getLogger(__name__)
+_hooks_lock = threading.Lock()
+
+# before_send: a request attempt is about to be sent
+# after_response: a response was received, including responses then retried
+# on_error: sending a request attempt raised an exception
+# on_retry: a request attempt is retried after `event.delay` seconds
+HOOK_EVENTS = ('before_send', 'after_response', 'on_error', 'on_retry')
+
+_ID_SEGMENT = re.compile(r'/\d+(?=[/.]|$)')
+
+
+def path_template(url):
+    """
+    Path of a request URL relative to the account, with resource ids
+    replaced by `:id`, e.g. `/servers/:id/settings.js`
+    """
+    settings = config.active_settings()
+    path = url.split('?', 1)[0]
+    base = '%s%s' % (
+        settings.account_url or config.account_url, settings.account_id)
+    if path.startswith(base):
+        path = path[len(base):]
+    else:
+        path = urlsplit(path).path
+    return _ID_SEGMENT.sub('/:id', path)
+
+
+class RequestEvent(object):
+    """
+    A request attempt passed to hooks. Attributes are filled in as the
+    attempt progresses: `status_code`, `elapsed` (seconds) and
+    `response_bytes` once a response is received, `error` when sending
+    raised, `reason` (status code or exception name) and `delay` when it is
+    retried.
+    """
+
+    def __init__(self, method, url, function=None, attempt=0,
+                 request_bytes=0):
+        self.method = method
+        self.url = url
+        self.function = function
+        self.attempt = attempt
+        self.request_bytes = request_bytes
+        self.status_code = None
+        self.elapsed = None
+        self.response_bytes = None
+        self.error = None
+        self.reason = None
+        self.delay = None
+
+    @property
+    def path(self):
+        return path_template(self.url)
+
+    def __repr__(self):
+        return '<RequestEvent %s %s [%s]>' % (
+            self.method, self.path, self.status_code)
+
+
+def add_hook(event, callback):
+    """
+    Registers a callback for a request event, called with a `RequestEvent`
+
+    :param event: String of the event name, one of `HOOK_EVENTS`
+    :param callback: callable taking a `RequestEvent`
+    """
+    if event not in HOOK_EVENTS:
+        raise ValueError('Unknown hook event %s, expected one of %s' % (
+            event, ', '.join(HOOK_EVENTS)))
+    settings = config.active_settings()
+    with _hooks_lock:
+        hooks = dict(settings.hooks or {})
+        hooks[event] = list(hooks.get(event, ())) + [callback]
+        settings.hooks = hooks
+
+
+def remove_hook(event, callback):
+    """
+    Unregisters a callback registered with `add_hook`
+    """
+    settings = config.active_settings()
+    with _hooks_lock:
+        hooks = dict(settings.hooks or {})
+        callbacks = [
+            registered for registered in hooks.get(event, ())
+            if registered != callback]
+        if callbacks:
+            hooks[event] = callbacks
+        else:
+            hooks.pop(event, None)
+        settings.hooks = hooks
+
+
+def emit(hooks, event, request_event):
+    """
+    Calls the callbacks of an event, a failing callback is logged and does
+    not fail the request
+    """
+    for callback in hooks.get(event, ()):
+        try:
+            callback(request_event)
+        except Exception:
+            log.exception('%s hook %r failed', event, callback)
+
+
+# API function of the batch a worker thread (or asyncio task) is running
+# work for, set by `righteous.api.parallel` and `righteous.aio` as worker
+# stacks do not include it
+if ContextVar is not None:
+    _batch = ContextVar('righteous_batch_function', default=None)
+else:
+    _batch = threading.local()
+
+
+def _batch_function():
+    if ContextVar is not None:
+        return _batch.get()
+    return getattr(_batch, 'function', None)
+
+
+def calling_function():
+    """
+    Name of the outermost public righteous API function (or `righteous.aio`
+    coroutine) on the stack of the caller, e.g. `create_and_start_server`,
+    or None. Nested functions are skipped and work run by pool workers (or
+    gathered tasks) is attributed to the function that submitted it, e.g.
+    `server_details`.
+    """
+    function = None
+    frame = sys._getframe(2)
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        if not (module.startswith('righteous.api') or
+                module == 'righteous.aio'):
+            break
+        name = frame.f_code.co_name
+        if not name.startswith('_') and name in frame.f_globals:
+            function = name
+        frame = frame.f_back
+    return _batch_function() or function
+
+
+class working_for(object):
+    """
+    Context manager attributing the requests of the current thread (or
+    asyncio task) to an API function until it exits, see
+    `calling_function`
+    """
+
+    def __init__(self, function):
+        self.function = function
+        self.previous = None
+
+    def __enter__(self):
+        if ContextVar is not None:
+            self.previous = _batch.set(self.function)
+        else:
+            self.previous = _batch_function()
+            _batch.function = self.function
+
+    def __exit__(self, *args):
+        if ContextVar is not None:
+            _batch.reset(self.previous)
+        else:
+            _batch.function = self.previous
+
+
+def run_for(function, work, *args):
+    """
+    Calls `work(*args)` in a worker thread, attributing its requests to the
+    API `function` (see `calling_function`)
+    """
+    with working_for(function):
+        return work(*args)
@@ -0,0 +1,130 @@
+"""
+righteous.api.metrics
+
+In-memory request metrics collected through the instrumentation hooks
+"""
+import bisect
+import threading
+from .hooks import add_hook, remove_hook
+
+# upper bounds in seconds of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class MetricsCollector(object):
+    """
+    Thread safe collector of request counts, errors, retries, bytes and
+    latency histograms per endpoint (method and path template) and per
+    calling API function
+
+    ::
+
+        with MetricsCollector() as metrics:
+            righteous.list_servers()
+        metrics.stats()['endpoints']['GET /deployments/:id.js']['count']
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self.reset()
+
+    def __enter__(self):
+        return self.install()
+
+    def __exit__(self, *args):
+        self.uninstall()
+
+    def install(self):
+        """
+        Starts collecting metrics of all requests
+        """
+        add_hook('after_response', self.after_response)
+        add_hook('on_error', self.on_error)
+        add_hook('on_retry', self.on_retry)
+        return self
+
+    def uninstall(self):
+        """
+        Stops collecting metrics
+        """
+        remove_hook('after_response', self.after_response)
+        remove_hook('on_error', self.on_error)
+        remove_hook('on_retry', self.on_retry)
+
+    def reset(self):
+        """
+        Discards the collected metrics
+        """
+        with self._lock:
+            self._endpoints = {}
+            self._functions = {}
+
+    def _metrics(self, event):
+        endpoint = '%s %s' % (event.method, event.path)
+        function = event.function or '<unknown>'
+        for metrics, key in ((self._endpoints, endpoint),
+                             (self._functions, function)):
+            if key not in metrics:
+                metrics[key] = dict(
+                    count=0, errors=0, retries=0, status_codes={},
+                    request_bytes=0, response_bytes=0, latency_total=0.0,
+                    latency_min=None, latency_max=None,
+                    histogram=[0] * (len(self.buckets) + 1))
+            yield metrics[key]
+
+    def _observe(self, metrics, event):
+        metrics['count'] += 1
+        metrics['request_bytes'] += event.request_bytes or 0
+        metrics['response_bytes'] += event.response_bytes or 0
+        elapsed = event.elapsed or 0.0
+        metrics['latency_total'] += elapsed
+        if metrics['latency_min'] is None or elapsed < metrics['latency_min']:
+            metrics['latency_min'] = elapsed
+        if metrics['latency_max'] is None or elapsed > metrics['latency_max']:
+            metrics['latency_max'] = elapsed
+        metrics['histogram'][bisect.bisect_left(self.buckets, elapsed)] += 1
+
+    def after_response(self, event):
+        with self._lock:
+            for metrics in self._metrics(event):
+                self._observe(metrics, event)
+                codes = metrics['status_codes']
+                codes[event.status_code] = codes.get(event.status_code, 0) + 1
+                if event.status_code >= 400:
+                    metrics['errors'] += 1
+
+    def on_error(self, event):
+        with self._lock:
+            for metrics in self._metrics(event):
+                self._observe(metrics, event)
+                metrics['errors'] += 1
+
+    def on_retry(self, event):
+        with self._lock:
+            for metrics in self._metrics(event):
+                metrics['retries'] += 1
+
+    def stats(self):
+        """
+        Collected metrics
+
+        :return: dict with the keys `endpoints` (keyed by method and path
+                 template, e.g. `GET /servers/:id.js`) and `functions`
+                 (keyed by the calling API function), each value a dict of
+                 `count`, `errors`, `retries`, `status_codes`,
+                 `request_bytes`, `response_bytes`, `latency_total`,
+                 `latency_min`, `latency_max` and `histogram`, a list of
+                 `(upper bound, count)` latency buckets
+        """
+        bounds = self.buckets + (float('inf'),)
+        with self._lock:
+            return dict(
+                (name, dict(
+                    (key, dict(
+                        metrics, status_codes=dict(metrics['status_codes']),
+                        histogram=list(zip(bounds, metrics['histogram']))))
+                    for key, metrics in collection.items()))
+                for name, collection in (
+                    ('endpoints', self._endpoints),
+                    ('functions', self._functions)))
@@ -0,0 +1,63 @@
+"""
+righteous.api.parallel
+
+Bounded worker pools for issuing API requests concurrently
+"""
+from multiprocessing.pool import ThreadPool
+from .. import config
+from .hooks import calling_function, run_for
+
+
+def _call(work):
+    """
+    Internal helper applying a function to an item with the settings active
+    in the submitting thread, capturing any exception. Requests are
+    attributed to the API function that submitted the work.
+    """
+    function, item, settings, caller = work
+    try:
+        with config.activate(settings):
+            return item, run_for(caller, function, item), None
+    except Exception as e:
+        return item, None, e
+
+
+def imap_concurrently(function, items, jobs=None, ordered=True):
+    """
+    Applies a function to every item using a bounded pool of worker threads,
+    a failing item does not abort the remaining ones
+
+    :param function: callable taking a single item
+    :param items: iterable of items to apply `function` to
+    :param jobs: (optional) maximum number of concurrent calls, defaults to
+                 `config.settings.concurrency`
+    :param ordered: (optional) Boolean, yield results in the order of `items`
+                    (default) instead of as soon as they complete
+    :return: generator of `(item, result, exception)` tuples, exception is
+             None for successful calls
+    """
+    settings = config.active_settings()
+    caller = calling_function() if settings.hooks else None
+    work = [(function, item, settings, caller) for item in items]
+    if not work:
+        return
+    jobs = max(1, min(jobs or settings.concurrency, len(work)))
+    pool = ThreadPool(jobs)
+    try:
+        imap = pool.imap if ordered else pool.imap_unordered
+        for result in imap(_call, work):
+            yield result
+    finally:
+        pool.terminate()
+
+
+def map_concurrently(function, items, jobs=None):
+    """
+    List returning version of `imap_concurrently`, preserving item order
+
+    :param function: callable taking a single item
+    :param items: iterable of items to apply `function` to
+    :param jobs: (optional) maximum number of concurrent calls
+    :return: list of `(item, result, exception)` tuples
+    """
+    return list(imap_concurrently(function, items, jobs=jobs))
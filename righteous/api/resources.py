@@ -0,0 +1,254 @@
+"""
+righteous.api.resources
+
+Compact, read-only friendly records of API resources, returned instead of
+dicts by the list and info functions called with `typed=True`. Records keep
+their fields in `__slots__`, share the strings of repeated values (states,
+instance types) and parse timestamps when they are first read.
+"""
+from datetime import datetime
+import six
+from six.moves import intern
+
+# timestamp format of the API 1.0 resources
+TIMESTAMP_FORMAT = '%Y/%m/%d %H:%M:%S +0000'
+
+
+def _intern(value):
+    """
+    Internal helper sharing one copy of repeated strings
+    """
+    return intern(value) if type(value) is str else value
+
+
+def parse_timestamp(value):
+    """
+    Parses an API timestamp
+
+    :param value: String of the timestamp, e.g. `2012/01/06 16:35:09 +0000`
+    :return: naive UTC datetime, `value` itself when it is not a timestamp
+    """
+    try:
+        return datetime.strptime(value, TIMESTAMP_FORMAT)
+    except (TypeError, ValueError):
+        return value
+
+
+class _Timestamp(object):
+    """
+    Descriptor of a timestamp field, parsing the string stored in its slot
+    on first read
+    """
+
+    def __init__(self, slot):
+        self.slot = slot
+
+    def __get__(self, record, owner):
+        if record is None:
+            return self
+        value = self.slot.__get__(record, owner)
+        if isinstance(value, six.string_types):
+            value = parse_timestamp(value)
+            self.slot.__set__(record, value)
+        return value
+
+    def __set__(self, record, value):
+        self.slot.__set__(record, value)
+
+
+class _ResourceType(type):
+    """
+    Metaclass declaring the slots of a resource from its `fields`, the JSON
+    keys of the resource
+    """
+
+    def __new__(mcs, name, bases, namespace):
+        if '__slots__' in namespace:
+            return type.__new__(mcs, name, bases, namespace)
+        fields = namespace.get('fields', ())
+        attributes = tuple(field.replace('-', '_') for field in fields)
+        timestamps = namespace.get('timestamps', ())
+        namespace['attributes'] = attributes
+        namespace['__slots__'] = tuple(
+            '_' + attribute if attribute in timestamps else attribute
+            for attribute in attributes)
+        cls = type.__new__(mcs, name, bases, namespace)
+        for attribute in timestamps:
+            setattr(cls, attribute, _Timestamp(getattr(cls, '_' + attribute)))
+        return cls
+
+
+class Resource(six.with_metaclass(_ResourceType, object)):
+    """
+    Base of the resource records. Fields are read as attributes, hyphens in
+    the JSON keys are replaced by underscores, or by JSON key like a dict.
+    Fields missing from the API response read as None attributes, keys not
+    declared in `fields` are kept in the `extra` dict.
+    """
+    __slots__ = ('extra', '_missing')
+    fields = attributes = ()
+    timestamps = ()
+    interned = ()
+    # tuples of missing fields, shared by the records missing the same fields
+    _missing_fields = {}
+
+    def __init__(self, extra=None, **attributes):
+        self.extra = extra
+        self._missing = ()
+        for attribute in self.attributes:
+            setattr(self, attribute, attributes.pop(attribute, None))
+        for attribute in self.interned:
+            setattr(self, attribute, _intern(getattr(self, attribute)))
+        if attributes:
+            raise AttributeError('Unknown fields of %s: %s' % (
+                self.__class__.__name__, ', '.join(sorted(attributes))))
+
+    @classmethod
+    def from_json(cls, data):
+        """
+        Creates a record from the parsed JSON of a resource
+
+        :param data: dict of the resource
+        :return: instance of the resource class
+        """
+        data = dict(data)
+        missing = tuple(field for field in cls.fields if field not in data)
+        attributes = dict(
+            (attribute, data.pop(field, None))
+            for field, attribute in zip(cls.fields, cls.attributes))
+        record = cls(extra=data or None, **attributes)
+        if missing:
+            record._missing = cls._missing_fields.setdefault(missing, missing)
+        return record
+
+    def _json_value(self, attribute):
+        if attribute in self.timestamps:
+            value = getattr(self, '_' + attribute)
+            if isinstance(value, datetime):
+                return value.strftime(TIMESTAMP_FORMAT)
+            return value
+        return getattr(self, attribute)
+
+    def to_dict(self):
+        """
+        The resource as the dict returned by the API
+
+        :return: dict of JSON key to value
+        """
+        data = dict(self.extra or {})
+        for field, attribute in zip(self.fields, self.attributes):
+            if field not in self._missing:
+                data[field] = self._json_value(attribute)
+        return data
+
+    def __getitem__(self, key):
+        try:
+            if key in self._missing:
+                raise ValueError(key)
+            index = self.fields.index(key)
+        except ValueError:
+            if self.extra and key in self.extra:
+                return self.extra[key]
+            raise KeyError(key)
+        return self._json_value(self.attributes[index])
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __eq__(self, other):
+        return (type(self) is type(other) and
+                self.to_dict() == other.to_dict())
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '<%s %s>' % (
+            self.__class__.__name__,
+            getattr(self, 'nickname', None) or getattr(self, 'href', None))
+
+
+class Server(Resource):
+    """
+    Server of a deployment, see `righteous.find_server`
+    """
+    fields = (
+        'href', 'nickname', 'state', 'server_type', 'tags', 'created_at',
+        'updated_at', 'deployment_href', 'server_template_href',
+        'current_instance_href', 'parameters')
+    timestamps = ('created_at', 'updated_at')
+    interned = ('state', 'server_type')
+
+
+class ServerSettings(Resource):
+    """
+    Current settings of a server, see `righteous.server_settings`
+    """
+    fields = (
+        'ec2-instance-type', 'ec2-availability-zone', 'cloud_id', 'aws-id',
+        'dns-name', 'private-dns-name', 'ip-address', 'private-ip-address',
+        'ec2-security-groups-href', 'ec2-ssh-key-href', 'locked', 'pricing',
+        'aws-platform', 'aws-product-codes', 'launched-by')
+    interned = (
+        'ec2_instance_type', 'ec2_availability_zone', 'aws_platform',
+        'pricing')
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__, self.aws_id)
+
+
+class ServerTemplate(Resource):
+    """
+    ServerTemplate, see `righteous.list_server_templates`
+    """
+    fields = (
+        'href', 'nickname', 'description', 'version', 'is_head_version',
+        'created_at', 'updated_at')
+    timestamps = ('created_at', 'updated_at')
+
+
+class Deployment(Resource):
+    """
+    Deployment and its servers (`Server` records), see
+    `righteous.list_deployments`
+    """
+    fields = (
+        'href', 'nickname', 'description', 'tags',
+        'default_ec2_availability_zone', 'default_vpc_subnet_href',
+        'created_at', 'updated_at', 'servers')
+    timestamps = ('created_at', 'updated_at')
+    interned = ('default_ec2_availability_zone',)
+
+    @classmethod
+    def from_json(cls, data):
+        deployment = super(Deployment, cls).from_json(data)
+        if deployment.servers is not None:
+            deployment.servers = [
+                Server.from_json(server) for server in deployment.servers]
+        return deployment
+
+    def _json_value(self, attribute):
+        value = super(Deployment, self)._json_value(attribute)
+        if attribute == 'servers' and value is not None:
+            value = [server.to_dict() for server in value]
+        return value
+
+
+def typed(resource_class, parsed):
+    """
+    Converts parsed JSON to records
+
+    :param resource_class: `Resource` subclass of the resources
+    :param parsed: dict of a resource, a list of them or None
+    :return: record, list of records or None
+    """
+    if parsed is None:
+        return None
+    if isinstance(parsed, list):
+        return [resource_class.from_json(data) for data in parsed]
+    return resource_class.from_json(parsed)
@@ -0,0 +1,112 @@
+"""
+righteous.api.retry
+
+Rate limiting and retry bookkeeping for API requests
+"""
+import threading
+import time
+from email.utils import parsedate_tz, mktime_tz
+
+
+class TokenBucket(object):
+    """
+    Thread safe token bucket rate limiter, allowing `rate` requests per second
+    on average with bursts of up to `capacity` requests
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self._tokens = self.capacity
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.time()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """
+        Takes a token, blocking until one is available
+        """
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def reserve(self):
+        """
+        Takes a token without blocking, for callers waiting on their own
+        (e.g. with `asyncio.sleep`)
+
+        :return: Number of seconds to wait before the token is available
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+
+
+class RetryCounter(object):
+    """
+    Thread safe counters of the retries performed
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def increment(self, method, reason):
+        """
+        Counts a retry of a request method, for a reason (status code or
+        exception name)
+        """
+        with self._lock:
+            self.total += 1
+            self.by_method[method] = self.by_method.get(method, 0) + 1
+            self.by_reason[reason] = self.by_reason.get(reason, 0) + 1
+
+    def reset(self):
+        """
+        Resets all counters
+        """
+        with self._lock:
+            self.total = 0
+            self.by_method = {}
+            self.by_reason = {}
+
+    def stats(self):
+        """
+        Retry statistics
+
+        :return: dict with the keys `retries` (total), `methods` and
+                 `reasons` (dicts of retries per method and per reason)
+        """
+        with self._lock:
+            return dict(
+                retries=self.total, methods=dict(self.by_method),
+                reasons=dict(self.by_reason))
+
+
+def retry_after(value):
+    """
+    Parses a Retry-After header
+
+    :param value: String of the header, delay seconds or an HTTP date
+    :return: Number of seconds to wait or None
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        date = parsedate_tz(value)
+        if date:
+            return max(0.0, mktime_tz(date) - time.time())
+    return None
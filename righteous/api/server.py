@@ -1,27 +1,46 @@
-import json
+import random
+import time
+import six
 from ..compat import urlencode, quote
-from .base import _request, debug, lookup_by_href_or_nickname
+from .base import (
+    _request, _parse_json, _iter_json, debug, lookup_by_href_or_nickname,
+    _lookup_cache, _cache_lookup, _invalidate_lookup
+)
+from .filters import select
+from .parallel import imap_concurrently
+from .resources import Server, ServerSettings, Deployment, typed as _typed
 from .. import config
 
+# most nicknames `find_servers` looks up with filtered requests rather than
+# a listing of all the servers
+NICKNAME_LOOKUPS = 8
+
 
 def _lookup_server(server_href, nickname):
     """
     Convenience wrapper around `righteous.base.lookup_by_href_or_nickname`
     """
-    return lookup_by_href_or_nickname(server_href, nickname, find_server)
+    return lookup_by_href_or_nickname(
+        server_href, nickname, find_server, resource='server')
 
 
-def list_servers(deployment_id=None):
+def list_servers(deployment_id=None, typed=False, filters=None, fields=None):
     """
-    Lists servers in a deployment
+    Lists servers in a deployment, deployments are not filtered by the API
+    so their servers are filtered client side
 
     :param deployment_id: (optional) String representing Deployment to list
                           servers from
+    :param typed: (optional) Boolean, return `Deployment` records of
+                  `righteous.api.resources` instead of dicts
+    :param filters: (optional) dict of field to value of the servers to
+                    list, see `righteous.api.filters`
+    :param fields: (optional) list of the fields of the servers to return
     :return: dict of server deployment information:
         http://reference.rightscale.com/api1.0/ApiR1V0/Docs/ApiDeployments.html
     """
     if not deployment_id:
-        deployment_id = config.settings.default_deployment_id
+        deployment_id = config.active_settings().default_deployment_id
 
     if not deployment_id:
         raise Exception(
@@ -29,7 +48,41 @@ def list_servers(deployment_id=None):
             'parameter')
 
     response = _request('/deployments/%s.js' % deployment_id)
-    return json.loads(response.content)
+    deployment = _parse_json(response)
+    if deployment and (filters or fields is not None):
+        deployment = dict(deployment, servers=select(
+            deployment.get('servers') or [], filters, fields))
+    if typed:
+        return _typed(Deployment, deployment)
+    return deployment
+
+
+def iter_servers(deployment_id=None, typed=False, filters=None, fields=None):
+    """
+    Iterates over the servers in a deployment, parsing the streamed response
+    incrementally so only one server is held in memory at a time
+
+    :param deployment_id: (optional) String representing Deployment to list
+                          servers from
+    :param typed: (optional) Boolean, yield `Server` records of
+                  `righteous.api.resources` instead of dicts
+    :param filters: (optional) dict of field to value of the servers to
+                    list, see `righteous.api.filters`
+    :param fields: (optional) list of the fields of the servers to return
+    :return: generator of dicts of server information (see `find_server`)
+    """
+    if not deployment_id:
+        deployment_id = config.active_settings().default_deployment_id
+
+    if not deployment_id:
+        raise Exception(
+            'Deployment id not specified in configuration or as an API '
+            'parameter')
+
+    response = _request('/deployments/%s.js' % deployment_id, stream=True)
+    return _iter_json(
+        response, key='servers', resource=Server if typed else None,
+        filters=filters, fields=fields)
 
 
 def find_server(nickname):
@@ -48,16 +101,78 @@ def find_server(nickname):
     """
     response = _request('/servers.js?filter=nickname=%s' % quote(nickname))
 
-    servers = json.loads(response.content)
+    servers = _parse_json(response)
     return servers[0] if len(servers) else None
 
 
-def server_info(server_href, nickname=None):
+def _find_exact_server(nickname):
+    """
+    Internal helper finding the server of a nickname, the API filter also
+    matches the nicknames containing it
+    """
+    response = _request('/servers.js?filter=nickname=%s' % quote(nickname))
+    for server in _parse_json(response):
+        if server.get('nickname') == nickname:
+            return server
+    return None
+
+
+def find_servers(nicknames, deployment_id=None):
+    """
+    Finds many servers based on nickname, caching the nickname lookups of
+    the servers found. Nicknames match exactly, unlike the substring match
+    of `find_server`. Up to `NICKNAME_LOOKUPS` nicknames are looked up
+    concurrently with filtered requests, more with a single streamed server
+    listing read until all the nicknames are found.
+
+    :param nicknames: list of Strings representing the nicknames of the
+                      servers to lookup
+    :param deployment_id: (optional) String representing the Deployment to
+                          look in, listing its servers instead of all the
+                          servers of the account
+    :return: dict of nickname to server information (see `find_server`),
+             nicknames that were not found are omitted
+    """
+    nicknames = set(nicknames)
+    if not nicknames:
+        return {}
+
+    found = {}
+    if not deployment_id and len(nicknames) <= NICKNAME_LOOKUPS:
+        for nickname, server, error in imap_concurrently(
+                _find_exact_server, sorted(nicknames)):
+            if error:
+                raise error
+            if server:
+                found[nickname] = server
+                _cache_lookup('server', nickname, server['href'])
+        return found
+
+    if deployment_id:
+        servers = iter_servers(deployment_id)
+    else:
+        servers = _iter_json(_request('/servers.js', stream=True))
+    try:
+        for server in servers:
+            nickname = server.get('nickname')
+            if nickname in nicknames and nickname not in found:
+                found[nickname] = server
+                _cache_lookup('server', nickname, server['href'])
+                if len(found) == len(nicknames):
+                    break
+    finally:
+        servers.close()
+    return found
+
+
+def server_info(server_href, nickname=None, typed=False):
     """
     Detailed server information
 
     :param server_href: URL representing the server to query
     :param nickname: (optional) String representing the nickname of the server
+    :param typed: (optional) Boolean, return `Server` records of
+                  `righteous.api.resources` instead of dicts
     :return: dict of server information with the following keys:
 
     ::
@@ -69,15 +184,19 @@ def server_info(server_href, nickname=None):
     response = _request(
         '%s.js' % _lookup_server(server_href, nickname),
         prepend_api_base=False)
-    return json.loads(response.content)
+    if typed:
+        return _typed(Server, _parse_json(response))
+    return _parse_json(response)
 
 
-def server_settings(server_href, nickname=None):
+def server_settings(server_href, nickname=None, typed=False):
     """
     Current server settings
 
     :param server_href: URL representing the server to query settings from
     :param nickname: (optional) String representing the nickname of the server
+    :param typed: (optional) Boolean, return `ServerSettings` records of
+                  `righteous.api.resources` instead of dicts
     :return: dict of server settings with the following keys:
 
     ::
@@ -91,7 +210,122 @@ def server_settings(server_href, nickname=None):
     response = _request(
         '%s/settings.js' % _lookup_server(server_href, nickname),
         prepend_api_base=False)
-    return json.loads(response.content)
+    if typed:
+        return _typed(ServerSettings, _parse_json(response))
+    return _parse_json(response)
+
+
+def server_details(server_hrefs, jobs=None):
+    """
+    Concurrently retrieves the information and settings of many servers
+
+    :param server_hrefs: list of URLs representing the servers to query
+    :param jobs: (optional) maximum number of concurrent requests, defaults
+                 to `config.settings.concurrency`
+    :return: list of dicts, in the order of `server_hrefs`, with the keys
+             `href`, `info` (see `server_info`), `settings` (see
+             `server_settings`) and `error` (the exception raised querying
+             the server or None)
+    """
+    details = [
+        dict(href=server_href, info=None, settings=None, error=None)
+        for server_href in server_hrefs
+    ]
+    queries = [
+        (index, key, function)
+        for index in range(len(details))
+        for key, function in (('info', server_info),
+                              ('settings', server_settings))
+    ]
+
+    def query(arguments):
+        index, key, function = arguments
+        return function(details[index]['href'])
+
+    for arguments, result, error in imap_concurrently(query, queries, jobs):
+        index, key, _ = arguments
+        if error:
+            details[index]['error'] = details[index]['error'] or error
+        else:
+            details[index][key] = result
+    return details
+
+
+def _poll_states(server_hrefs, deployment_id, jobs):
+    """
+    Internal helper retrieving the state of many servers, from a single
+    deployment listing where possible and `server_info` for the rest
+
+    :return: dict of server href to state, servers that could not be queried
+             are omitted
+    """
+    states = {}
+    wanted = set(server_hrefs)
+    deployment_id = (
+        deployment_id or config.active_settings().default_deployment_id)
+    if deployment_id:
+        try:
+            for server in list_servers(deployment_id).get('servers', []):
+                if server['href'] in wanted:
+                    states[server['href']] = server['state']
+        except Exception as e:
+            debug('Listing deployment %s failed: %s', deployment_id, e)
+
+    remaining = [href for href in server_hrefs if href not in states]
+    for server_href, info, error in imap_concurrently(
+            server_info, remaining, jobs):
+        if error:
+            debug('Polling server %s failed: %s', server_href, error)
+        else:
+            states[server_href] = info['state']
+    return states
+
+
+def wait_for_state(
+        server_hrefs, target_states, timeout=600, deployment_id=None,
+        interval=5, max_interval=60, jobs=None):
+    """
+    Waits for servers to reach a state, polling all of them together with
+    exponential backoff and jitter between polls. Servers are polled through
+    a single listing of their deployment where possible.
+
+    :param server_hrefs: list of URLs representing the servers to wait for
+    :param target_states: String or list of Strings of the states to wait
+                          for, e.g. `operational` or `stopped`
+    :param timeout: (optional) seconds to wait before giving up
+    :param deployment_id: (optional) String representing the Deployment the
+                          servers belong to, defaults to
+                          `config.settings.default_deployment_id`
+    :param interval: (optional) seconds between the first polls
+    :param max_interval: (optional) maximum seconds between polls
+    :param jobs: (optional) maximum number of concurrent `server_info`
+                 requests for servers outside the deployment
+    :return: generator of `(server_href, state)` tuples yielded as each
+             server reaches a target state, servers still pending when the
+             timeout expires are yielded with a state of None
+    """
+    if isinstance(target_states, six.string_types):
+        target_states = [target_states]
+    pending = list(server_hrefs)
+    deadline = time.time() + timeout
+    attempt = 0
+
+    while pending:
+        states = _poll_states(pending, deployment_id, jobs)
+        for server_href in list(pending):
+            if states.get(server_href) in target_states:
+                pending.remove(server_href)
+                yield server_href, states[server_href]
+
+        remaining = deadline - time.time()
+        if not pending or remaining <= 0:
+            break
+        delay = min(max_interval, interval * 2 ** attempt)
+        time.sleep(min(remaining, random.uniform(delay / 2.0, delay)))
+        attempt += 1
+
+    for server_href in pending:
+        yield server_href, None
 
 
 def start_server(server_href, nickname=None):
@@ -128,24 +362,129 @@ def delete_server(server_href, nickname=None):
     :param nickname: (optional) String representing the nickname of the server
     :return: Boolean of operation success/failure
     """
+    server_href = _lookup_server(server_href, nickname)
+    _invalidate_lookup('server', nickname=nickname, href=server_href)
     return _request(
-        _lookup_server(server_href, nickname), method='DELETE',
-        prepend_api_base=False
+        server_href, method='DELETE', prepend_api_base=False
     ).status_code == 200
 
 
-def create_server(nickname, instance_type, create_server_parameters=None):
+SERVER_OPERATIONS = {
+    'start': ('%s/start', 'POST', 201),
+    'stop': ('%s/stop', 'POST', 201),
+    'delete': ('%s', 'DELETE', 200),
+}
+
+
+def _server_operations(operation, server_hrefs, nicknames, jobs):
     """
-    Create a server.
+    Internal helper applying a server operation to many servers concurrently
+
+    :param operation: String key of `SERVER_OPERATIONS`
+    :param server_hrefs: list of URLs representing the servers
+    :param nicknames: list of Strings representing server nicknames,
+                      uncached nicknames are resolved with
+                      `find_servers`
+    :param jobs: maximum number of concurrent requests
+    :return: dict of each href or nickname to a dict with the keys `href`,
+             `success`, `status_code`, `location` and `error`
+    """
+    path, method, success_code = SERVER_OPERATIONS[operation]
+    results = {}
+    targets = [
+        (server_href, server_href) for server_href in server_hrefs or []]
+
+    nicknames = nicknames or []
+    cache = _lookup_cache()
+    hrefs = dict((nickname, cache.get('server', nickname))
+                 for nickname in nicknames)
+    found = find_servers(
+        [nickname for nickname, href in hrefs.items() if not href])
+    for nickname in nicknames:
+        href = hrefs[nickname] or found.get(nickname, {}).get('href')
+        if href:
+            targets.append((nickname, href))
+        else:
+            results[nickname] = dict(
+                href=None, success=False, status_code=None, location=None,
+                error=Exception('No server nicknamed %s found' % nickname))
+
+    def perform(target):
+        return _request(
+            path % target[1], method=method, prepend_api_base=False)
+
+    for target, response, error in imap_concurrently(perform, targets, jobs):
+        key, server_href = target
+        if operation == 'delete':
+            _invalidate_lookup('server', href=server_href)
+        if error:
+            results[key] = dict(
+                href=server_href, success=False, status_code=None,
+                location=None, error=error)
+        else:
+            results[key] = dict(
+                href=server_href,
+                success=response.status_code == success_code,
+                status_code=response.status_code,
+                location=response.headers.get('location'), error=None)
+    return results
 
-    :param nickname: String representing the nickname of the server
-    :param instance_type: String of the EC2 instance type
-    :param create_server_parameters: (optional) Dictionary of
-                                     server creation parameters
-    :return: server href of the new server
+
+def start_servers(server_hrefs=None, nicknames=None, jobs=None):
+    """
+    Starts many servers concurrently
+
+    :param server_hrefs: (optional) list of URLs representing the servers
+                         to start
+    :param nicknames: (optional) list of Strings representing the nicknames
+                      of the servers to start
+    :param jobs: (optional) maximum number of concurrent requests, defaults
+                 to `config.settings.concurrency`
+    :return: dict of each href or nickname to a dict with the keys `href`,
+             `success`, `status_code`, `location` and `error`
+    """
+    return _server_operations('start', server_hrefs, nicknames, jobs)
+
+
+def stop_servers(server_hrefs=None, nicknames=None, jobs=None):
+    """
+    Stops many servers concurrently
+
+    :param server_hrefs: (optional) list of URLs representing the servers
+                         to stop
+    :param nicknames: (optional) list of Strings representing the nicknames
+                      of the servers to stop
+    :param jobs: (optional) maximum number of concurrent requests, defaults
+                 to `config.settings.concurrency`
+    :return: dict of each href or nickname to a dict with the keys `href`,
+             `success`, `status_code`, `location` and `error`
+    """
+    return _server_operations('stop', server_hrefs, nicknames, jobs)
+
+
+def delete_servers(server_hrefs=None, nicknames=None, jobs=None):
+    """
+    Deletes many servers from RightScale concurrently
+
+    :param server_hrefs: (optional) list of URLs representing the servers
+                         to delete
+    :param nicknames: (optional) list of Strings representing the nicknames
+                      of the servers to delete
+    :param jobs: (optional) maximum number of concurrent requests, defaults
+                 to `config.settings.concurrency`
+    :return: dict of each href or nickname to a dict with the keys `href`,
+             `success`, `status_code`, `location` and `error`
+    """
+    return _server_operations('delete', server_hrefs, nicknames, jobs)
+
+
+def _create_server_data(nickname, instance_type, create_server_parameters):
+    """
+    Internal helper building the server creation form data
     """
     if not create_server_parameters:
-        create_server_parameters = config.settings.create_server_parameters
+        create_server_parameters = (
+            config.active_settings().create_server_parameters)
 
     create_data = {'server[nickname]': nickname}
 
@@ -159,16 +498,42 @@ def create_server(nickname, instance_type, create_server_parameters=None):
         create_data['server[%s]' % key] = value
     create_data['server[server_template_href]'] = instance_server_href
 
+    return create_data
+
+
+def create_server(nickname, instance_type, create_server_parameters=None):
+    """
+    Create a server.
+
+    :param nickname: String representing the nickname of the server
+    :param instance_type: String of the EC2 instance type
+    :param create_server_parameters: (optional) Dictionary of
+                                     server creation parameters
+    :return: server href of the new server
+    """
+    create_data = _create_server_data(
+        nickname, instance_type, create_server_parameters)
+
     response = _request('/servers', method='POST', body=urlencode(create_data))
+    _invalidate_lookup('server', nickname=nickname)
     location = response.headers.get('location')
-    debug(
-        'Created server %s: %s (%s:%s)' %
-        (nickname, location, response.status_code, response.content)
-    )
+    debug('Created server %s: %s (%s:%s)',
+          nickname, location, response.status_code, response.content)
     # TODO: error responses
     return location
 
 
+def _server_parameters_data(parameters):
+    """
+    Internal helper building the ServerTemplate parameters form data
+    """
+    input_data = []
+    for key in sorted(parameters.keys()):
+        input_data.append(
+            'server[parameters][%s]=text:%s' % (key.upper(), parameters[key]))
+    return '&'.join(input_data)
+
+
 def set_server_parameters(server_href, parameters):
     """
     Updates/sets any ServerTemplate parameters for a server
@@ -177,13 +542,8 @@ def set_server_parameters(server_href, parameters):
     :param parameters: Dictionary of ServerTemplate parameters to set
     :return: `requests.Response`
     """
-    input_data = []
-    for key in sorted(parameters.keys()):
-        input_data.append(
-            'server[parameters][%s]=text:%s' % (key.upper(), parameters[key]))
-    update = '&'.join(input_data)
     return _request(
-        server_href, method='PUT', body=update,
+        server_href, method='PUT', body=_server_parameters_data(parameters),
         headers={'Content-Type': 'application/x-www-form-urlencoded'},
         prepend_api_base=False)
 
@@ -216,11 +576,123 @@ def create_and_start_server(
         if success:
             location = start_server_response.headers['location']
         else:
-            debug(
-                'Start server %s failed with %s' %
-                (server_href, start_server_response.content)
-            )
+            debug('Start server %s failed with %s',
+                  server_href, start_server_response.content)
 
         return success, location
     else:
         return False, None
+
+
+def _provision(spec, create_server_parameters, outcome):
+    """
+    Internal helper creating, parameterising and starting the server of a
+    fleet spec, recording its progress in the `outcome` dict so failures
+    keep the href of a created server
+    """
+    outcome['stage'] = 'create'
+    server_href = create_server(
+        spec['nickname'], spec.get('instance_type') or 'm1.small',
+        spec.get('create_server_parameters') or create_server_parameters)
+    if not server_href:
+        raise Exception('Creating server %s failed' % spec['nickname'])
+    outcome['href'] = server_href
+
+    parameters = spec.get('server_template_parameters')
+    if parameters:
+        outcome['stage'] = 'parameters'
+        response = set_server_parameters(server_href, parameters)
+        if response.status_code >= 300:
+            raise Exception('Setting parameters of %s failed with %s: %s' % (
+                server_href, response.status_code, response.content))
+
+    outcome['stage'] = 'start'
+    response = start_server(server_href)
+    if response.status_code != 201:
+        raise Exception('Starting %s failed with %s: %s' % (
+            server_href, response.status_code, response.content))
+    outcome['location'] = response.headers.get('location')
+    outcome['state'] = 'pending'
+
+
+def _roll_back(outcomes, timeout, jobs):
+    """
+    Internal helper deleting the servers of failed fleet outcomes, servers
+    that were started are stopped first
+    """
+    failed = [outcome for outcome in outcomes
+              if outcome['error'] and outcome['href']]
+    started = [outcome['href'] for outcome in failed if outcome['location']]
+    if started:
+        stop_servers(started, jobs=jobs)
+        for server_href, state in wait_for_state(
+                started, 'stopped', timeout=timeout, jobs=jobs):
+            debug('Rolling back %s: %s', server_href, state or 'not stopped')
+    results = delete_servers(
+        [outcome['href'] for outcome in failed], jobs=jobs)
+    for outcome in failed:
+        outcome['rolled_back'] = results[outcome['href']]['success']
+
+
+def create_and_start_servers(
+        specs, create_server_parameters=None, jobs=None, wait=False,
+        timeout=600, rollback=False):
+    """
+    Creates and starts a fleet of servers. Each server is created, has its
+    ServerTemplate parameters set and is started as soon as a worker is
+    free, so the stages of different servers overlap.
+
+    :param specs: list of dicts with the keys `nickname`, `instance_type`
+                  (defaults to `m1.small`) and optionally
+                  `server_template_parameters` and `create_server_parameters`
+    :param create_server_parameters: (optional) Dictionary of server creation
+                                     parameters of the specs without their own
+    :param jobs: (optional) maximum number of servers provisioned
+                 concurrently, defaults to `config.settings.concurrency`
+    :param wait: (optional) Boolean, wait for the started servers to be
+                 `operational` (see `wait_for_state`)
+    :param timeout: (optional) seconds to wait for the servers to be
+                    operational, and stopped when rolling back
+    :param rollback: (optional) Boolean, delete the servers that were
+                     created but failed a later stage, stopping them first
+                     when they were started
+    :return: list of dicts, in the order of `specs`, with the keys
+             `nickname`, `href`, `success`, `stage` (`create`, `parameters`,
+             `start` or `wait`, the last stage attempted), `state`,
+             `location` (of the started instance), `error` (the exception
+             of the failed stage or None) and `rolled_back`
+    """
+    outcomes = [
+        dict(nickname=spec['nickname'], href=None, success=False,
+             stage=None, state=None, location=None, error=None,
+             rolled_back=False)
+        for spec in specs]
+
+    def provision(index):
+        _provision(specs[index], create_server_parameters, outcomes[index])
+
+    for index, _, error in imap_concurrently(
+            provision, range(len(specs)), jobs, ordered=False):
+        outcomes[index]['error'] = error
+        if error:
+            debug('Provisioning %s failed at %s: %s',
+                  specs[index]['nickname'], outcomes[index]['stage'], error)
+
+    started = dict((outcome['href'], outcome) for outcome in outcomes
+                   if not outcome['error'])
+    if wait and started:
+        for server_href, state in wait_for_state(
+                list(started), 'operational', timeout=timeout, jobs=jobs):
+            outcome = started[server_href]
+            outcome['stage'] = 'wait'
+            outcome['state'] = state
+            if state is None:
+                outcome['error'] = Exception(
+                    'Server %s not operational after %ss' % (
+                        server_href, timeout))
+
+    for outcome in outcomes:
+        outcome['success'] = outcome['error'] is None
+    if rollback:
+        _roll_back(outcomes, timeout, jobs)
+    return outcomes
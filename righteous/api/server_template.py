@@ -1,14 +1,21 @@
 import re
 from ..compat import urlencode
-import json
 from .. import config
-from .base import _request, debug
+from .base import _request, _parse_json, _iter_json, _account_url, debug
+from .filters import filter_query, select
+from .resources import ServerTemplate, typed as _typed
 
 
-def list_server_templates():
+def list_server_templates(typed=False, filters=None, fields=None):
     """
     Lists ServerTemplates
 
+    :param typed: (optional) Boolean, return `ServerTemplate` records of
+                  `righteous.api.resources` instead of dicts
+    :param filters: (optional) dict of field to value of the
+                    ServerTemplates to list, see `righteous.api.filters`
+    :param fields: (optional) list of the fields of the ServerTemplates to
+                   return
     :return: list of dicts of server information with the following keys:
 
     ::
@@ -16,8 +23,35 @@ def list_server_templates():
         [u'description', u'is_head_version', u'created_at', u'updated_at',
          u'href', u'version', u'nickname']
     """
-    response = _request('/server_templates.js')
-    return json.loads(response.content)
+    query = filter_query(filters)
+    response = _request('/server_templates.js' + (query and '?' + query))
+    templates = _parse_json(response)
+    if filters or fields is not None:
+        templates = select(templates, filters, fields)
+    if typed:
+        return _typed(ServerTemplate, templates)
+    return templates
+
+
+def iter_server_templates(typed=False, filters=None, fields=None):
+    """
+    Iterates over the ServerTemplates, parsing the streamed response
+    incrementally so only one ServerTemplate is held in memory at a time
+
+    :param typed: (optional) Boolean, yield `ServerTemplate` records of
+                  `righteous.api.resources` instead of dicts
+    :param filters: (optional) dict of field to value of the
+                    ServerTemplates to list, see `righteous.api.filters`
+    :param fields: (optional) list of the fields of the ServerTemplates to
+                   return
+    :return: generator of dicts of ServerTemplate information (see
+             `list_server_templates`)
+    """
+    query = filter_query(filters)
+    response = _request(
+        '/server_templates.js' + (query and '?' + query), stream=True)
+    return _iter_json(response, resource=ServerTemplate if typed else None,
+                      filters=filters, fields=fields)
 
 
 def _extract_template_id(template_href):
@@ -28,7 +62,8 @@ def _extract_template_id(template_href):
                           href
     :return: String of the template_id or None
     """
-    result = re.match(config.account_url + config.settings.account_id +
+    settings = config.active_settings()
+    result = re.match(_account_url(settings) + settings.account_id +
                       '/ec2_server_templates/(\d+)',
                       template_href)
     if result:
@@ -36,12 +71,14 @@ def _extract_template_id(template_href):
     return None
 
 
-def server_template_info(template_href):
+def server_template_info(template_href, typed=False):
     """
     Details ServerTemplate information
 
     :param template_href: String representing the server template
                           href
+    :param typed: (optional) Boolean, return `ServerTemplate` records of
+                  `righteous.api.resources` instead of dicts
     :return: dict of server template information, with the following keys:
 
     ::
@@ -51,9 +88,9 @@ def server_template_info(template_href):
     """
     response = _request('/server_templates/%s.js' %
                         _extract_template_id(template_href))
-    template = json.loads(response.content)
+    template = _parse_json(response)
     if template:
-        return template
+        return _typed(ServerTemplate, template) if typed else template
     else:
         return None
 
@@ -81,10 +118,8 @@ def create_server_template(nickname, description, multi_cloud_image_href):
     success = response.status_code == 201
     if success:
         location = response.headers.get('location')
-        debug(
-            'Created server template %s: %s (%s:%s)' %
-            (nickname, location, response.status_code, response.content)
-        )
+        debug('Created server template %s: %s (%s:%s)',
+              nickname, location, response.status_code, response.content)
     # TODO: error responses
     return success, location
 
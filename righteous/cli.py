@@ -9,92 +9,193 @@ Usage:
   righteous [options] stop <environment>...
   righteous [options] status <environment>...
   righteous [options] delete <environment>...
+  righteous [options] daemon
   righteous --version
 
+Comma separated environments (web-1,web-2) are created concurrently.
+Commands are run by the daemon when one is listening on the socket, keeping
+the session, connections and caches between commands.
+
 Options:
   -c FILE --config=FILE        Configuration file path, ~/.righteous default
   -v --verbose                 Show debug output.
+  -j JOBS --jobs=JOBS          Number of concurrent API requests [default: 10]
+  -s --sort                    Sort listed servers by running days and status
+                               rows by nickname, once all are read.
+  -f FORMAT --format=FORMAT    Output of list and status: table, json, jsonl
+                               or csv [default: table]
+  --socket=PATH                Daemon socket [default: ~/.righteous.sock]
+  --no-daemon                  Run the command without the daemon.
   -h --help                    Show this screen.
 """
 from docopt import docopt
 import os
 import sys
-from pprint import pformat
-from datetime import datetime
-from StringIO import StringIO
-
-from clint.textui import puts, colored, puts_err
-from clint.textui import columns
 
+# the API and output modules are imported by the commands using them, so
+# `--version` and `--help` return without loading them
 import righteous
-from righteous.util import read_authentication, cache_authentication
-
-import logging
-log = logging.getLogger('tty') if sys.stdin.isatty() else logging.getLogger()
 
 AUTH_FILE = os.path.expanduser('~/.righteous')
 COL = 30
+# output formats of list and status, and the fields of their rows
+FORMATS = ('table', 'json', 'jsonl', 'csv')
+LIST_FIELDS = ('instance', 'size', 'creator', 'days')
+STATUS_FIELDS = ('nickname', 'instance_type', 'state', 'href', 'error')
+# commands run by a daemon, stop asks for confirmations on stdin
+DAEMON_COMMANDS = ('list', 'create', 'delete', 'status')
+
+# credentials and server defaults righteous was initialised with, a daemon
+# reuses its session while the configuration is unchanged
+_initialised = None
+
+
+# output streams looked up on each write, as clint binds the streams of its
+# import and the daemon redirects sys.stdout and sys.stderr to its clients
+def _stdout(text):
+    sys.stdout.write(text)
+    sys.stdout.flush()
+
+
+def _stderr(text):
+    sys.stderr.write(text)
+    sys.stderr.flush()
 
 
 def error(message):
-    puts_err(colored.red(message))
+    from clint.textui import puts_err, colored
+    puts_err(colored.red(message), stream=_stderr)
     exit(2)
 
 
-def print_running_servers(servers, exclude_states=['stopped']):
+def server_owner(server_info):
+    owner = [
+        p['value'][5:] for p in server_info['parameters']
+        if p['name'] == 'EMAIL'
+    ]
+    return owner[0] if len(owner) else None
 
-    def server_owner(server_info):
-        owner = [
-            p['value'][5:] for p in server_info['parameters']
-            if p['name'] == 'EMAIL'
-        ]
-        return owner[0] if len(owner) else None
 
-    output = StringIO()
-    now = datetime.now()
-    server_list = []
-    for server in servers['servers']:
-        server_info = righteous.server_info(server['href'])
-        server_settings = righteous.server_settings(server['href'])
-        owner = server_owner(server_info)
+def _server_lines(servers, now):
+    from datetime import datetime
+    from clint.textui import puts_err, colored
+    details = righteous.server_details([server['href'] for server in servers])
+    for server, server_details in zip(servers, details):
+        if server_details['error']:
+            puts_err(colored.magenta('Error querying %s @ %s: %s' % (
+                server['nickname'], server['href'], server_details['error'])),
+                stream=_stderr)
+            continue
+
         running = now - datetime.strptime(
             server['created_at'], '%Y/%m/%d %H:%M:%S +0000'
         )
-        if server['state'] not in exclude_states:
-            server_list.append(
-                dict(
-                    days=running.days,
-                    instance=server['nickname'],
-                    size=server_settings['ec2-instance-type'],
-                    creator=owner
-                )
-            )
+        yield dict(
+            days=running.days,
+            instance=server['nickname'],
+            size=server_details['settings']['ec2-instance-type'],
+            creator=server_owner(server_details['info'])
+        )
+
+
+def running_servers(servers, exclude_states=['stopped']):
+    """
+    Generator of the lines of `print_running_servers`, querying the details
+    of `righteous.config.settings.concurrency` servers at a time as
+    `servers` are read
+    """
+    from datetime import datetime
+    now = datetime.now()
+    batch = []
+    for server in servers:
+        if server['state'] in exclude_states:
+            continue
+        batch.append(server)
+        if len(batch) >= righteous.config.settings.concurrency:
+            for line in _server_lines(batch, now):
+                yield line
+            batch = []
+    for line in _server_lines(batch, now):
+        yield line
+
+
+def print_running_servers(servers, exclude_states=['stopped'], sort=False):
+    """
+    Prints a table of servers, a row at a time as `servers` are read unless
+    the rows are sorted by running days
+    """
+    from clint.textui import puts, colored, columns
 
     puts(columns(
         [(colored.red('Instance')), COL],
         [(colored.green('Size')), COL],
         [(colored.magenta('Creator')), COL],
         [(colored.cyan('Running days')), COL],
-    ), stream=output.write)
+    ), stream=_stdout)
 
-    for line in sorted(server_list, key=lambda d: d['days']):
+    lines = running_servers(servers, exclude_states)
+    if sort:
+        lines = sorted(lines, key=lambda d: d['days'])
+    for line in lines:
         puts(columns(
             [line['instance'], COL],
             [line['size'], COL],
             [line['creator'], COL],
             [str(line['days']), COL],
-        ), stream=output.write)
-
-    print(output.getvalue())
+        ), stream=_stdout)
+
+
+def output_format(arguments):
+    """
+    Validated `--format` of a command
+    """
+    if arguments['--format'] not in FORMATS:
+        error('Unknown format %s, use one of %s' % (
+            arguments['--format'], ', '.join(FORMATS)))
+    return arguments['--format']
+
+
+def print_rows(rows, fields, output_format):
+    """
+    Prints rows as they are read, as a JSON array (`json`), a JSON object
+    per line (`jsonl`) or CSV with a header of `fields`. Rows are dicts of
+    `fields`, JSON output also includes any other keys of the rows.
+    """
+    import json
+    from collections import OrderedDict
+
+    def ordered(row):
+        return OrderedDict(
+            [(field, row.get(field)) for field in fields] +
+            sorted((key, value) for key, value in row.items()
+                   if key not in fields))
+
+    if output_format == 'csv':
+        import csv
+        writer = csv.DictWriter(
+            sys.stdout, fields, extrasaction='ignore', lineterminator='\n')
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            sys.stdout.flush()
+    elif output_format == 'jsonl':
+        for row in rows:
+            _stdout(json.dumps(ordered(row)) + '\n')
+    else:
+        separator = '[\n'
+        for row in rows:
+            _stdout(separator + json.dumps(ordered(row)))
+            separator = ',\n'
+        _stdout('[]\n' if separator == '[\n' else '\n]\n')
 
 
 def initialise(arguments):
+    from righteous.util import (
+        read_authentication, cache_authentication, read_session
+    )
     verbose = arguments['--verbose']
     config_file = arguments['--config']
 
-    if verbose:
-        logging.basicConfig(level=logging.DEBUG)
-
     config = read_authentication(config_file or AUTH_FILE)
     if not config:
         error('No configuration found. Either create "%s" or specify a '
@@ -104,25 +205,61 @@ def initialise(arguments):
         config.get('auth', key) for key in config.options('auth')
     )
 
+    global _initialised
     server_parameters = dict(config.items('server-defaults'))
+    configuration = (
+        username, password, account_id, sorted(server_parameters.items()))
+    righteous.config.settings.concurrency = int(arguments['--jobs'])
+    if configuration == _initialised and righteous.config.settings.cookies:
+        return verbose
+    _initialised = None
     righteous.initialise(username, password, account_id, **server_parameters)
 
-    if righteous.login():
+    cookie, expires = read_session(config)
+    if cookie:
+        righteous.config.settings.cookies = cookie
+        righteous.config.settings.cookies_expires = expires
+    elif righteous.login():
         cache_authentication(
             username, password, account_id, config_file or AUTH_FILE)
     else:
         error('Authentication failed')
 
+    _initialised = configuration
     return verbose
 
 
+def update_session_cache(arguments):
+    """
+    Caches the session cookie after a login so the next invocation reuses it
+    """
+    from righteous.util import read_authentication, read_session, cache_session
+    auth_file = arguments['--config'] or AUTH_FILE
+    settings = righteous.config.settings
+    cookie = settings.cookies
+    config = read_authentication(auth_file)
+    if config and cookie and read_session(config)[0] != cookie:
+        cache_session(
+            cookie, settings.cookies_expires, settings.username,
+            settings.account_id, auth_file)
+
+
 def list(arguments):
+    output = output_format(arguments)
     initialise(arguments)
-    servers = righteous.list_servers()
-    print_running_servers(servers, exclude_states=[])
+    servers = righteous.iter_servers()
+    if output == 'table':
+        return print_running_servers(
+            servers, exclude_states=[], sort=arguments['--sort'])
+
+    lines = running_servers(servers, exclude_states=[])
+    if arguments['--sort']:
+        lines = sorted(lines, key=lambda d: d['days'])
+    print_rows(lines, LIST_FIELDS, output)
 
 
 def create(arguments):
+    from clint.textui import puts, colored, puts_err
     initialise(arguments)
 
     server_template_parameters = {}
@@ -130,92 +267,217 @@ def create(arguments):
         param, value = argument.split('=')
         server_template_parameters[param] = value
 
-    success, location = righteous.create_and_start_server(
-        arguments['<environment>'][0],
-        arguments['<instance-type>'] or 'm1.small',
-        server_template_parameters=server_template_parameters)
-    if success:
-        puts(colored.green('Created and started environment %s @ %s' %
-            (arguments['<environment>'][0], location)))
-    else:
-        error('Error creating environment %s' % arguments['<environment>'][0])
+    # comma separated environments are provisioned concurrently
+    environments = arguments['<environment>'][0].split(',')
+    results = righteous.create_and_start_servers([
+        dict(nickname=environment,
+             instance_type=arguments['<instance-type>'] or 'm1.small',
+             server_template_parameters=server_template_parameters)
+        for environment in environments])
+    for result in results:
+        if result['success']:
+            puts(colored.green('Created and started environment %s @ %s' %
+                (result['nickname'], result['location'])), stream=_stdout)
+        else:
+            puts_err(colored.red('Error creating environment %s (%s): %s' % (
+                result['nickname'], result['stage'], result['error'])),
+                stream=_stderr)
+    if not all(result['success'] for result in results):
+        sys.exit(2)
 
 
 def stop(arguments):
+    from six.moves import input
+    from clint.textui import puts, colored, puts_err
     initialise(arguments)
 
+    environments = []
     for environment in arguments['<environment>']:
-        answer = raw_input('Confirm decommission of %s [Y/n] ' % environment)
+        answer = input('Confirm decommission of %s [Y/n] ' % environment)
         if answer in ['n', 'no']:
             continue
+        environments.append(environment)
 
-        server = righteous.find_server(environment)
-        success = righteous.stop_server(server['href'])
-        if success:
+    results = righteous.stop_servers(nicknames=environments)
+    for environment in environments:
+        result = results[environment]
+        if result['success']:
             puts(colored.cyan('Initiated decommission of %s @ %s' %
-                (environment, server['href'])))
+                (environment, result['href'])), stream=_stdout)
         else:
             puts_err(
                 colored.magenta('Error stopping server %s @ %s' % (
-                    environment, server['href'])))
+                    environment, result['href'])), stream=_stderr)
 
 
 def delete(arguments):
+    from clint.textui import puts, colored, puts_err
     initialise(arguments)
-    for environment in arguments['<environment>']:
-        server = righteous.find_server(environment)
-        success = righteous.delete_server(server['href'])
-        if success:
+
+    environments = arguments['<environment>']
+    results = righteous.delete_servers(nicknames=environments)
+    for environment in environments:
+        result = results[environment]
+        if result['success']:
             puts(colored.green('Successfully deleted %s @ %s' %
-                (environment, server['href'])))
+                (environment, result['href'])), stream=_stdout)
         else:
             puts_err(
                 colored.magenta('Error deleting %s @ %s' % (
-                    environment, server['href'])))
+                    environment, result['href'])), stream=_stderr)
+
+
+def _environment_status(environment, servers, verbose):
+    """
+    Server, settings and, when verbose, information of an environment,
+    environments missing from `servers` are looked up by nickname
+    """
+    server = servers.get(environment) or righteous.find_server(environment)
+    if not server:
+        return None
+    settings = righteous.server_settings(server['href'])
+    info = righteous.server_info(server['href']) if verbose else None
+    return server, settings, info
+
+
+def _status_row(environment, result, error, verbose):
+    """
+    Row of `STATUS_FIELDS` of an environment for the machine readable
+    formats, with the server `info` and `settings` when verbose
+    """
+    row = dict((field, None) for field in STATUS_FIELDS)
+    row['nickname'] = environment
+    if error:
+        row['error'] = str(error)
+    elif result is None:
+        row['error'] = 'Not Found'
+    else:
+        server, settings, server_info = result
+        row.update(
+            instance_type=settings['ec2-instance-type'],
+            state=server['state'], href=server['href'])
+        if verbose:
+            row.update(info=server_info, settings=settings)
+    return row
 
 
 def status(arguments):
-    output = StringIO()
+    from functools import partial
+    from pprint import pformat
+    from clint.textui import puts, puts_err, colored, columns
+    from righteous.api.parallel import imap_concurrently
+    from righteous.api.server import NICKNAME_LOOKUPS
+    output = output_format(arguments)
     verbose = initialise(arguments)
     environments = arguments['<environment>']
 
-    if environments:
-        puts(columns(
-            [(colored.green('Nickname')), 15],
-            [(colored.green('Instance Type')), 10],
-            [(colored.green('Status')), 20],
-            [(colored.green('Instance href')), 60],
-        ), stream=output.write)
-
-    for environment in environments:
-        server = righteous.find_server(environment)
-        if server:
-            settings = righteous.server_settings(server['href'])
-            if verbose:
-                server_info = righteous.server_info(server['href'])
-                puts('Server Info:\n' + colored.cyan(pformat(server_info)))
-                puts('Server Settings:\n' + colored.cyan(pformat(settings)))
-
-            puts(columns(
-                [environment, 15],
-                [settings['ec2-instance-type'], 10],
-                [server['state'] if server else 'Found', 20],
-                [server['href'] if server else 'Not', 60],
-
-            ), stream=output.write)
-        else:
-            puts(
-                colored.red('%s: Not Found' % environment),
-                stream=output.write)
-
-    print(output.getvalue())
+    # a few environments are resolved with filtered nickname requests, more
+    # with a single listing of the default deployment, those not found are
+    # then looked up by nickname
+    servers = {}
+    deployment_id = righteous.config.settings.default_deployment_id
+    if len(set(environments)) <= NICKNAME_LOOKUPS:
+        try:
+            servers = righteous.find_servers(environments)
+        except Exception as e:
+            puts_err(colored.magenta('Error finding servers: %s' % e),
+                     stream=_stderr)
+    elif deployment_id:
+        try:
+            servers = righteous.find_servers(
+                environments, deployment_id=deployment_id)
+        except Exception as e:
+            puts_err(colored.magenta('Error listing deployment %s: %s' % (
+                deployment_id, e)), stream=_stderr)
+
+    # rows are printed as environments are queried, unless sorted
+    results = imap_concurrently(
+        partial(_environment_status, servers=servers, verbose=verbose),
+        environments, ordered=False)
+    if arguments['--sort']:
+        results = sorted(results, key=lambda result: result[0])
+    if output != 'table':
+        return print_rows(
+            (_status_row(environment, result, error, verbose)
+             for environment, result, error in results),
+            STATUS_FIELDS, output)
 
+    puts(columns(
+        [(colored.green('Nickname')), 15],
+        [(colored.green('Instance Type')), 10],
+        [(colored.green('Status')), 20],
+        [(colored.green('Instance href')), 60],
+    ), stream=_stdout)
+
+    for environment, result, error in results:
+        if error:
+            puts_err(colored.magenta('Error querying %s: %s' % (
+                environment, error)), stream=_stderr)
+            continue
+        if result is None:
+            puts(colored.red('%s: Not Found' % environment), stream=_stdout)
+            continue
 
-def main():
-    arguments = docopt(__doc__, version=righteous.__version__)
-    for command in ['list', 'create', 'stop', 'delete', 'status']:
-        if arguments[command]:
-            globals()[command](arguments)
+        server, settings, server_info = result
+        if verbose:
+            puts('Server Info:\n' + colored.cyan(pformat(server_info)),
+                 stream=_stdout)
+            puts('Server Settings:\n' + colored.cyan(pformat(settings)),
+                 stream=_stdout)
+        puts(columns(
+            [environment, 15],
+            [settings['ec2-instance-type'], 10],
+            [server['state'], 20],
+            [server['href'], 60],
+        ), stream=_stdout)
+
+
+def daemon(arguments):
+    from clint.textui import puts, colored
+    from righteous.daemon import Daemon
+
+    def run_command(argv):
+        run(docopt(__doc__, argv=argv, version=righteous.__version__))
+
+    server = Daemon(run_command, arguments['--socket'])
+    puts(colored.green('Listening on %s' % server.path), stream=_stdout)
+    server.serve()
+
+
+def run(arguments):
+    import logging
+    # debug output of this command only, a daemon runs later commands with
+    # the same loggers
+    logger = logging.getLogger('righteous')
+    level, handler = logger.level, None
+    if arguments['--verbose']:
+        handler = logging.StreamHandler(sys.stderr)
+        logger.addHandler(handler)
+        logger.setLevel(logging.DEBUG)
+    try:
+        for command in ['list', 'create', 'stop', 'delete', 'status']:
+            if arguments[command]:
+                globals()[command](arguments)
+                update_session_cache(arguments)
+    finally:
+        if handler is not None:
+            logger.removeHandler(handler)
+            logger.setLevel(level)
+
+
+def main(argv=None):
+    arguments = docopt(__doc__, argv=argv, version=righteous.__version__)
+    if arguments['daemon']:
+        return daemon(arguments)
+
+    if not arguments['--no-daemon'] and any(
+            arguments[command] for command in DAEMON_COMMANDS):
+        from righteous.daemon import forward
+        status = forward(
+            sys.argv[1:] if argv is None else argv, arguments['--socket'])
+        if status is not None:
+            sys.exit(status)
+    run(arguments)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,135 @@
+"""
+righteous.client
+
+A RightScale API client per account, so one process can manage many
+accounts concurrently. Each `Client` has its own settings: credentials,
+session cookie, connection pool, caches, retry and rate limiting state and
+hooks. The module level functions of `righteous` use `config.settings`,
+the settings of `default_client`.
+
+::
+
+    production = righteous.Client(username, password, '1234')
+    staging = righteous.Client(username, password, '5678')
+    production.login()
+    production.list_servers()
+"""
+import functools
+import inspect
+
+from . import config
+from .api import base, hooks, server, server_template, deployment
+
+API = (
+    (base, (
+        'initialise', 'login', 'close_session', 'lookup_cache_stats',
+        'retry_stats',
+    )),
+    (hooks, ('add_hook', 'remove_hook')),
+    (server, (
+        'list_servers', 'iter_servers', 'find_server', 'find_servers',
+        'server_info', 'server_settings', 'server_details',
+        'create_and_start_server', 'create_and_start_servers',
+        'create_server', 'set_server_parameters',
+        'start_server', 'stop_server', 'delete_server', 'start_servers',
+        'stop_servers', 'delete_servers', 'wait_for_state',
+    )),
+    (server_template, (
+        'list_server_templates', 'iter_server_templates',
+        'server_template_info', 'create_server_template',
+        'delete_server_template',
+    )),
+    (deployment, (
+        'find_deployment', 'list_deployments', 'iter_deployments',
+        'deployment_info', 'create_deployment', 'delete_deployment',
+        'duplicate_deployment',
+    )),
+)
+
+
+def _method(function):
+    """
+    Internal helper turning an API function into a method calling it with
+    the client settings active
+    """
+    if inspect.isgeneratorfunction(function):
+        def method(self, *args, **kwargs):
+            with self.activate():
+                generator = function(*args, **kwargs)
+            while True:
+                with self.activate():
+                    try:
+                        item = next(generator)
+                    except StopIteration:
+                        return
+                yield item
+    else:
+        def method(self, *args, **kwargs):
+            with self.activate():
+                return function(*args, **kwargs)
+    return functools.wraps(function)(method)
+
+
+class Client(object):
+    """
+    RightScale API client of one account, with the API functions of
+    `righteous` as methods. Clients share no mutable state and can be used
+    from different threads at the same time.
+
+    :param username: (optional) String of a Rightscale username, the client
+                     is initialised when credentials are given
+    :param password: (optional) String of the user's password
+    :param account_id: (optional) String of the Rightscale account_id
+    :param account_url: (optional) String of the API root, defaults to
+                        `config.account_url`
+    :param kwargs: (optional) Key word arguments of `initialise`: settings
+                   named in `config.DEFAULTS` such as `concurrency`,
+                   `retries`, `rate_limit`, `response_cache` or
+                   `lookup_cache_ttl`, and server creation parameters
+    """
+
+    def __init__(self, username=None, password=None, account_id=None,
+                 account_url=None, **kwargs):
+        self.settings = config.Settings(account_url=account_url)
+        if username or password or account_id:
+            self.initialise(username, password, account_id, **kwargs)
+
+    def activate(self):
+        """
+        Context manager making the client settings active in the current
+        thread (or asyncio task), for the `righteous` functions and
+        `righteous.aio` coroutines called within it
+        """
+        return config.activate(self.settings)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close_session()
+
+    def __repr__(self):
+        return '<Client %s@%s>' % (
+            self.settings.username, self.settings.account_id)
+
+
+for _module, _names in API:
+    for _name in _names:
+        setattr(Client, _name, _method(getattr(_module, _name)))
+
+
+class _DefaultClient(Client):
+    """
+    Client of the module level functions, using `config.settings`
+    """
+
+    def __init__(self):
+        pass
+
+    @property
+    def settings(self):
+        return config.settings
+
+
+# client of the module level functions
+default_client = _DefaultClient()
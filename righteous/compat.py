@@ -1,11 +1,17 @@
 import six
 
-urlencode = quote = None
+urlencode = quote = SafeConfigParser = ConfigParserError = None
 if six.PY3:
     import urllib.parse
+    import configparser
     urlencode = urllib.parse.urlencode
     quote = urllib.parse.quote
+    SafeConfigParser = configparser.ConfigParser
+    ConfigParserError = configparser.Error
 else:
     import urllib
+    import ConfigParser
     urlencode = urllib.urlencode
     quote = urllib.quote
+    SafeConfigParser = ConfigParser.SafeConfigParser
+    ConfigParserError = ConfigParser.Error
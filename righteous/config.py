@@ -4,58 +4,195 @@
 righteous.config
 
 
-Settings object, lifted from https://github.com/kennethreitz/requests
+Settings object, with the temporary override semantics of
+https://github.com/kennethreitz/requests
 """
+import copy
+import threading
+try:
+    from contextvars import ContextVar
+except ImportError:  # Python < 3.7
+    ContextVar = None
+
+# setting names and their defaults, mutable defaults are copied per instance
+DEFAULTS = (
+    ('debug', False),
+    ('debug_format', 'text'),
+    ('debug_limit', 1024),
+    ('debug_redact_headers', ('authorization', 'cookie', 'set-cookie')),
+    ('cookies', None),
+    ('cookies_expires', None),
+    ('username', None),
+    ('password', None),
+    ('account_id', None),
+    ('account_url', None),
+    ('api_base', None),
+    ('default_deployment_id', None),
+    ('create_server_parameters', {}),
+    ('requests_config', {}),
+    ('session', None),
+    ('aio_sessions', {}),
+    ('pool_connections', 10),
+    ('pool_maxsize', 10),
+    ('pool_block', False),
+    ('max_retries', 0),
+    ('keep_alive', True),
+    ('concurrency', 10),
+    ('lookup_cache', None),
+    ('lookup_cache_size', 1024),
+    ('lookup_cache_ttl', 300),
+    ('response_cache', None),
+    ('retries', {'GET': 3, 'DELETE': 3, 'PUT': 0, 'POST': 0}),
+    ('retry_status_codes', (429, 500, 502, 503, 504)),
+    ('retry_backoff', 0.5),
+    ('retry_max_backoff', 30),
+    ('retry_counter', None),
+    ('rate_limit', None),
+    ('rate_limit_burst', None),
+    ('rate_limiter', None),
+    ('hooks', {}),
+    ('login_lock', None),
+    ('aio_login_lock', None),
+)
 
 
 class Settings(object):
-    _singleton = {}
-
-    # attributes with defaults
-    __attrs__ = []
+    """
+    Slotted settings read on every request, all settings are declared in
+    `DEFAULTS` and initialised to their default or a keyword argument.
+    Calling an instance overrides settings in the calling thread (or asyncio
+    task) until the returned context exits, other threads are unaffected.
+    Calling the module level `settings` overrides the active settings, those
+    of the client activated if any::
+
+        with config.settings(debug=sys.stderr):
+            righteous.list_servers()
+    """
+    __slots__ = tuple(name for name, _ in DEFAULTS)
 
     def __init__(self, **kwargs):
-        super(Settings, self).__init__()
-
-        self.__dict__ = self._singleton
+        for name, default in DEFAULTS:
+            setattr(self, name, copy.copy(kwargs.pop(name, default)))
+        if kwargs:
+            raise AttributeError(
+                'Unknown settings: %s' % ', '.join(sorted(kwargs)))
 
     def __call__(self, *args, **kwargs):
-        # new instance of class to call
-        r = self.__class__()
+        return _Override(self, dict(*args, **kwargs))
+
 
-        # cache previous settings for __exit__
-        r.__cache = self.__dict__.copy()
-        map(self.__cache.setdefault, self.__attrs__)
+class _Overlay(object):
+    """
+    Settings overridden in one thread (or asyncio task), the overridden
+    settings are read and written locally and all others pass through to
+    the underlying settings
+    """
+    __slots__ = ('_settings', '_overrides')
 
-        # set new settings
-        self.__dict__.update(*args, **kwargs)
+    def __init__(self, settings, overrides):
+        object.__setattr__(self, '_settings', settings)
+        object.__setattr__(self, '_overrides', overrides)
 
-        return r
+    def __getattr__(self, name):
+        try:
+            return self._overrides[name]
+        except KeyError:
+            return getattr(self._settings, name)
+
+    def __setattr__(self, name, value):
+        if name in self._overrides:
+            self._overrides[name] = value
+        else:
+            setattr(self._settings, name, value)
+
+    def __call__(self, *args, **kwargs):
+        return _Override(self, dict(*args, **kwargs))
+
+
+def _overlays(active, settings):
+    """
+    Internal helper returning whether `active` is `settings` or overrides
+    them
+    """
+    while active is not settings:
+        if not isinstance(active, _Overlay):
+            return False
+        active = active._settings
+    return True
+
+
+class _Override(object):
+    """
+    Context manager returned by `Settings.__call__`, the overrides are
+    active in the calling thread (or asyncio task) until it exits
+    """
+    __slots__ = ('overlay', 'activation')
+
+    def __init__(self, target, overrides):
+        current = active_settings()
+        # the module level settings override the active settings, e.g. of
+        # an activated client, others nest within their active overrides
+        if target is settings or _overlays(current, target):
+            target = current
+        self.overlay = _Overlay(target, overrides)
+        self.activation = activate(self.overlay)
+        self.activation.__enter__()
 
     def __enter__(self):
-        pass
+        return self.overlay
 
     def __exit__(self, *args):
+        self.activation.__exit__(*args)
+
 
-        # restore cached copy
-        self.__dict__.update(self.__cache.copy())
-        del self.__cache
+settings = Settings()
 
-    def __getattribute__(self, key):
-        if key in object.__getattribute__(self, '__attrs__'):
-            try:
-                return object.__getattribute__(self, key)
-            except AttributeError:
-                return None
-        return object.__getattribute__(self, key)
+if ContextVar is not None:
+    _active = ContextVar('righteous_settings', default=None)
+else:
+    _active = threading.local()
 
 
-settings = Settings()
-settings.debug = False
-settings.cookies = None
-settings.username = None
-settings.password = None
-settings.account_id = None
-settings.requests_config = {}
+def active_settings():
+    """
+    Settings of the client active in the current thread (or asyncio task),
+    the module level `settings` otherwise
+    """
+    if ContextVar is not None:
+        active = _active.get()
+    else:
+        active = getattr(_active, 'settings', None)
+    return settings if active is None else active
+
+
+class activate(object):
+    """
+    Context manager making a settings object the active settings of the
+    current thread (or asyncio task) until it exits::
+
+        with config.activate(client.settings):
+            righteous.list_servers()
+    """
+
+    def __init__(self, active):
+        # keep overrides of the settings active in this thread
+        current = active_settings()
+        self.active = current if _overlays(current, active) else active
+        self.previous = None
+
+    def __enter__(self):
+        if ContextVar is not None:
+            self.previous = _active.set(self.active)
+        else:
+            self.previous = getattr(_active, 'settings', None)
+            _active.settings = self.active
+        return self.active
+
+    def __exit__(self, *args):
+        if ContextVar is not None:
+            _active.reset(self.previous)
+        else:
+            _active.settings = self.previous
+
 
 account_url = 'https://my.rightscale.com/api/acct/'
@@ -0,0 +1,208 @@
+"""
+righteous.daemon
+
+Opt-in long lived process running CLI commands sent over a Unix socket, so
+the authenticated session, connection pool and caches outlive a single
+`righteous` invocation. Start it with `righteous daemon`, the CLI forwards
+its commands to a running daemon and runs them itself otherwise.
+
+Each request is a JSON line of the command `argv` and working directory
+`cwd`, answered by JSON lines of `stdout` and `stderr` output as it is
+written and a final `exit` status. Commands run one at a time.
+"""
+import json
+import os
+import socket
+import sys
+import threading
+import traceback
+
+from six.moves import socketserver
+
+SOCKET_PATH = '~/.righteous.sock'
+
+
+def _frame(**message):
+    return (json.dumps(message) + '\n').encode('utf-8')
+
+
+class _Output(object):
+    """
+    Stream installed as `sys.stdout`/`sys.stderr` of the daemon, writing to
+    the client of the running command, or to the original stream between
+    commands. References kept to it (logging handlers, `settings.debug`)
+    follow the current client.
+    """
+
+    def __init__(self, name, stream):
+        self.name = name
+        self.stream = stream
+        self.client = None
+
+    def write(self, text):
+        client = self.client
+        if client is None:
+            return self.stream.write(text)
+        if text:
+            try:
+                client.write(_frame(**{self.name: text}))
+                client.flush()
+            except (IOError, OSError, socket.error):
+                # the client went away, finish the command regardless
+                self.client = None
+
+    def flush(self):
+        if self.client is None:
+            self.stream.flush()
+
+    def isatty(self):
+        return False
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline().decode('utf-8'))
+        except ValueError:
+            return
+        status = self.server.run_command(
+            request.get('argv', []), request.get('cwd'), self.wfile)
+        try:
+            self.wfile.write(_frame(exit=status))
+        except (IOError, OSError, socket.error):
+            pass
+
+
+class Daemon(socketserver.UnixStreamServer):
+    """
+    Unix socket server running commands with `run`, serving until
+    interrupted. The socket is only accessible to the current user.
+
+    :param run: callable running a command from a list of arguments, exit
+                statuses are read from `SystemExit`
+    :param path: (optional) String of the socket path
+    """
+
+    def __init__(self, run, path=SOCKET_PATH):
+        self.run = run
+        self.path = os.path.expanduser(path)
+        self._lock = threading.Lock()
+        if os.path.exists(self.path):
+            if is_running(self.path):
+                raise Exception('A daemon is already listening on %s' %
+                                self.path)
+            os.unlink(self.path)
+        umask = os.umask(0o077)
+        try:
+            socketserver.UnixStreamServer.__init__(self, self.path, _Handler)
+        finally:
+            os.umask(umask)
+        self.stdout = _Output('stdout', sys.stdout)
+        self.stderr = _Output('stderr', sys.stderr)
+
+    def run_command(self, argv, cwd, client):
+        """
+        Runs a command with its output sent to a client
+
+        :param argv: list of Strings of the command line arguments
+        :param cwd: String of the client working directory, or None
+        :param client: file object of the client connection
+        :return: Integer exit status
+        """
+        with self._lock:
+            directory = os.getcwd()
+            self.stdout.client = self.stderr.client = client
+            try:
+                if cwd:
+                    os.chdir(cwd)
+                self.run(argv)
+                return 0
+            except SystemExit as e:
+                if e.code is None or isinstance(e.code, int):
+                    return e.code or 0
+                self.stderr.write('%s\n' % e.code)
+                return 1
+            except Exception:
+                self.stderr.write(traceback.format_exc())
+                return 1
+            finally:
+                self.stdout.client = self.stderr.client = None
+                os.chdir(directory)
+
+    def serve(self):
+        """
+        Serves commands until interrupted, then removes the socket
+        """
+        streams = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = self.stdout, self.stderr
+        try:
+            self.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            sys.stdout, sys.stderr = streams
+            self.server_close()
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def is_running(path=SOCKET_PATH):
+    """
+    Whether a daemon is listening on a socket
+
+    :param path: (optional) String of the socket path
+    :return: Boolean
+    """
+    connection = _connect(path)
+    if connection is None:
+        return False
+    connection.close()
+    return True
+
+
+def _connect(path):
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(os.path.expanduser(path))
+    except (IOError, OSError, socket.error):
+        connection.close()
+        return None
+    return connection
+
+
+def forward(argv, path=SOCKET_PATH, stdout=None, stderr=None):
+    """
+    Runs a command in a running daemon, writing its output as it is received
+
+    :param argv: list of Strings of the command line arguments
+    :param path: (optional) String of the socket path
+    :param stdout: (optional) stream of the command output, `sys.stdout` by
+                   default
+    :param stderr: (optional) stream of the command errors, `sys.stderr` by
+                   default
+    :return: Integer exit status of the command, or None when no daemon is
+             listening
+    """
+    connection = _connect(path)
+    if connection is None:
+        return None
+    streams = dict(stdout=stdout or sys.stdout, stderr=stderr or sys.stderr)
+    try:
+        connection.sendall(_frame(argv=list(argv), cwd=os.getcwd()))
+        for line in connection.makefile('rb'):
+            message = json.loads(line.decode('utf-8'))
+            if 'exit' in message:
+                return message['exit']
+            for name, text in message.items():
+                streams[name].write(text)
+                streams[name].flush()
+    finally:
+        connection.close()
+    streams['stderr'].write('The daemon exited before the command ended\n')
+    return 1
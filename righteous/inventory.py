@@ -0,0 +1,315 @@
+"""
+righteous.inventory
+
+Local SQLite index of the deployments, servers (with their settings) and
+ServerTemplates of an account, answering lookups without API requests.
+`Inventory.sync` lists deployments and their servers in one streamed
+request and only queries the details of servers whose `updated_at` changed
+since the previous sync.
+
+::
+
+    inventory = Inventory('~/.righteous.db')
+    inventory.sync()
+    inventory.servers(owner='user@example.com', state='operational')
+    inventory.server_deployment('web-1')['nickname']
+"""
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+import righteous
+from .api.resources import TIMESTAMP_FORMAT
+
+# bump when the schema changes, older indexes are rebuilt
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS deployments (
+    href TEXT PRIMARY KEY, nickname TEXT, updated_at TEXT, data TEXT);
+CREATE INDEX IF NOT EXISTS deployments_nickname ON deployments (nickname);
+CREATE TABLE IF NOT EXISTS server_templates (
+    href TEXT PRIMARY KEY, nickname TEXT, updated_at TEXT, data TEXT);
+CREATE INDEX IF NOT EXISTS server_templates_nickname
+    ON server_templates (nickname);
+CREATE TABLE IF NOT EXISTS servers (
+    href TEXT PRIMARY KEY, nickname TEXT, state TEXT, deployment_href TEXT,
+    server_template_href TEXT, owner TEXT, instance_type TEXT,
+    updated_at TEXT, synced_at TEXT, info TEXT, settings TEXT);
+CREATE INDEX IF NOT EXISTS servers_nickname ON servers (nickname);
+CREATE INDEX IF NOT EXISTS servers_state ON servers (state);
+CREATE INDEX IF NOT EXISTS servers_deployment ON servers (deployment_href);
+CREATE INDEX IF NOT EXISTS servers_template
+    ON servers (server_template_href);
+CREATE INDEX IF NOT EXISTS servers_owner ON servers (owner);
+CREATE INDEX IF NOT EXISTS servers_instance_type ON servers (instance_type);
+CREATE TABLE IF NOT EXISTS sync (synced_at TEXT);
+"""
+
+# server lookup criteria and their columns
+SERVER_CRITERIA = (
+    'nickname', 'state', 'deployment_href', 'server_template_href', 'owner',
+    'instance_type'
+)
+
+
+def server_owner(parameters):
+    """
+    Email address of the creator of a server, from its `EMAIL` parameter
+
+    :param parameters: list of the server parameters (`server_info`)
+    :return: String of the email address or None
+    """
+    for parameter in parameters or []:
+        if parameter.get('name') == 'EMAIL':
+            return (parameter.get('value') or '').partition(':')[2] or None
+    return None
+
+
+def _now():
+    return datetime.utcnow().strftime(TIMESTAMP_FORMAT)
+
+
+def _stale(server, known):
+    """
+    Internal helper returning whether the indexed details of a listed server
+    are out of date, given the `(updated_at, synced_at)` of its row. API
+    timestamps have a precision of a second, servers updated in the second
+    they were last synced may have changed since.
+    """
+    if known is None or known[0] is None:
+        return True
+    return known[0] != server.get('updated_at') or known[0] >= known[1]
+
+
+class Inventory(object):
+    """
+    SQLite index of an account, safe to share between threads
+
+    :param path: (optional) String of the database file, in memory by default
+    :param client: (optional) `righteous.Client` to sync with, the module
+                   level functions (and active settings) by default
+    """
+
+    def __init__(self, path=':memory:', client=None):
+        if path != ':memory:':
+            path = os.path.expanduser(path)
+        self.client = client if client is not None else righteous
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        version = self._db.execute('PRAGMA user_version').fetchone()[0]
+        if version != SCHEMA_VERSION:
+            with self._db:
+                for table in ('deployments', 'server_templates', 'servers',
+                              'sync'):
+                    self._db.execute('DROP TABLE IF EXISTS %s' % table)
+        self._db.executescript(SCHEMA)
+        self._db.execute('PRAGMA user_version = %d' % SCHEMA_VERSION)
+
+    def close(self):
+        """
+        Closes the database
+        """
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # synchronisation
+
+    def sync(self, jobs=None):
+        """
+        Updates the index from the API. Deployments and ServerTemplates are
+        listed, the details of new servers and servers updated since the
+        previous sync are queried concurrently and removed resources are
+        deleted. Servers failing to be queried are retried by the next sync.
+
+        :param jobs: (optional) maximum number of concurrent requests,
+                     defaults to `config.settings.concurrency`
+        :return: dict of resource type (`deployments`, `server_templates`,
+                 `servers`) to dicts of `added`, `updated` and `removed`
+                 counts, servers also count `errors`
+        """
+        started = _now()
+        stats = dict(
+            (table, dict(added=0, updated=0, removed=0))
+            for table in ('deployments', 'server_templates', 'servers'))
+        stats['servers']['errors'] = 0
+
+        templates = list(self.client.iter_server_templates())
+        deployments, servers = [], []
+        for deployment in self.client.iter_deployments():
+            servers.extend(deployment.pop('servers', None) or [])
+            deployments.append(deployment)
+
+        with self._lock:
+            known = dict(
+                (href, (updated_at, synced_at))
+                for href, updated_at, synced_at in self._db.execute(
+                    'SELECT href, updated_at, synced_at FROM servers'))
+        stale = [
+            server for server in servers
+            if _stale(server, known.get(server['href']))]
+        details = self.client.server_details(
+            [server['href'] for server in stale], jobs=jobs)
+
+        with self._lock, self._db:
+            self._sync_rows('deployments', deployments, stats)
+            self._sync_rows('server_templates', templates, stats)
+            for server, detail in zip(stale, details):
+                self._store_server(server, detail, started, known, stats)
+            listed = set(server['href'] for server in servers)
+            for href in set(known) - listed:
+                self._db.execute('DELETE FROM servers WHERE href = ?', (href,))
+                stats['servers']['removed'] += 1
+            self._db.execute('DELETE FROM sync')
+            self._db.execute('INSERT INTO sync VALUES (?)', (started,))
+        return stats
+
+    def _sync_rows(self, table, items, stats):
+        known = dict(self._db.execute(
+            'SELECT href, updated_at FROM %s' % table))
+        for item in items:
+            href = item['href']
+            if href in known and known[href] == item.get('updated_at'):
+                continue
+            stats[table]['updated' if href in known else 'added'] += 1
+            self._db.execute(
+                'INSERT OR REPLACE INTO %s VALUES (?, ?, ?, ?)' % table,
+                (href, item.get('nickname'), item.get('updated_at'),
+                 json.dumps(item)))
+        listed = set(item['href'] for item in items)
+        for href in set(known) - listed:
+            self._db.execute('DELETE FROM %s WHERE href = ?' % table, (href,))
+            stats[table]['removed'] += 1
+
+    def _store_server(self, server, detail, synced_at, known, stats):
+        if detail['error']:
+            # retried by the next sync, an indexed server keeps its details
+            stats['servers']['errors'] += 1
+            if server['href'] in known:
+                self._db.execute(
+                    'UPDATE servers SET updated_at = NULL WHERE href = ?',
+                    (server['href'],))
+                return
+            info, settings, updated_at = server, None, None
+        else:
+            info, settings = detail['info'], detail['settings']
+            updated_at = info.get('updated_at')
+            stats['servers']['updated' if server['href'] in known
+                             else 'added'] += 1
+        self._db.execute(
+            'INSERT OR REPLACE INTO servers VALUES '
+            '(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (server['href'], info.get('nickname'), info.get('state'),
+             info.get('deployment_href'), info.get('server_template_href'),
+             server_owner(info.get('parameters')),
+             (settings or {}).get('ec2-instance-type'), updated_at,
+             synced_at, json.dumps(info),
+             None if settings is None else json.dumps(settings)))
+
+    @property
+    def synced_at(self):
+        """
+        Timestamp (API format) of the start of the last sync, or None
+        """
+        rows = self._rows('SELECT synced_at FROM sync')
+        return rows[0][0] if rows else None
+
+    # lookups
+
+    def _rows(self, query, parameters=()):
+        with self._lock:
+            return self._db.execute(query, parameters).fetchall()
+
+    @staticmethod
+    def _server(row):
+        server = json.loads(row[0])
+        server['settings'] = json.loads(row[1]) if row[1] else None
+        return server
+
+    def server(self, nickname=None, href=None):
+        """
+        Looks up a server by nickname or href
+
+        :return: dict of server information (see `righteous.server_info`)
+                 with its `settings` (see `righteous.server_settings`), or
+                 None
+        """
+        servers = self.servers(
+            **(dict(href=href) if href else dict(nickname=nickname)))
+        return servers[0] if servers else None
+
+    def servers(self, **criteria):
+        """
+        Looks up the servers matching all criteria
+
+        :param criteria: key word arguments of `nickname`, `state`,
+                         `deployment_href`, `server_template_href`, `owner`
+                         (email of the `EMAIL` parameter), `instance_type`
+                         or `href`
+        :return: list of server dicts (see `server`), ordered by nickname
+        """
+        unknown = set(criteria) - set(SERVER_CRITERIA + ('href',))
+        if unknown:
+            raise ValueError(
+                'Unknown criteria: %s' % ', '.join(sorted(unknown)))
+        names = sorted(criteria)
+        query = 'SELECT info, settings FROM servers'
+        if names:
+            query += ' WHERE ' + ' AND '.join(
+                '%s = ?' % name for name in names)
+        rows = self._rows(
+            query + ' ORDER BY nickname', [criteria[name] for name in names])
+        return [self._server(row) for row in rows]
+
+    def _resource(self, table, nickname, href):
+        column, value = ('href', href) if href else ('nickname', nickname)
+        rows = self._rows(
+            'SELECT data FROM %s WHERE %s = ?' % (table, column), (value,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def deployment(self, nickname=None, href=None):
+        """
+        Looks up a deployment by nickname or href
+
+        :return: dict of deployment information, without its servers, or None
+        """
+        return self._resource('deployments', nickname, href)
+
+    def server_deployment(self, nickname=None, href=None):
+        """
+        Looks up the deployment of a server, by the server nickname or href
+
+        :return: dict of deployment information (see `deployment`) or None
+        """
+        column, value = ('href', href) if href else ('nickname', nickname)
+        rows = self._rows(
+            'SELECT deployments.data FROM servers JOIN deployments ON '
+            'servers.deployment_href = deployments.href '
+            'WHERE servers.%s = ?' % column, (value,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def server_template(self, nickname=None, href=None):
+        """
+        Looks up a ServerTemplate by nickname or href
+
+        :return: dict of ServerTemplate information or None
+        """
+        return self._resource('server_templates', nickname, href)
+
+    def stats(self):
+        """
+        Number of indexed resources
+
+        :return: dict of resource type to count
+        """
+        return dict(
+            (table, self._rows('SELECT COUNT(*) FROM %s' % table)[0][0])
+            for table in ('deployments', 'server_templates', 'servers'))
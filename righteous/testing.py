@@ -0,0 +1,605 @@
+# coding: utf-8
+"""
+righteous.testing
+
+An in-process stand-in for the RightScale API 1.0, serving the resources
+righteous manages (login, deployments, servers, settings and
+ServerTemplates) from memory with configurable latency, error injection and
+dataset size. Used to run the integration tests offline and to benchmark
+the client.
+
+::
+
+    with FakeRightScale(servers=100, latency=0.05) as fake:
+        fake.initialise()
+        righteous.login()
+        righteous.list_servers()
+"""
+import base64
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+from email.utils import formatdate
+
+import six
+from six.moves import BaseHTTPServer, socketserver
+from six.moves.urllib.parse import urlsplit, parse_qs, parse_qsl
+
+from . import config
+
+TIMESTAMP_FORMAT = '%Y/%m/%d %H:%M:%S +0000'
+INSTANCE_TYPES = ('m1.small', 'm1.large')
+ROUTES = [
+    ('GET', r'/login$', 'login'),
+    ('GET', r'/deployments\.js$', 'list_deployments'),
+    ('POST', r'/deployments$', 'create_deployment'),
+    ('GET', r'/deployments/(\d+)\.js$', 'deployment'),
+    ('DELETE', r'/deployments/(\d+)$', 'delete_deployment'),
+    ('POST', r'/deployments/(\d+)/duplicate$', 'duplicate_deployment'),
+    ('GET', r'/servers\.js$', 'list_servers'),
+    ('POST', r'/servers$', 'create_server'),
+    ('GET', r'/servers/(\d+)\.js$', 'server'),
+    ('GET', r'/servers/(\d+)/settings\.js$', 'server_settings'),
+    ('PUT', r'/servers/(\d+)$', 'update_server'),
+    ('POST', r'/servers/(\d+)/start$', 'start_server'),
+    ('POST', r'/servers/(\d+)/stop$', 'stop_server'),
+    ('DELETE', r'/servers/(\d+)$', 'delete_server'),
+    ('GET', r'/server_templates\.js$', 'list_server_templates'),
+    ('POST', r'/server_templates$', 'create_server_template'),
+    ('GET', r'/(?:ec2_)?server_templates/(\d+)\.js$', 'server_template'),
+    ('DELETE', r'/(?:ec2_)?server_templates/(\d+)(?:\.js)?$',
+     'delete_server_template'),
+]
+
+
+def _timestamp():
+    return datetime.utcnow().strftime(TIMESTAMP_FORMAT)
+
+
+def _matches(item, filters):
+    """
+    RightScale API 1.0 filter matching, `field=value` matches items whose
+    field contains value and `field<>value` those whose field does not
+    """
+    for expression in filters:
+        negate = '<>' in expression
+        field, _, value = expression.partition('<>' if negate else '=')
+        if (value in six.text_type(item.get(field, ''))) == negate:
+            return False
+    return True
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, avoid delayed ACK stalls
+    disable_nagle_algorithm = True
+    fake = None
+
+    def log_message(self, *args):
+        pass
+
+    def _handle(self):
+        length = int(self.headers.get('content-length') or 0)
+        body = self.rfile.read(length) if length else b''
+        status, content, headers = self.fake.handle(
+            self.command, self.path, dict(
+                (key.lower(), value) for key, value in self.headers.items()),
+            body)
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(content)))
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+
+class _Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    # accept bursts of concurrent connections without SYN retransmits
+    request_queue_size = 128
+
+
+class FakeRightScale(object):
+    """
+    Fake RightScale API 1.0 server listening on a free local port, serving
+    requests on a background thread once started
+
+    :param username: (optional) String of the accepted username
+    :param password: (optional) String of the accepted password
+    :param account_id: (optional) String of the account id
+    :param deployments: (optional) number of deployments to generate
+    :param servers: (optional) number of servers generated per deployment
+    :param server_templates: (optional) number of ServerTemplates to generate
+                             (at least one per instance type)
+    :param latency: (optional) seconds added to every response, or a tuple of
+                    the minimum and maximum of a uniformly random latency
+    :param error_rate: (optional) fraction of requests failing with
+                       `error_status`
+    :param error_status: (optional) status code of injected errors
+    :param boot_time: (optional) seconds servers spend pending or
+                      decommissioning before becoming operational or stopped
+    :param session_ttl: (optional) seconds a login session cookie is valid
+    :param seed: (optional) seed of the latency and error randomness
+    """
+
+    def __init__(self, username='user@example.com', password='password',
+                 account_id='1234', deployments=1, servers=10,
+                 server_templates=2, latency=0, error_rate=0,
+                 error_status=503, boot_time=0.1, session_ttl=7200,
+                 seed=None):
+        self.username = username
+        self.password = password
+        self.account_id = account_id
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.boot_time = boot_time
+        self.session_ttl = session_ttl
+        self.random = random.Random(seed)
+        self.sessions = {}
+        self.deployments = {}
+        self.servers = {}
+        self.server_templates = {}
+        self.lock = threading.RLock()
+        self.routes = [
+            (method, re.compile(pattern), getattr(self, '_' + name))
+            for method, pattern, name in ROUTES
+        ]
+        self._ids = {}
+        self._thread = self._account_url = None
+        self._server = _Server(
+            ('127.0.0.1', 0), type('Handler', (_Handler,), {'fake': self}))
+        self.reset_stats()
+        self.populate(deployments, servers, server_templates)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    @property
+    def url(self):
+        """
+        String of the fake API root, e.g. `http://127.0.0.1:8000/api/acct/`
+        """
+        return 'http://127.0.0.1:%s/api/acct/' % self._server.server_port
+
+    def href(self, resource, id):
+        return '%s%s/%s/%s' % (self.url, self.account_id, resource, id)
+
+    def start(self):
+        """
+        Starts serving requests on a background thread
+        """
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, kwargs={'poll_interval': 0.05})
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops serving and restores `config.account_url` if `initialise`
+        changed it
+        """
+        if self._account_url is not None:
+            config.account_url = self._account_url
+            self._account_url = None
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread = None
+        self._server.server_close()
+
+    def server_defaults(self):
+        """
+        Server creation parameters, as in the `server-defaults` section of
+        the righteous configuration file
+        """
+        deployment_id = min(self.deployments) if self.deployments else None
+        defaults = {
+            'default_deployment_id': six.text_type(deployment_id),
+            'ec2_availability_zone': 'us-east-1a',
+            'cloud_id': '1',
+        }
+        for template_id, template in sorted(self.server_templates.items()):
+            defaults.setdefault(
+                template['instance_type'],
+                self.href('ec2_server_templates', template_id))
+        return defaults
+
+    def write_config(self, path):
+        """
+        Writes a righteous configuration file of the fake credentials and
+        `server_defaults`, e.g. for the CLI `--config` option
+        """
+        with open(path, 'w') as config_file:
+            config_file.write(
+                '[auth]\nusername = %s\npassword = %s\naccount_id = %s\n\n'
+                '[server-defaults]\n' % (
+                    self.username, self.password, self.account_id))
+            for key, value in sorted(self.server_defaults().items()):
+                config_file.write('%s = %s\n' % (key, value))
+
+    def initialise(self, **kwargs):
+        """
+        Points righteous at the fake API and initialises it with the fake
+        credentials and `server_defaults`
+        """
+        import righteous
+        if self._account_url is None:
+            self._account_url = config.account_url
+        config.account_url = self.url
+        parameters = self.server_defaults()
+        parameters.update(kwargs)
+        righteous.initialise(
+            self.username, self.password, self.account_id, **parameters)
+
+    def reset_stats(self):
+        """
+        Resets the request statistics
+        """
+        self.stats = dict(
+            requests=0, bytes_received=0, bytes_sent=0, errors=0, routes={})
+
+    # dataset
+
+    def _next_id(self, resource):
+        with self.lock:
+            self._ids[resource] = self._ids.get(resource, 0) + 1
+            return self._ids[resource]
+
+    def populate(self, deployments=1, servers=10, server_templates=2):
+        """
+        Generates deployments, each with `servers` servers, and ServerTemplates
+        """
+        for index in range(max(server_templates, len(INSTANCE_TYPES))):
+            self._add_server_template(
+                'template-%s' % index, 'generated template',
+                INSTANCE_TYPES[index % len(INSTANCE_TYPES)])
+        template_ids = sorted(self.server_templates)
+        for index in range(deployments):
+            deployment_id = self._add_deployment(
+                'deployment-%s' % index, 'generated deployment')
+            for server_index in range(servers):
+                template_id = template_ids[server_index % len(template_ids)]
+                server = self._add_server(
+                    'server-%s-%s' % (index, server_index), deployment_id,
+                    template_id)
+                server['parameters'] = {
+                    'EMAIL': 'user%s@example.com' % (server_index % 7)}
+                if server_index % 3:
+                    self._start(server, booted=True)
+
+    def _add_deployment(self, nickname, description):
+        deployment_id = self._next_id('deployments')
+        now = _timestamp()
+        self.deployments[deployment_id] = dict(
+            href=self.href('deployments', deployment_id), nickname=nickname,
+            description=description, tags=[], created_at=now, updated_at=now,
+            default_ec2_availability_zone=None, default_vpc_subnet_href=None)
+        return deployment_id
+
+    def _add_server_template(self, nickname, description, instance_type):
+        template_id = self._next_id('server_templates')
+        now = _timestamp()
+        self.server_templates[template_id] = dict(
+            href=self.href('ec2_server_templates', template_id),
+            nickname=nickname, description=description, version=0,
+            is_head_version=True, created_at=now, updated_at=now,
+            instance_type=instance_type)
+        return template_id
+
+    def _add_server(self, nickname, deployment_id, template_id, **settings):
+        server_id = self._next_id('servers')
+        now = _timestamp()
+        template = self.server_templates.get(template_id, {})
+        server = dict(
+            id=server_id, href=self.href('servers', server_id),
+            nickname=nickname, state='stopped', server_type='ec2',
+            tags=[], created_at=now, updated_at=now,
+            deployment_href=self.href('deployments', deployment_id),
+            deployment_id=deployment_id,
+            server_template_href=self.href('ec2_server_templates',
+                                           template_id),
+            current_instance_href=None, parameters={},
+            instance_type=settings.get('instance_type') or template.get(
+                'instance_type', 'm1.small'),
+            transition=None)
+        self.servers[server_id] = server
+        return server
+
+    def _refresh(self, server):
+        transition = server['transition']
+        if transition and transition[0] <= time.time():
+            server['state'] = transition[1]
+            server['transition'] = None
+            server['updated_at'] = _timestamp()
+            if server['state'] == 'stopped':
+                server['current_instance_href'] = None
+        return server
+
+    def _start(self, server, booted=False):
+        server['current_instance_href'] = self.href(
+            'ec2_instances', server['id'])
+        server['state'] = 'operational' if booted else 'pending'
+        server['transition'] = None if booted else (
+            time.time() + self.boot_time, 'operational')
+        server['updated_at'] = _timestamp()
+
+    def _stop(self, server):
+        server['state'] = 'decommissioning'
+        server['transition'] = (time.time() + self.boot_time, 'stopped')
+        server['updated_at'] = _timestamp()
+
+    # representations
+
+    def _server_json(self, server, parameters=False):
+        self._refresh(server)
+        representation = dict(
+            (key, server[key]) for key in (
+                'href', 'nickname', 'state', 'server_type', 'tags',
+                'created_at', 'updated_at', 'deployment_href',
+                'server_template_href', 'current_instance_href'))
+        if parameters:
+            representation['parameters'] = [
+                dict(name=name, value='text:%s' % value)
+                for name, value in sorted(server['parameters'].items())]
+        return representation
+
+    def _settings_json(self, server):
+        self._refresh(server)
+        running = server['current_instance_href'] is not None
+        address = '10.0.%s.%s' % (server['id'] // 250, server['id'] % 250)
+        return {
+            'ec2-instance-type': server['instance_type'],
+            'ec2-availability-zone': 'us-east-1a',
+            'cloud_id': 1,
+            'aws-id': 'i-%08x' % server['id'] if running else None,
+            'dns-name': 'ec2-%s.example.com' % server['id']
+            if running else None,
+            'private-dns-name': 'ip-%s.internal' % server['id']
+            if running else None,
+            'ip-address': address if running else None,
+            'private-ip-address': address if running else None,
+            'locked': False,
+            'pricing': 'on_demand',
+            'launched-by': self.username,
+        }
+
+    def _deployment_json(self, deployment_id):
+        representation = dict(self.deployments[deployment_id])
+        representation['servers'] = [
+            self._server_json(server)
+            for _, server in sorted(self.servers.items())
+            if server['deployment_id'] == deployment_id]
+        return representation
+
+    def _template_json(self, template):
+        return dict(
+            (key, value) for key, value in template.items()
+            if key != 'instance_type')
+
+    # request handling
+
+    def handle(self, method, path, headers, body):
+        """
+        Handles a request
+
+        :return: tuple of status code, body bytes and dict of headers
+        """
+        with self.lock:
+            self.stats['requests'] += 1
+            self.stats['bytes_received'] += len(body)
+        latency = self.latency
+        if isinstance(latency, (tuple, list)):
+            with self.lock:
+                latency = self.random.uniform(*latency)
+        if latency:
+            time.sleep(latency)
+
+        status, content, response_headers = self._dispatch(
+            method, path, headers, body)
+        response_headers.setdefault('Content-Type', 'application/json')
+        if content is None:
+            content = b''
+        elif not isinstance(content, bytes):
+            content = json.dumps(content).encode('utf-8')
+        if method == 'GET' and status == 200:
+            etag = '"%s"' % hashlib.md5(content).hexdigest()
+            response_headers['ETag'] = etag
+            if headers.get('if-none-match') == etag:
+                status, content = 304, b''
+        with self.lock:
+            self.stats['bytes_sent'] += len(content)
+        return status, content, response_headers
+
+    def _dispatch(self, method, path, headers, body):
+        url = urlsplit(path)
+        prefix = '/api/acct/%s' % self.account_id
+        if not url.path.startswith(prefix):
+            return 404, None, {}
+        resource = url.path[len(prefix):]
+        for route_method, pattern, handler in self.routes:
+            match = pattern.match(resource)
+            if match and route_method == method:
+                break
+        else:
+            return 404, None, {}
+
+        with self.lock:
+            routes = self.stats['routes']
+            routes[handler.__name__[1:]] = routes.get(
+                handler.__name__[1:], 0) + 1
+            failed = (self.error_rate and
+                      self.random.random() < self.error_rate)
+            if failed:
+                self.stats['errors'] += 1
+        if failed:
+            return self.error_status, None, {'Retry-After': '0'}
+
+        if handler != self._login and not self._authenticated(headers):
+            return 401, None, {}
+        query = parse_qs(url.query)
+        filters = query.get('filter', []) + query.get('filter[]', [])
+        form = dict(parse_qsl(body.decode('utf-8'))) if body else {}
+        with self.lock:
+            return handler(headers, filters, form, *match.groups())
+
+    def _authenticated(self, headers):
+        match = re.search(r'_session_id=([^;]+)', headers.get('cookie', ''))
+        with self.lock:
+            expires = match and self.sessions.get(match.group(1))
+        return bool(expires and expires > time.time())
+
+    def _login(self, headers, filters, form):
+        expected = base64.b64encode(six.b(
+            '%s:%s' % (self.username, self.password))).decode('ascii')
+        if headers.get('authorization') != 'Basic %s' % expected:
+            return 401, None, {}
+        token = uuid.uuid4().hex
+        expires = time.time() + self.session_ttl
+        self.sessions[token] = expires
+        return 204, None, {
+            'Set-Cookie': '_session_id=%s; path=/; expires=%s' % (
+                token, formatdate(expires, usegmt=True))}
+
+    def _list_deployments(self, headers, filters, form):
+        deployments = [
+            self._deployment_json(deployment_id)
+            for deployment_id in sorted(self.deployments)]
+        return 200, [d for d in deployments if _matches(d, filters)], {}
+
+    def _create_deployment(self, headers, filters, form):
+        deployment_id = self._add_deployment(
+            form.get('deployment[nickname]'),
+            form.get('deployment[description]'))
+        return 201, None, {
+            'Location': self.deployments[deployment_id]['href']}
+
+    def _deployment(self, headers, filters, form, deployment_id):
+        if int(deployment_id) not in self.deployments:
+            return 404, None, {}
+        return 200, self._deployment_json(int(deployment_id)), {}
+
+    def _delete_deployment(self, headers, filters, form, deployment_id):
+        if self.deployments.pop(int(deployment_id), None) is None:
+            return 404, None, {}
+        return 200, None, {}
+
+    def _duplicate_deployment(self, headers, filters, form, deployment_id):
+        original = self.deployments.get(int(deployment_id))
+        if original is None:
+            return 404, None, {}
+        duplicate_id = self._add_deployment(
+            original['nickname'] + ' v1', original['description'])
+        for server in list(self.servers.values()):
+            if server['deployment_id'] == int(deployment_id):
+                self._add_server(
+                    server['nickname'], duplicate_id,
+                    int(server['server_template_href'].rsplit('/', 1)[1]),
+                    instance_type=server['instance_type'])
+        return 201, None, {
+            'Location': self.deployments[duplicate_id]['href']}
+
+    def _list_servers(self, headers, filters, form):
+        servers = [
+            self._server_json(server)
+            for _, server in sorted(self.servers.items())]
+        return 200, [s for s in servers if _matches(s, filters)], {}
+
+    def _create_server(self, headers, filters, form):
+        deployment_href = form.get('server[deployment_href]', '')
+        template_href = form.get('server[server_template_href]', '')
+        try:
+            deployment_id = int(deployment_href.rstrip('/').rsplit('/', 1)[1])
+            template_id = int(template_href.rstrip('/').rsplit('/', 1)[1])
+        except (IndexError, ValueError):
+            return 422, b'deployment and server template required', {}
+        server = self._add_server(
+            form.get('server[nickname]'), deployment_id, template_id,
+            instance_type=form.get('server[instance_type]'))
+        return 201, None, {'Location': server['href']}
+
+    def _server(self, headers, filters, form, server_id):
+        server = self.servers.get(int(server_id))
+        if server is None:
+            return 404, None, {}
+        return 200, self._server_json(server, parameters=True), {}
+
+    def _server_settings(self, headers, filters, form, server_id):
+        server = self.servers.get(int(server_id))
+        if server is None:
+            return 404, None, {}
+        return 200, self._settings_json(server), {}
+
+    def _update_server(self, headers, filters, form, server_id):
+        server = self.servers.get(int(server_id))
+        if server is None:
+            return 404, None, {}
+        for key, value in form.items():
+            match = re.match(r'server\[parameters\]\[(\w+)\]$', key)
+            if match:
+                server['parameters'][match.group(1)] = value.partition(
+                    ':')[2]
+        server['updated_at'] = _timestamp()
+        return 204, None, {}
+
+    def _start_server(self, headers, filters, form, server_id):
+        server = self.servers.get(int(server_id))
+        if server is None:
+            return 404, None, {}
+        if self._refresh(server)['state'] != 'stopped':
+            return 422, b'Server is already running', {}
+        self._start(server)
+        return 201, None, {'Location': server['current_instance_href']}
+
+    def _stop_server(self, headers, filters, form, server_id):
+        server = self.servers.get(int(server_id))
+        if server is None:
+            return 404, None, {}
+        self._stop(server)
+        return 201, None, {}
+
+    def _delete_server(self, headers, filters, form, server_id):
+        server = self.servers.get(int(server_id))
+        if server is None:
+            return 404, None, {}
+        if self._refresh(server)['state'] != 'stopped':
+            return 422, b'Server must be stopped before deletion', {}
+        del self.servers[int(server_id)]
+        return 200, None, {}
+
+    def _list_server_templates(self, headers, filters, form):
+        templates = [
+            self._template_json(template)
+            for _, template in sorted(self.server_templates.items())]
+        return 200, [t for t in templates if _matches(t, filters)], {}
+
+    def _create_server_template(self, headers, filters, form):
+        template_id = self._add_server_template(
+            form.get('server_template[nickname]'),
+            form.get('server_template[description]'), 'm1.small')
+        return 201, None, {
+            'Location': self.server_templates[template_id]['href']}
+
+    def _server_template(self, headers, filters, form, template_id):
+        template = self.server_templates.get(int(template_id))
+        if template is None:
+            return 404, None, {}
+        return 200, self._template_json(template), {}
+
+    def _delete_server_template(self, headers, filters, form, template_id):
+        if self.server_templates.pop(int(template_id), None) is None:
+            return 404, None, {}
+        return 200, None, {}
@@ -1,4 +1,8 @@
-from ConfigParser import SafeConfigParser
+import time
+from .compat import SafeConfigParser, ConfigParserError
+
+# seconds before expiry at which a cached session cookie is no longer reused
+SESSION_EXPIRY_MARGIN = 60
 
 
 def read_authentication(auth_file):
@@ -30,5 +34,58 @@ def cache_authentication(username, password, account_id, auth_file):
     config.set('auth', 'username', username)
     config.set('auth', 'password', password)
     config.set('auth', 'account_id', account_id)
-    with open(auth_file, 'wb') as config_file:
+    with open(auth_file, 'w') as config_file:
+        config.write(config_file)
+
+
+def read_session(config):
+    """
+    Returns the cached session cookie of a configuration if it is still valid
+    and was cached for the configured username and account
+
+    :param config: `ConfigParser` instance returned by `read_authentication`
+    :return: tuple of the session cookie and its expiry timestamp (or None
+             if the cookie does not expire), `(None, None)` if no valid
+             cookie is cached
+    """
+    try:
+        session = dict(
+            (key, config.get('session', key)
+             if config.has_option('session', key) else '')
+            for key in ('cookie', 'expires', 'username', 'account_id'))
+        expires = float(session['expires']) if session['expires'] else None
+        owner = tuple(
+            config.get('auth', key) if config.has_option('auth', key) else ''
+            for key in ('username', 'account_id'))
+    except (ConfigParserError, ValueError):
+        # a malformed (e.g. hand edited) session has no cookie
+        return None, None
+
+    cookie = session['cookie']
+    if (not cookie or owner != (session['username'], session['account_id'])
+            or (expires and
+                expires < time.time() + SESSION_EXPIRY_MARGIN)):
+        return None, None
+    return cookie, expires
+
+
+def cache_session(cookie, expires, username, account_id, auth_file):
+    """
+    Stores the session cookie of an account in the auth_file
+
+    :param cookie: String of the RightScale session cookie
+    :param expires: Timestamp of the cookie expiry or None
+    :param username: String of the Rightscale username logged in
+    :param account_id: String of the Rightscale account_id logged in to
+    :param auth_file: String containing the path to the file
+    """
+    config = SafeConfigParser()
+    config.read(auth_file)
+    if not config.has_section('session'):
+        config.add_section('session')
+    config.set('session', 'cookie', (cookie or '').replace('%', '%%'))
+    config.set('session', 'expires', '%s' % (expires or ''))
+    config.set('session', 'username', username or '')
+    config.set('session', 'account_id', account_id or '')
+    with open(auth_file, 'w') as config_file:
         config.write(config_file)
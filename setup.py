@@ -105,6 +105,9 @@ setup(
         'righteous.api',
     ],
     install_requires=required,
+    extras_require={
+        'aio': ['aiohttp'],
+    },
     entry_points={
         'console_scripts': [
             'righteous = righteous.cli:main',
@@ -118,7 +121,6 @@ setup(
         'Natural Language :: English',
         'License :: OSI Approved :: ISC License (ISCL)',
         'Programming Language :: Python',
-        'Programming Language :: Python :: 2.6',
         'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3.3',
         'Programming Language :: Python :: Implementation :: PyPy',
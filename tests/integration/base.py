@@ -1,13 +1,47 @@
+import os
 import righteous
-from ConfigParser import SafeConfigParser
+from righteous.compat import SafeConfigParser
+from righteous.testing import FakeRightScale
 from ..compat import unittest
 
 
+def fake_api_config(fake_api):
+    """
+    Configuration pointing the integration tests at a `FakeRightScale`
+    """
+    config = SafeConfigParser()
+    config.add_section('auth')
+    config.set('auth', 'username', fake_api.username)
+    config.set('auth', 'password', fake_api.password)
+    config.set('auth', 'account_id', fake_api.account_id)
+    config.add_section('server-defaults')
+    for key, value in fake_api.server_defaults().items():
+        config.set('server-defaults', key, value)
+    config.add_section('server-templates')
+    config.set(
+        'server-templates', 'multi_cloud_image',
+        fake_api.href('multi_cloud_images', 1))
+    return config
+
+
 class RighteousIntegrationTestCase(unittest.TestCase):
+    # set RIGHTEOUS_FAKE_API=1 to run against righteous.testing.FakeRightScale
+    fake_api = None
 
     def setUp(self):
-        config = SafeConfigParser()
-        config.read('righteous.config')
+        self.prepare_test()
+
+    def prepare_test(self):
+        if os.environ.get('RIGHTEOUS_FAKE_API'):
+            if RighteousIntegrationTestCase.fake_api is None:
+                RighteousIntegrationTestCase.fake_api = FakeRightScale(
+                    boot_time=0.1).start()
+            fake_api = RighteousIntegrationTestCase.fake_api
+            righteous.config.account_url = fake_api.url
+            config = fake_api_config(fake_api)
+        else:
+            config = SafeConfigParser()
+            config.read('righteous.config')
         if not config.has_section('auth'):
             raise Exception('Please create a righteous.config file with '
                             'appropriate credentials')
@@ -22,6 +56,7 @@ class RighteousIntegrationTestCase(unittest.TestCase):
         righteous.init(
             self.auth['username'], self.auth['password'],
             self.auth['account_id'], **self.server)
+        righteous.login()
 
         self.config = config
         self.username = self.auth['username']
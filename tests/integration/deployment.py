@@ -11,8 +11,9 @@ class DeploymentTestCase(RighteousIntegrationTestCase):
         self.delete_deployment = True
         self.deployment = 'deployment-%s' % uuid4().hex
 
-    def tearDownClass(self):
-        for deployment_href in self.deployments:
+    @classmethod
+    def tearDownClass(cls):
+        for deployment_href in cls.deployments:
             righteous.delete_deployment(deployment_href)
 
     def test_list_deployments(self):
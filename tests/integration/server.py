@@ -1,13 +1,13 @@
 from uuid import uuid4
 import righteous
-from .base import RighteousTestCase
+from .base import RighteousIntegrationTestCase
 
 
-class ServerTestCase(RighteousTestCase):
+class ServerTestCase(RighteousIntegrationTestCase):
     envs = []
 
     def setUp(self):
-        super(RighteousTestCase, self).prepare_test()
+        super(ServerTestCase, self).prepare_test()
         self.delete_server = True
         self.env = 'env-%s' % uuid4().hex
 
@@ -17,8 +17,9 @@ class ServerTestCase(RighteousTestCase):
             if server:
                 righteous.stop_server(server['href'])
 
-    def tearDownClass(self):
-        for env in self.envs:
+    @classmethod
+    def tearDownClass(cls):
+        for env in cls.envs:
             stopped = False
             while not stopped:
                 server = righteous.find_server(env)
@@ -26,7 +27,8 @@ class ServerTestCase(RighteousTestCase):
                     stopped = server['state'] == 'stopped'
                 else:
                     stopped = True
-            righteous.delete_server(server['href'])
+            if server:
+                righteous.delete_server(server['href'])
 
     def _create_server(self, instance_type='m1.small'):
         parameters = dict(
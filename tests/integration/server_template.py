@@ -11,8 +11,9 @@ class ServerTemplateTestCase(RighteousIntegrationTestCase):
         self.delete_template = True
         self.template = 'template-%s' % uuid4().hex
 
-    def tearDownClass(self):
-        for template_href in self.templates:
+    @classmethod
+    def tearDownClass(cls):
+        for template_href in cls.templates:
             righteous.delete_server_template(template_href)
 
     def _create_template(self):
@@ -28,6 +29,7 @@ class ServerTemplateTestCase(RighteousIntegrationTestCase):
         if self.delete_template:
             self.templates.append(location)
         self.assertTrue(location)
+        return location
 
     def test_list_server_templates(self):
         self._create_template()
@@ -3,6 +3,7 @@ from mock import Mock, patch
 import six
 from righteous import config
 from righteous.config import Settings
+from righteous.testing import FakeRightScale
 import righteous
 
 unittest = None
@@ -14,6 +15,15 @@ else:
     unittest = unittest2
 
 
+def response(status_code=200, content=b'{}', headers=None, **kwargs):
+    """
+    Mock `requests.Response`
+    """
+    return Mock(
+        spec=requests.Response, status_code=status_code, content=content,
+        headers=headers or {}, **kwargs)
+
+
 class RighteousTestCase(unittest.TestCase):
 
     def setup_patching(self, request_module):
@@ -38,6 +48,12 @@ class RighteousTestCase(unittest.TestCase):
         config.settings.password = None
         config.settings.account_id = None
         config.settings.requests_config = {}
+        config.settings.session = None
+        config.settings.pool_connections = 10
+        config.settings.pool_maxsize = 10
+        config.settings.max_retries = 0
+        config.settings.keep_alive = True
+        config.settings.hooks = {}
 
 
 class ApiTestCase(RighteousTestCase):
@@ -46,4 +62,38 @@ class ApiTestCase(RighteousTestCase):
         righteous.init('user', 'pass', 'account_id')
 
     def tearDown(self):
+        super(ApiTestCase, self).tearDown()
+        self.initialise_settings()
+
+
+class FakeAPITestCase(RighteousTestCase):
+    """
+    Runs each test against a `FakeRightScale` (`self.fake`) of
+    `fake_options`, righteous initialised with `initialise_options` and
+    logged in unless `login` is False
+    """
+    fake_options = {}
+    initialise_options = {}
+    login = True
+
+    def start_fake(self, **options):
+        """
+        Starts a `FakeRightScale`, stopped after the test
+        """
+        options = dict(dict(boot_time=0, seed=1), **options)
+        fake = FakeRightScale(**options).start()
+        self.addCleanup(fake.stop)
+        return fake
+
+    def setUp(self):
+        self.initialise_settings()
+        self.fake = self.start_fake(**self.fake_options)
+        self.fake.initialise(**self.initialise_options)
+        config.settings.retry_backoff = 0
+        if self.login:
+            righteous.login()
+
+    def tearDown(self):
+        righteous.close_session()
+        super(FakeAPITestCase, self).tearDown()
         self.initialise_settings()
@@ -0,0 +1,167 @@
+import json
+import sys
+from mock import patch
+from righteous.compat import urlencode
+from righteous import config
+from righteous.config import account_url
+from .base import ApiTestCase, FakeAPITestCase, unittest
+
+
+@unittest.skipIf(sys.version_info < (3, 8), 'righteous.aio requires 3.8+')
+class AioTestCase(ApiTestCase):
+
+    def setUp(self):
+        import asyncio
+        from mock import AsyncMock
+        from righteous import aio
+        self.aio = aio
+        self.run = asyncio.run
+        self.response = aio.Response(200, {}, b'{}')
+        self.requests_patcher = patch(
+            'righteous.aio._request', new_callable=AsyncMock,
+            return_value=self.response)
+        self.request = self.requests_patcher.start()
+        self.initialise_settings()
+        super(AioTestCase, self).setUp()
+
+    def tearDown(self):
+        self.requests_patcher.stop()
+        super(AioTestCase, self).tearDown()
+
+    def test_response_headers(self):
+        response = self.aio.Response(201, {'Location': '/foo'}, b'')
+        self.assertEqual(response.headers['location'], '/foo')
+
+    def test_login(self):
+        self.response.status_code = 204
+        self.response.headers['set-cookie'] = 'cookie_value'
+        assert self.run(self.aio.login())
+        self.assertEqual(self.aio.config.settings.cookies, 'cookie_value')
+        self.request.assert_called_once_with(
+            '/login', headers={'Authorization': 'Basic dXNlcjpwYXNz'})
+
+    def test_server_info_by_nickname(self):
+        self.response.content = json.dumps([{'href': '/server/ref'}])
+        self.run(self.aio.server_info(None, nickname='kirk'))
+        self.run(self.aio.server_settings(None, nickname='kirk'))
+        self.request.assert_any_call('/servers.js?filter=nickname=kirk')
+        self.request.assert_any_call(
+            '/server/ref/settings.js', prepend_api_base=False)
+        self.assertEqual(self.request.call_count, 3)
+
+    def test_server_details(self):
+        details = self.run(self.aio.server_details(['/server/a', '/server/b']))
+        self.assertEqual(
+            [d['href'] for d in details], ['/server/a', '/server/b'])
+        self.assertEqual(details[1]['settings'], {})
+        self.assertEqual(self.request.call_count, 4)
+
+    def test_stop_servers(self):
+        self.response.status_code = 201
+        results = self.run(self.aio.stop_servers(['/server/a']))
+        assert results['/server/a']['success']
+        self.request.assert_called_once_with(
+            '/server/a/stop', method='POST', prepend_api_base=False)
+
+    def test_create_and_start_server(self):
+        create_server_parameters = {
+            'm1.small': account_url + '123/ec2_server_templates/52271',
+        }
+        self.response.status_code = 201
+        self.response.headers['location'] = '/server/new'
+        success, location = self.run(self.aio.create_and_start_server(
+            'arduous', 'm1.small', create_server_parameters,
+            server_template_parameters={'envname': 'arduous'}))
+        assert success
+        self.request.assert_any_call(
+            '/servers', method='POST', body=urlencode({
+                'server[nickname]': 'arduous',
+                'server[server_template_href]':
+                create_server_parameters['m1.small']}))
+        self.request.assert_any_call(
+            '/server/new', method='PUT',
+            body='server[parameters][ENVNAME]=text:arduous',
+            headers={'Content-Type': 'application/x-www-form-urlencoded'},
+            prepend_api_base=False)
+
+    def test_delete_deployment(self):
+        assert self.run(self.aio.delete_deployment('/deployment/ref'))
+        self.request.assert_called_once_with(
+            '/deployment/ref', method='DELETE', prepend_api_base=False)
+
+
+@unittest.skipIf(sys.version_info < (3, 8), 'righteous.aio requires 3.8+')
+class AioFakeTestCase(FakeAPITestCase):
+    fake_options = dict(servers=3)
+    login = False
+
+    def setUp(self):
+        import asyncio
+        from righteous import aio
+        self.aio = aio
+        self.run = asyncio.run
+        super(AioFakeTestCase, self).setUp()
+
+    def test_session_per_event_loop(self):
+        # each asyncio.run closes its loop without closing the session
+        assert self.run(self.aio.login())
+        first = self.run(self.aio.list_servers())
+        session, = config.settings.aio_sessions.values()
+        second = self.run(self.aio.list_servers())
+        other, = config.settings.aio_sessions.values()
+        self.assertEqual(first, second)
+        self.assertNotEqual(session, other)
+        self.assertTrue(session.closed)
+
+        self.run(self.aio.close_session())
+        self.assertEqual(config.settings.aio_sessions, {})
+
+    def test_retries(self):
+        config.settings.retry_backoff = 0
+        config.settings.retries = {'GET': 10}
+        config.settings.rate_limit = 1000
+        assert self.run(self.aio.login())
+        self.fake.error_rate = 0.5
+        self.fake.reset_stats()
+        results = self.run(self.aio._gather(
+            lambda index: self.aio.list_servers(), range(8)))
+        self.run(self.aio.close_session())
+
+        self.assertEqual([error for _, _, error in results], [None] * 8)
+        stats = self.aio.retry_stats()
+        self.assertEqual(stats['retries'], self.fake.stats['requests'] - 8)
+        self.assertEqual(list(stats['reasons']), [503])
+        self.assertTrue(stats['retries'])
+        self.assertTrue(config.settings.rate_limiter)
+
+    def test_hooks(self):
+        from righteous.api.metrics import MetricsCollector
+        assert self.run(self.aio.login())
+        hrefs = [server['href'] for server in
+                 self.run(self.aio.list_servers())['servers']]
+        with MetricsCollector() as metrics:
+            details = self.run(self.aio.server_details(hrefs))
+        self.run(self.aio.close_session())
+
+        self.assertEqual([detail['error'] for detail in details], [None] * 3)
+        stats = metrics.stats()
+        self.assertEqual(list(stats['functions']), ['server_details'])
+        self.assertEqual(stats['functions']['server_details']['count'], 6)
+        self.assertEqual(
+            stats['endpoints']['GET /servers/:id/settings.js']['count'], 3)
+
+    def test_single_flight_login(self):
+        import asyncio
+        assert self.run(self.aio.login())
+        # the session cookie expires
+        self.fake.sessions.clear()
+        self.fake.reset_stats()
+        loop = asyncio.new_event_loop()
+        try:
+            results = loop.run_until_complete(self.aio._gather(
+                lambda index: self.aio.list_servers(), range(16)))
+            loop.run_until_complete(self.aio.close_session())
+        finally:
+            loop.close()
+        self.assertEqual([error for _, _, error in results], [None] * 16)
+        self.assertEqual(self.fake.stats['routes']['login'], 1)
@@ -0,0 +1,42 @@
+from six import StringIO
+from benchmarks import client, startup
+from benchmarks.harness import BENCHMARKS, percentile, measure, compare
+from .base import RighteousTestCase
+
+hush_pyflakes = (client, startup)
+
+
+class BenchmarkTestCase(RighteousTestCase):
+
+    def tearDown(self):
+        self.initialise_settings()
+
+    def test_percentile(self):
+        samples = list(range(1, 101))
+        self.assertEqual(percentile(samples, 50), 50)
+        self.assertEqual(percentile(samples, 99), 99)
+        self.assertEqual(percentile([3, 1, 2], 100), 3)
+        self.assertEqual(percentile([1], 0), 1)
+
+    def test_measure(self):
+        result = measure(BENCHMARKS['list_servers[10]'], repeat=3)
+        self.assertEqual(result['repeat'], 3)
+        self.assertEqual(result['requests'], 1)
+        self.assertTrue(result['response_bytes'] > 0)
+        self.assertTrue(result['min'] <= result['p50'] <= result['max'])
+
+    def test_measure_cli(self):
+        result = measure(BENCHMARKS['cli_status'], repeat=1)
+        # a filtered nickname request and a settings request per server
+        self.assertEqual(result['requests'], 6)
+
+    def test_compare(self):
+        baseline = dict(benchmarks={'a': dict(p50=1.0), 'b': dict(p50=1.0)})
+        results = dict(benchmarks={
+            'a': dict(p50=1.1), 'b': dict(p50=1.5), 'c': dict(p50=1.0)})
+        self.assertEqual(compare(results, baseline, output=StringIO()), ['b'])
+
+    def test_measure_startup(self):
+        result = measure(BENCHMARKS['startup[import]'], repeat=1)
+        self.assertEqual(result['requests'], 0)
+        self.assertTrue(result['min'] > 0)
@@ -0,0 +1,143 @@
+import json
+import os
+import shutil
+import stat
+import tempfile
+from mock import patch
+from righteous.api.cache import (
+    LookupCache, MemoryResponseCache, FileResponseCache
+)
+from .base import unittest
+
+
+class LookupCacheTestCase(unittest.TestCase):
+
+    def test_get_and_set(self):
+        cache = LookupCache()
+        self.assertEqual(cache.get('server', 'kirk'), None)
+        cache.set('server', 'kirk', '/server/kirk')
+        self.assertEqual(cache.get('server', 'kirk'), '/server/kirk')
+        self.assertEqual(cache.get('deployment', 'kirk'), None)
+        self.assertEqual(
+            cache.stats(), dict(hits=1, misses=2, evictions=0, size=1))
+
+    def test_least_recently_used_eviction(self):
+        cache = LookupCache(max_size=2)
+        cache.set('server', 'kirk', '/server/kirk')
+        cache.set('server', 'spock', '/server/spock')
+        cache.get('server', 'kirk')
+        cache.set('server', 'sulu', '/server/sulu')
+
+        self.assertEqual(cache.get('server', 'spock'), None)
+        self.assertEqual(cache.get('server', 'kirk'), '/server/kirk')
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_expiry(self):
+        cache = LookupCache(ttl=10)
+        with patch('righteous.api.cache.time.time', return_value=100):
+            cache.set('server', 'kirk', '/server/kirk')
+        with patch('righteous.api.cache.time.time', return_value=109):
+            self.assertEqual(cache.get('server', 'kirk'), '/server/kirk')
+        with patch('righteous.api.cache.time.time', return_value=111):
+            self.assertEqual(cache.get('server', 'kirk'), None)
+
+    def test_disabled(self):
+        cache = LookupCache(ttl=0)
+        cache.set('server', 'kirk', '/server/kirk')
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_invalidate(self):
+        cache = LookupCache()
+        cache.set('server', 'kirk', '/server/kirk')
+        cache.set('server', 'spock', '/server/spock')
+        cache.set('deployment', 'kirk', '/deployment/kirk')
+
+        cache.invalidate('server', href='/server/spock')
+        cache.invalidate('server', nickname='kirk')
+        self.assertEqual(cache.stats()['size'], 1)
+        self.assertEqual(
+            cache.get('deployment', 'kirk'), '/deployment/kirk')
+
+
+def entry(content, etag='"v1"'):
+    return dict(etag=etag, last_modified=None, content=content)
+
+
+class MemoryResponseCacheTestCase(unittest.TestCase):
+
+    def test_get_and_set(self):
+        cache = MemoryResponseCache()
+        self.assertEqual(cache.get('/a'), None)
+        cache.set('/a', entry(b'[]'))
+        self.assertEqual(cache.get('/a')['content'], b'[]')
+
+    def test_entries_bound(self):
+        cache = MemoryResponseCache(max_entries=2)
+        cache.set('/a', entry(b'a'))
+        cache.set('/b', entry(b'b'))
+        cache.get('/a')
+        cache.set('/c', entry(b'c'))
+        self.assertEqual(cache.get('/b'), None)
+        assert cache.get('/a')
+
+    def test_bytes_bound(self):
+        cache = MemoryResponseCache(max_bytes=10)
+        cache.set('/a', entry(b'123456'))
+        cache.set('/a', entry(b'1234'))
+        cache.set('/b', entry(b'123456'))
+        self.assertEqual(cache.size, 10)
+        cache.set('/c', entry(b'12'))
+        self.assertEqual(cache.get('/a'), None)
+        self.assertEqual(cache.size, 8)
+
+
+class FileResponseCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_get_and_set(self):
+        cache = FileResponseCache(self.directory)
+        self.assertEqual(cache.get('/a'), None)
+        cache.set('/a', entry(b'[]'))
+
+        cache = FileResponseCache(self.directory)
+        self.assertEqual(cache.get('/a'), entry(b'[]'))
+
+    def test_json_files(self):
+        directory = os.path.join(self.directory, 'responses')
+        cache = FileResponseCache(directory)
+        self.assertEqual(stat.S_IMODE(os.stat(directory).st_mode), 0o700)
+        cache.set('/a', entry(b'\xff[]'))
+        with open(cache._path('/a'), 'rb') as cache_file:
+            stored = json.loads(cache_file.read().decode('utf-8'))
+        self.assertEqual(stored['url'], '/a')
+        self.assertEqual(cache.get('/a')['content'], b'\xff[]')
+
+        with open(cache._path('/b'), 'wb') as cache_file:
+            cache_file.write(b'\x80\x02garbage')
+        self.assertEqual(cache.get('/b'), None)
+        # no temporary file is left behind
+        self.assertEqual(sorted(os.listdir(directory)), sorted(
+            os.path.basename(cache._path(url)) for url in ('/a', '/b')))
+
+    def test_entries_bound(self):
+        cache = FileResponseCache(self.directory, max_entries=2)
+        with patch('righteous.api.cache.os.path.getmtime') as getmtime:
+            getmtime.side_effect = lambda path: {
+                cache._path('/a'): 1, cache._path('/b'): 2,
+                cache._path('/c'): 3}[path]
+            cache.set('/a', entry(b'a'))
+            cache.set('/b', entry(b'b'))
+            cache.set('/c', entry(b'c'))
+        self.assertEqual(cache.get('/a'), None)
+        self.assertEqual(cache.get('/c')['content'], b'c')
+
+    def test_clear(self):
+        cache = FileResponseCache(self.directory)
+        cache.set('/a', entry(b'a'))
+        cache.clear()
+        self.assertEqual(cache.get('/a'), None)
@@ -0,0 +1,109 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+from mock import patch
+from six import StringIO
+from righteous import cli
+from .base import FakeAPITestCase
+
+
+class CliTestCase(FakeAPITestCase):
+    fake_options = dict(deployments=2, servers=3)
+    login = False
+
+    def setUp(self):
+        super(CliTestCase, self).setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.config_file = os.path.join(directory, 'righteous.config')
+        self.fake.write_config(self.config_file)
+
+    def tearDown(self):
+        cli._initialised = None
+        super(CliTestCase, self).tearDown()
+
+    def main(self, *arguments):
+        stdout, stderr = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = StringIO(), StringIO()
+        try:
+            cli.main(['--config', self.config_file, '--no-daemon'] +
+                     list(arguments))
+            return sys.stdout.getvalue(), sys.stderr.getvalue()
+        finally:
+            sys.stdout, sys.stderr = stdout, stderr
+
+    def rows(self, output):
+        return [line.split()[0] for line in output.splitlines()[2:]
+                if line.strip()]
+
+    def test_status(self):
+        environments = ['server-0-2', 'server-1-0', 'kirk', 'server-0-0']
+        self.fake.reset_stats()
+        stdout, stderr = self.main('status', '--jobs=2', *environments)
+        self.assertEqual(stderr, '')
+        self.assertEqual(
+            sorted(self.rows(stdout)), sorted(
+                ['server-0-2', 'server-1-0', 'kirk:', 'server-0-0']))
+        routes = self.fake.stats['routes']
+        # a filtered request per environment, none listing the deployment,
+        # then the one not found by nickname
+        self.assertFalse('deployment' in routes)
+        self.assertEqual(routes['list_servers'], 5)
+        self.assertEqual(routes['server_settings'], 3)
+
+        stdout, stderr = self.main('status', '--sort', *environments)
+        self.assertEqual(self.rows(stdout), [
+            'kirk:', 'server-0-0', 'server-0-2', 'server-1-0'])
+
+    def test_status_many(self):
+        environments = ['server-0-2', 'server-1-0', 'kirk', 'server-0-0']
+        self.fake.reset_stats()
+        with patch('righteous.api.server.NICKNAME_LOOKUPS', 2):
+            stdout, stderr = self.main('status', '--jobs=2', *environments)
+        self.assertEqual(stderr, '')
+        self.assertEqual(
+            sorted(self.rows(stdout)), sorted(
+                ['server-0-2', 'server-1-0', 'kirk:', 'server-0-0']))
+        routes = self.fake.stats['routes']
+        # one listing of the default deployment, other servers by nickname
+        self.assertEqual(routes['deployment'], 1)
+        self.assertEqual(routes['list_servers'], 2)
+        self.assertEqual(routes['server_settings'], 3)
+
+    def test_status_formats(self):
+        environments = ['server-0-2', 'kirk']
+        stdout, _ = self.main(
+            'status', '--format', 'jsonl', '--sort', *environments)
+        rows = [json.loads(line) for line in stdout.splitlines()]
+        self.assertEqual([row['nickname'] for row in rows],
+                         ['kirk', 'server-0-2'])
+        self.assertEqual(rows[0]['error'], 'Not Found')
+        self.assertEqual(rows[1]['href'], self.fake.servers[3]['href'])
+        self.assertEqual(rows[1]['instance_type'], 'm1.small')
+        self.assertEqual(list(rows[1].keys()), list(cli.STATUS_FIELDS))
+
+        stdout, _ = self.main(
+            'status', '--format=json', '--verbose', '--sort', *environments)
+        rows = json.loads(stdout)
+        self.assertEqual(rows[1]['settings']['ec2-instance-type'], 'm1.small')
+        self.assertEqual(rows[1]['info']['nickname'], 'server-0-2')
+
+        stdout, _ = self.main('status', '--format=csv', '--sort', 'kirk')
+        self.assertEqual(stdout.splitlines(), [
+            'nickname,instance_type,state,href,error', 'kirk,,,,Not Found'])
+
+    def test_list_formats(self):
+        stdout, _ = self.main('list', '--format=csv')
+        lines = stdout.splitlines()
+        self.assertEqual(lines[0], 'instance,size,creator,days')
+        # the servers of the default deployment
+        self.assertEqual(len(lines), 1 + 3)
+
+        stdout, _ = self.main('list', '--format=json', '--sort')
+        rows = json.loads(stdout)
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(set(rows[0]), set(cli.LIST_FIELDS))
+
+        self.assertRaises(SystemExit, self.main, 'list', '--format=xml')
@@ -0,0 +1,113 @@
+import threading
+from righteous import config
+from righteous.client import default_client
+import righteous
+from .base import FakeAPITestCase
+
+
+class ClientTestCase(FakeAPITestCase):
+
+    def setUp(self):
+        self.initialise_settings()
+        self.fakes = [
+            self.start_fake(account_id=account_id, servers=servers)
+            for account_id, servers in (('1111', 3), ('2222', 5))]
+        self.clients = [
+            righteous.Client(fake.username, fake.password, fake.account_id,
+                             account_url=fake.url, **fake.server_defaults())
+            for fake in self.fakes]
+
+    def tearDown(self):
+        for client in self.clients:
+            client.close_session()
+        super(ClientTestCase, self).tearDown()
+
+    def test_methods(self):
+        self.assertEqual(righteous.Client.list_servers.__name__,
+                         'list_servers')
+        self.assertEqual(righteous.Client.list_servers.__doc__,
+                         righteous.list_servers.__doc__)
+
+    def test_settings_kwargs(self):
+        fake = self.fakes[0]
+        client = righteous.Client(
+            fake.username, fake.password, fake.account_id,
+            account_url=fake.url, concurrency=3, rate_limit=5,
+            retries={'GET': 1}, lookup_cache_ttl=0, **fake.server_defaults())
+        self.assertEqual(client.settings.concurrency, 3)
+        self.assertEqual(client.settings.rate_limit, 5)
+        self.assertEqual(client.settings.retries, {'GET': 1})
+        self.assertEqual(client.settings.lookup_cache_ttl, 0)
+        parameters = client.settings.create_server_parameters
+        for name in ('concurrency', 'rate_limit', 'retries',
+                     'lookup_cache_ttl'):
+            self.assertNotIn(name, parameters)
+        self.assertTrue(parameters['deployment_href'])
+        self.assertEqual(config.settings.concurrency, 10)
+
+    def test_override_within_activate(self):
+        client = self.clients[0]
+        client.login()
+        with client.activate():
+            with config.settings(concurrency=3) as overridden:
+                active = config.active_settings()
+                self.assertTrue(active is overridden)
+                self.assertEqual(active.concurrency, 3)
+                self.assertEqual(active.account_id, '1111')
+                self.assertEqual(
+                    len(righteous.list_servers()['servers']), 3)
+            self.assertTrue(config.active_settings() is client.settings)
+        self.assertEqual(client.settings.concurrency, 10)
+        self.assertEqual(config.settings.concurrency, 10)
+
+    def test_clients_are_independent(self):
+        for client in self.clients:
+            self.assertTrue(client.login())
+        first, second = self.clients
+        self.assertNotEqual(first.settings.cookies, second.settings.cookies)
+        self.assertEqual(len(first.list_servers()['servers']), 3)
+        self.assertEqual(len(second.list_servers()['servers']), 5)
+        self.assertEqual(config.settings.cookies, None)
+        self.assertEqual(config.settings.account_id, None)
+
+    def test_concurrent_clients(self):
+        results = {}
+
+        def work(client):
+            client.login()
+            for _ in range(5):
+                servers = client.list_servers()['servers']
+                details = client.server_details(
+                    [server['href'] for server in servers], jobs=3)
+            results[client.settings.account_id] = [
+                detail['error'] for detail in details]
+
+        threads = [threading.Thread(target=work, args=(client,))
+                   for client in self.clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, {'1111': [None] * 3, '2222': [None] * 5})
+
+    def test_generator_method(self):
+        client = self.clients[0]
+        client.login()
+        hrefs = [server['href']
+                 for server in client.list_servers()['servers']]
+        states = dict(client.wait_for_state(
+            hrefs, ['operational', 'stopped'], timeout=5, interval=0.01))
+        self.assertEqual(sorted(states), sorted(hrefs))
+
+    def test_activate(self):
+        client = self.clients[1]
+        client.login()
+        with client.activate():
+            self.assertTrue(config.active_settings() is client.settings)
+            self.assertEqual(len(righteous.list_servers()['servers']), 5)
+        self.assertTrue(config.active_settings() is config.settings)
+
+    def test_default_client(self):
+        self.assertTrue(default_client.settings is config.settings)
+        default_client.initialise('user', 'pass', 'account')
+        self.assertEqual(config.settings.username, 'user')
@@ -0,0 +1,102 @@
+import threading
+from righteous import config
+import righteous
+from .base import FakeAPITestCase
+
+THREADS = 16
+
+
+def run_threads(target, count=THREADS):
+    """
+    Runs a target in many threads, returning the exceptions raised
+    """
+    errors = []
+
+    def run(index):
+        try:
+            target(index)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(index,))
+               for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+class ConcurrencyTestCase(FakeAPITestCase):
+
+    fake_options = dict(servers=8)
+    initialise_options = dict(pool_maxsize=THREADS)
+
+    def setUp(self):
+        super(ConcurrencyTestCase, self).setUp()
+        self.hrefs = [
+            server['href']
+            for server in righteous.list_servers()['servers']]
+
+    def test_single_flight_login(self):
+        start = threading.Event()
+        self.fake.sessions.clear()
+        self.fake.reset_stats()
+
+        def list_servers(index):
+            start.wait()
+            assert len(righteous.list_servers()['servers']) == 8
+
+        threads = threading.Thread(
+            target=lambda: self.errors.extend(run_threads(list_servers)))
+        self.errors = []
+        threads.start()
+        start.set()
+        threads.join()
+        self.assertEqual(self.errors, [])
+        self.assertEqual(self.fake.stats['routes']['login'], 1)
+
+    def test_hammer(self):
+        # every session expires between rounds, requests fail throughout
+        self.fake.error_rate = 0.02
+        config.settings.retries = {
+            'GET': 10, 'DELETE': 3, 'PUT': 0, 'POST': 0}
+        self.fake.reset_stats()
+
+        def work(index):
+            for iteration in range(2):
+                href = self.hrefs[(index + iteration) % len(self.hrefs)]
+                assert righteous.server_info(href)['href'] == href
+                nickname = righteous.server_info(href)['nickname']
+                assert righteous.find_server(nickname)['href'] == href
+                assert righteous.server_settings(href)['ec2-instance-type']
+
+        rounds = 4
+        for _ in range(rounds):
+            self.fake.sessions.clear()
+            self.assertEqual(run_threads(work), [])
+        # one login per round, and retries of failed logins
+        stats = self.fake.stats
+        self.assertTrue(rounds <= stats['routes']['login'])
+        self.assertTrue(
+            stats['routes']['login'] <= rounds + stats['errors'])
+
+    def test_scoped_overrides(self):
+        def override(index):
+            for _ in range(20):
+                with config.settings(concurrency=index + 1) as overridden:
+                    assert config.active_settings() is overridden
+                    assert config.active_settings().concurrency == index + 1
+                    righteous.server_info(self.hrefs[index % 8])
+                assert config.active_settings() is config.settings
+
+        concurrency = config.settings.concurrency
+        self.assertEqual(run_threads(override), [])
+        self.assertEqual(config.settings.concurrency, concurrency)
+
+    def test_concurrent_server_details(self):
+        def details(index):
+            results = righteous.server_details(self.hrefs, jobs=4)
+            assert [result['error'] for result in results] == [None] * 8
+
+        self.assertEqual(run_threads(details, count=4), [])
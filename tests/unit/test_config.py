@@ -0,0 +1,74 @@
+import threading
+from righteous import config
+from righteous.config import Settings
+from .base import unittest
+
+
+class SettingsTestCase(unittest.TestCase):
+
+    def test_defaults(self):
+        settings = Settings()
+        self.assertEqual(settings.cookies, None)
+        self.assertEqual(settings.default_deployment_id, None)
+        self.assertEqual(settings.concurrency, 10)
+
+    def test_keyword_arguments(self):
+        self.assertEqual(Settings(concurrency=2).concurrency, 2)
+        self.assertRaises(AttributeError, Settings, unknown=1)
+
+    def test_mutable_defaults_not_shared(self):
+        settings = Settings()
+        settings.retries['GET'] = 0
+        settings.hooks['after_response'] = []
+        self.assertEqual(Settings().retries['GET'], 3)
+        self.assertEqual(Settings().hooks, {})
+
+    def test_undeclared_setting(self):
+        settings = Settings()
+
+        def set_unknown():
+            settings.unknown = 1
+        self.assertRaises(AttributeError, set_unknown)
+
+    def test_override(self):
+        settings = Settings(debug=False, cookies='cookie')
+        with settings(debug=True, cookies=None) as overridden:
+            self.assertTrue(config.active_settings() is overridden)
+            self.assertEqual(overridden.debug, True)
+            self.assertEqual(overridden.cookies, None)
+            self.assertEqual(settings.debug, False)
+            with settings({'cookies': 'nested'}) as nested:
+                self.assertEqual(nested.cookies, 'nested')
+                self.assertEqual(nested.debug, True)
+            self.assertEqual(overridden.cookies, None)
+        self.assertEqual(settings.debug, False)
+        self.assertEqual(settings.cookies, 'cookie')
+        self.assertTrue(config.active_settings() is config.settings)
+
+    def test_override_writes_through(self):
+        settings = Settings()
+        with settings(debug=True) as overridden:
+            overridden.cookies = 'renewed'
+            overridden.debug = False
+        self.assertEqual(settings.cookies, 'renewed')
+        self.assertEqual(settings.debug, False)
+
+    def test_override_is_thread_local(self):
+        seen = []
+        started, overridden = threading.Event(), threading.Event()
+
+        def other_thread():
+            started.set()
+            overridden.wait()
+            seen.append(config.active_settings().concurrency)
+
+        thread = threading.Thread(target=other_thread)
+        thread.start()
+        started.wait()
+        concurrency = config.settings.concurrency
+        with config.settings(concurrency=concurrency + 1):
+            overridden.set()
+            thread.join()
+            self.assertEqual(
+                config.active_settings().concurrency, concurrency + 1)
+        self.assertEqual(seen, [concurrency])
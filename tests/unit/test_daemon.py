@@ -0,0 +1,112 @@
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from six import StringIO
+from righteous import cli
+from righteous.daemon import Daemon, forward, is_running
+from .base import FakeAPITestCase, RighteousTestCase
+
+
+def command(argv):
+    print('running %s' % ' '.join(argv))
+    sys.stderr.write('warning\n')
+    if argv[0] == 'exit':
+        sys.exit(int(argv[1]))
+    if argv[0] == 'fail':
+        raise Exception('failed')
+
+
+class DaemonMixin(object):
+
+    def setUp(self):
+        super(DaemonMixin, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'righteous.sock')
+
+    def start(self, run):
+        daemon = Daemon(run, self.path)
+        thread = threading.Thread(target=daemon.serve)
+        thread.start()
+
+        def stop():
+            daemon.shutdown()
+            thread.join()
+        self.addCleanup(stop)
+        return daemon
+
+    def forward(self, argv):
+        stdout, stderr = StringIO(), StringIO()
+        status = forward(argv, self.path, stdout=stdout, stderr=stderr)
+        return status, stdout.getvalue(), stderr.getvalue()
+
+
+class DaemonTestCase(DaemonMixin, RighteousTestCase):
+
+    def test_not_running(self):
+        self.assertFalse(is_running(self.path))
+        self.assertEqual(forward(['list'], self.path), None)
+
+    def test_forward(self):
+        self.start(command)
+        self.assertTrue(is_running(self.path))
+        self.assertEqual(self.forward(['list', '-v']),
+                         (0, 'running list -v\n', 'warning\n'))
+        self.assertEqual(self.forward(['exit', '3'])[0], 3)
+        status, stdout, stderr = self.forward(['fail'])
+        self.assertEqual(status, 1)
+        self.assertTrue(stderr.endswith('Exception: failed\n'))
+        self.assertRaises(Exception, Daemon, command, self.path)
+
+    def test_stale_socket(self):
+        with open(self.path, 'w'):
+            pass
+        self.start(command)
+        self.assertEqual(self.forward(['list'])[0], 0)
+
+
+class DaemonCliTestCase(DaemonMixin, FakeAPITestCase):
+    fake_options = dict(servers=3)
+    login = False
+
+    def setUp(self):
+        super(DaemonCliTestCase, self).setUp()
+        self.config_file = os.path.join(self.directory, 'righteous.config')
+        self.fake.write_config(self.config_file)
+
+    def tearDown(self):
+        cli._initialised = None
+        super(DaemonCliTestCase, self).tearDown()
+
+    def test_commands_reuse_the_session(self):
+        self.start(lambda argv: cli.run(
+            cli.docopt(cli.__doc__, argv=argv)))
+        argv = ['--config', self.config_file, '--socket', self.path,
+                'status', 'server-0-0']
+        for attempt in range(3):
+            status, stdout, stderr = self.forward(argv)
+            self.assertEqual(status, 0, stderr)
+            self.assertTrue('server-0-0' in stdout)
+            self.assertTrue(self.fake.servers[1]['href'] in stdout)
+        self.assertEqual(self.fake.stats['routes'].get('login', 0), 1)
+
+        status, stdout, stderr = self.forward(
+            ['--config', self.config_file, 'status', '--jobs=x', 'kirk'])
+        self.assertEqual(status, 1)
+        self.assertTrue('ValueError' in stderr)
+
+    def test_verbose_is_per_command(self):
+        self.start(lambda argv: cli.run(
+            cli.docopt(cli.__doc__, argv=argv)))
+        argv = ['--config', self.config_file, 'status', 'server-0-0']
+        status, stdout, stderr = self.forward(['--verbose'] + argv)
+        self.assertEqual(status, 0)
+        self.assertTrue('/servers/' in stderr)
+
+        status, stdout, stderr = self.forward(argv)
+        self.assertEqual((status, stderr), (0, ''))
+        logger = logging.getLogger('righteous')
+        self.assertEqual((logger.handlers, logger.level), ([], 0))
@@ -1,3 +1,4 @@
+import json
 from righteous.compat import urlencode
 from .base import ApiTestCase
 import righteous
@@ -16,6 +17,26 @@ class DeploymentTestCase(ApiTestCase):
         righteous.list_deployments()
         self.request.assert_called_once_with('/deployments.js')
 
+    def test_list_deployments_filtered(self):
+        self.response.content = json.dumps([
+            {'nickname': 'production', 'href': '/d/1'},
+            {'nickname': 'staging-production', 'href': '/d/2'},
+        ])
+        deployments = righteous.list_deployments(
+            filters={'nickname': 'production*'}, fields=['href'])
+        self.request.assert_called_once_with(
+            '/deployments.js?filter=nickname=production')
+        self.assertEqual(deployments, [{'href': '/d/1'}])
+
+    def test_iter_deployments(self):
+        self.response.iter_content.return_value = [
+            b'[{"nickname": "one"}, {"nick', b'name": "two"}]']
+        deployments = righteous.iter_deployments()
+        self.request.assert_called_once_with('/deployments.js', stream=True)
+        self.assertEqual(
+            [deployment['nickname'] for deployment in deployments],
+            ['one', 'two'])
+
     def test_find_deployment_no_result(self):
         self.response.content = '[]'
         deployment = righteous.find_deployment('bruce')
@@ -0,0 +1,44 @@
+# coding: utf-8
+from righteous.api.filters import filter_query, matches, project, select
+from .base import unittest
+
+SERVERS = [
+    dict(nickname='web-1', state='operational', instance='m1.large'),
+    dict(nickname='web-2', state='stopped', instance='m1.small'),
+    dict(nickname='db-web', state='operational', instance='m1.large'),
+]
+
+
+class FiltersTestCase(unittest.TestCase):
+
+    def test_filter_query(self):
+        self.assertEqual(filter_query(None), '')
+        self.assertEqual(
+            filter_query({'nickname': 'web 1'}), 'filter=nickname=web%201')
+        self.assertEqual(
+            filter_query({'state': 'operational', 'nickname': 'web-*'}),
+            'filter[]=nickname=web-&filter[]=state=operational')
+        self.assertEqual(
+            filter_query([('nickname', u'caf\xe9'), ('nickname', 'x')]),
+            'filter[]=nickname=caf%C3%A9&filter[]=nickname=x')
+
+    def test_matches(self):
+        self.assertTrue(matches(SERVERS[0], {'nickname': 'web'}))
+        self.assertTrue(matches(SERVERS[2], {'nickname': 'web'}))
+        self.assertTrue(matches(SERVERS[0], {'nickname': 'web*'}))
+        self.assertFalse(matches(SERVERS[2], {'nickname': 'web*'}))
+        self.assertFalse(matches(SERVERS[0], {'missing': 'x'}))
+        self.assertTrue(matches({'cloud_id': 1}, {'cloud_id': 1}))
+
+    def test_project(self):
+        self.assertTrue(project(SERVERS[0], None) is SERVERS[0])
+        self.assertEqual(
+            project(SERVERS[0], ['nickname', 'missing']),
+            {'nickname': 'web-1'})
+
+    def test_select(self):
+        self.assertEqual(
+            select(SERVERS, {'state': 'operational', 'instance': 'large'},
+                   ['nickname']),
+            [{'nickname': 'web-1'}, {'nickname': 'db-web'}])
+        self.assertEqual(select(SERVERS), SERVERS)
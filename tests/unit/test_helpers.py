@@ -2,16 +2,22 @@ import json
 import sys
 import base64
 import six
-from mock import patch
+from mock import patch, Mock
 from righteous.api.server_template import _extract_template_id
-from righteous.api.base import _build_headers
+from righteous.api.base import (
+    _build_headers, _cookie_expiry, _iter_json, _JSONReader, debug
+)
+from righteous.api.cache import MemoryResponseCache
 from righteous import config
 import righteous
-from .base import ApiTestCase, RighteousTestCase, unittest
+from .base import ApiTestCase, RighteousTestCase, response, unittest
 
 
 class RequestsTestCase(unittest.TestCase):
 
+    def tearDown(self):
+        righteous.close_session()
+
     def test_request(self):
         username, password, account_id = 'user', 'pass', 'account_id'
         righteous.init(username, password, account_id, debug=False)
@@ -19,9 +25,9 @@ class RequestsTestCase(unittest.TestCase):
 
         with patch('righteous.api.base.requests') as mock_requests:
             righteous.api.base._request('/test')
-            mock_requests.request.assert_called_once_with(
+            mock_requests.Session.return_value.request.assert_called_once_with(
                 'GET', 'https://my.rightscale.com/api/acct/account_id/test',
-                headers=headers, data=None)
+                headers=headers, data=None, stream=False)
 
     def test_request_no_prepend(self):
         username, password, account_id = 'user', 'pass', 'account_id'
@@ -30,8 +36,150 @@ class RequestsTestCase(unittest.TestCase):
 
         with patch('righteous.api.base.requests') as mock_requests:
             righteous.api.base._request('/test', prepend_api_base=False)
-            mock_requests.request.assert_called_once_with(
-                'GET', '/test', headers=headers, data=None)
+            mock_requests.Session.return_value.request.assert_called_once_with(
+                'GET', '/test', headers=headers, data=None, stream=False)
+
+
+class ReauthenticateTestCase(unittest.TestCase):
+
+    def tearDown(self):
+        righteous.close_session()
+        config.settings.cookies = None
+
+    def test_expired_session_logs_in_again(self):
+        righteous.init('user', 'pass', 'account_id')
+        config.settings.cookies = 'expired'
+
+        with patch('righteous.api.base.requests') as mock_requests:
+            session = mock_requests.Session.return_value
+            session.request.side_effect = [
+                Mock(status_code=401, headers={}),
+                Mock(status_code=204, headers={'set-cookie': 'renewed'}),
+                Mock(status_code=200, headers={}),
+            ]
+            response = righteous.api.base._request('/test')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(config.settings.cookies, 'renewed')
+        self.assertEqual(session.request.call_count, 3)
+        self.assertEqual(
+            session.request.call_args[1]['headers']['Cookie'], 'renewed')
+
+    def test_failed_login_not_retried(self):
+        righteous.init('user', 'pass', 'account_id')
+        config.settings.cookies = 'expired'
+
+        with patch('righteous.api.base.requests') as mock_requests:
+            session = mock_requests.Session.return_value
+            session.request.return_value = Mock(status_code=403, headers={})
+            response = righteous.api.base._request('/test')
+
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(session.request.call_count, 2)
+
+    def test_cookie_expiry(self):
+        self.assertEqual(_cookie_expiry(
+            '_session_id=abc; path=/; '
+            'expires=Thu, 01 Jan 2037 00:00:00 GMT; HttpOnly'), 2114380800)
+        self.assertEqual(_cookie_expiry('_session_id=abc; path=/'), None)
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        righteous.init(
+            'user', 'pass', 'account_id', default_deployment_id='1')
+        config.settings.response_cache = MemoryResponseCache()
+
+    def tearDown(self):
+        righteous.close_session()
+        config.settings.response_cache = None
+
+    def test_not_modified(self):
+        url = 'https://my.rightscale.com/api/acct/account_id/deployments/1.js'
+        with patch('righteous.api.base.requests') as mock_requests:
+            session = mock_requests.Session.return_value
+            session.request.side_effect = [
+                response(status_code=200, headers={'etag': '"v1"'},
+                         content='{"servers": []}'),
+                response(status_code=304, headers={}),
+            ]
+            servers = righteous.list_servers()
+            servers['servers'].append('changed')
+            self.assertEqual(righteous.list_servers(), {'servers': []})
+
+        session.request.assert_called_with(
+            'GET', url, data=None, headers={
+                'X-API-VERSION': '1.0', 'If-None-Match': '"v1"'},
+            stream=False)
+
+    def test_modified(self):
+        with patch('righteous.api.base.requests') as mock_requests:
+            session = mock_requests.Session.return_value
+            session.request.side_effect = [
+                response(status_code=200, content='{"servers": []}',
+                         headers={'last-modified': 'Mon, 01 Oct 2012'}),
+                response(status_code=200, content='{"servers": [1]}',
+                         headers={}),
+            ]
+            righteous.list_servers()
+            self.assertEqual(righteous.list_servers(), {'servers': [1]})
+            self.assertEqual(
+                session.request.call_args[1]['headers']['If-Modified-Since'],
+                'Mon, 01 Oct 2012')
+
+    def test_only_get_cached(self):
+        with patch('righteous.api.base.requests') as mock_requests:
+            session = mock_requests.Session.return_value
+            session.request.return_value = response(
+                status_code=200, headers={'etag': '"v1"'}, content='')
+            righteous.delete_server('/server/ref')
+        self.assertEqual(
+            config.settings.response_cache.get('/server/ref'), None)
+
+
+class SessionTestCase(unittest.TestCase):
+
+    def tearDown(self):
+        righteous.close_session()
+
+    def test_session_reused(self):
+        righteous.init('user', 'pass', 'account_id')
+
+        with patch('righteous.api.base.requests') as mock_requests:
+            righteous.api.base._request('/test')
+            righteous.api.base._request('/test')
+            mock_requests.Session.assert_called_once_with()
+            self.assertEqual(
+                mock_requests.Session.return_value.request.call_count, 2)
+
+    def test_session_pool_settings(self):
+        righteous.init(
+            'user', 'pass', 'account_id', pool_connections=2,
+            pool_maxsize=20, max_retries=3, keep_alive=False)
+        assert 'pool_maxsize' not in config.settings.create_server_parameters
+
+        with patch('righteous.api.base.requests') as mock_requests:
+            righteous.api.base._request('/test')
+            mock_requests.adapters.HTTPAdapter.assert_called_once_with(
+                pool_connections=2, pool_maxsize=20, max_retries=3,
+                pool_block=False)
+            session = mock_requests.Session.return_value
+            session.headers.__setitem__.assert_called_once_with(
+                'Connection', 'close')
+
+    def test_close_session(self):
+        righteous.init('user', 'pass', 'account_id')
+
+        with patch('righteous.api.base.requests') as mock_requests:
+            righteous.api.base._request('/test')
+            session = config.settings.session
+            righteous.close_session()
+            session.close.assert_called_once_with()
+            assert config.settings.session is None
+
+            righteous.api.base._request('/test')
+            self.assertEqual(mock_requests.Session.call_count, 2)
 
 
 class ExtractTemplateIdTestCase(ApiTestCase):
@@ -47,6 +195,77 @@ class ExtractTemplateIdTestCase(ApiTestCase):
             'account_id/rackspace_server_templates/12345')
 
 
+class IterJSONTestCase(unittest.TestCase):
+
+    def streamed(self, document, chunk_size):
+        content = json.dumps(document, indent=1).encode('utf-8')
+        response = Mock()
+        response.iter_content.return_value = [
+            content[start:start + chunk_size]
+            for start in range(0, len(content), chunk_size)]
+        return response
+
+    def test_items(self):
+        servers = [
+            dict(href='/servers/%s' % i, nickname=u'caf\xe9 %s' % i, id=i,
+                 tags=[], parameters={'n': 12345.5, 'on': True})
+            for i in range(20)]
+        for chunk_size in (1, 2, 7, 1024):
+            response = self.streamed(servers, chunk_size)
+            self.assertEqual(list(_iter_json(response)), servers)
+            response.close.assert_called_once_with()
+
+    def test_key(self):
+        deployment = dict(nickname='foo', tags=['a', 'b'],
+                          servers=[{'href': '/servers/1'}, 1234567])
+        for chunk_size in (1, 3, 1024):
+            self.assertEqual(
+                list(_iter_json(self.streamed(deployment, chunk_size),
+                                key='servers')),
+                [{'href': '/servers/1'}, 1234567])
+
+    def test_missing_key(self):
+        self.assertEqual(
+            list(_iter_json(self.streamed({'nickname': 'foo'}, 4),
+                            key='servers')), [])
+        self.assertEqual(list(_iter_json(self.streamed({}, 4), key='x')), [])
+
+    def test_empty(self):
+        self.assertEqual(list(_iter_json(self.streamed([], 1))), [])
+
+    def test_invalid(self):
+        for content in (b'', b'{}', b'[1, 2', b'[{"href": }]', b'[1 2]'):
+            response = Mock()
+            response.iter_content.return_value = [content]
+            self.assertRaises(ValueError, list, _iter_json(response))
+            response.close.assert_called_once_with()
+
+    def test_numbers_split(self):
+        for chunks, items in (([b'[1.', b'5, 2]'], [1.5, 2]),
+                              ([b'[1', b'e3', b'0]'], [1e30]),
+                              ([b'[-', b'12', b'3]'], [-123]),
+                              ([b'[tr', b'ue, 1', b']'], [True, 1])):
+            response = Mock()
+            response.iter_content.return_value = chunks
+            self.assertEqual(list(_iter_json(response)), items)
+
+    def test_large_value(self):
+        nickname = u'x' * 10000
+        decoder = Mock(wraps=json.JSONDecoder())
+        with patch.object(_JSONReader, 'decoder', decoder):
+            self.assertEqual(
+                list(_iter_json(self.streamed([nickname], 1))), [nickname])
+        # the value is decoded again as its buffer doubles, not per chunk
+        self.assertLess(decoder.raw_decode.call_count, 20)
+
+    def test_closed_when_abandoned(self):
+        response = self.streamed([1, 2, 3], 1)
+        items = _iter_json(response)
+        self.assertEqual(next(items), 1)
+        items.close()
+        response.close.assert_called_once_with()
+
+
 class BuildHeaderTestCase(RighteousTestCase):
 
     def test_build_headers(self):
@@ -66,6 +285,58 @@ class BuildHeaderTestCase(RighteousTestCase):
             {'X-API-VERSION': '1.0', 'baz': 'bar', 'Cookie': 'cookie_value'})
 
 
+class DebugTestCase(RighteousTestCase):
+
+    def setUp(self):
+        self.initialise_settings()
+        self.stream = six.StringIO()
+
+    def tearDown(self):
+        config.settings.debug_format = 'text'
+        config.settings.debug_limit = 1024
+        self.initialise_settings()
+
+    def test_disabled(self):
+        with patch('righteous.api.base._loggable') as loggable:
+            debug('%s', b'content', headers={'Cookie': 'secret'})
+            self.assertFalse(loggable.called)
+
+    def test_logger_enabled(self):
+        with patch('righteous.api.base.log') as log:
+            log.isEnabledFor.return_value = True
+            debug('%s to %s', 'GET', '/servers', url='/servers')
+            log.debug.assert_called_once_with(
+                '%s to %s', 'GET', '/servers',
+                extra={'righteous': {'url': '/servers'}})
+
+    def test_stream(self):
+        config.settings.debug = self.stream
+        debug('%s to %s', 'GET', '/servers')
+        self.assertEqual(self.stream.getvalue(), 'GET to /servers\n')
+
+    def test_redaction_and_truncation(self):
+        config.settings.debug = self.stream
+        config.settings.debug_limit = 5
+        debug('%s %s %s', {'Cookie': 'secret', 'X-API-VERSION': '1.0'},
+              'abcdefgh', b'abcdefgh')
+        output = self.stream.getvalue()
+        self.assertFalse('secret' in output)
+        self.assertTrue("'Cookie': '<redacted>'" in output)
+        self.assertTrue('abcde... (3 more)' in output)
+        self.assertFalse('abcdef' in output)
+
+    def test_json(self):
+        config.settings.debug = self.stream
+        config.settings.debug_format = 'json'
+        debug('%s to %s', 'GET', '/servers', method='GET',
+              headers={'Authorization': 'Basic secret'})
+        record = json.loads(self.stream.getvalue())
+        self.assertEqual(record['message'], 'GET to /servers')
+        self.assertEqual(record['method'], 'GET')
+        self.assertEqual(record['headers'], {'Authorization': '<redacted>'})
+        self.assertTrue('time' in record)
+
+
 class InitialiseTestCase(RighteousTestCase):
 
     def test_init(self):
@@ -109,7 +380,8 @@ class LoginTestCase(RighteousTestCase):
     def test_login_with_init_credentials(self):
         username, password, account_id = 'user', 'pass', 'account_id'
 
-        auth = base64.b64encode(six.b('%s:%s' % (username, password)))
+        auth = base64.b64encode(
+            six.b('%s:%s' % (username, password))).decode('ascii')
 
         righteous.init(username, password, account_id)
 
@@ -122,7 +394,8 @@ class LoginTestCase(RighteousTestCase):
 
     def test_login_with_credentials(self):
         username, password, account_id = 'foo', 'bar', '123'
-        auth = base64.b64encode(six.b('%s:%s' % (username, password)))
+        auth = base64.b64encode(
+            six.b('%s:%s' % (username, password))).decode('ascii')
 
         self.response.status_code = 204
         self.response.headers['set-cookie'] = 'cookie_value'
@@ -154,6 +427,24 @@ class LookupServerTestCase(ApiTestCase):
             None, 'naruto', righteous.api.server.find_server)
         self.assertEqual(href, '/naruto')
 
+    def test_lookup_nickname_cached(self):
+        self.response.content = json.dumps([{'href': '/naruto'}])
+        righteous.server_info(None, nickname='naruto')
+        righteous.server_settings(None, nickname='naruto')
+
+        self.request.assert_any_call('/servers.js?filter=nickname=naruto')
+        self.assertEqual(self.request.call_count, 3)
+        stats = righteous.lookup_cache_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_lookup_nickname_invalidated_on_delete(self):
+        self.response.content = json.dumps([{'href': '/naruto'}])
+        righteous.server_info(None, nickname='naruto')
+        righteous.delete_server('/naruto')
+        righteous.server_info(None, nickname='naruto')
+
+        self.assertEqual(self.request.call_count, 5)
+
     def test_lookup_nickname_failure(self):
         self.response.content = '[]'
         self.assertRaises(
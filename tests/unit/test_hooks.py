@@ -0,0 +1,159 @@
+from mock import patch, Mock
+from requests.exceptions import ConnectionError as RequestConnectionError
+from righteous import config
+from righteous.api.hooks import path_template
+from righteous.api.metrics import MetricsCollector
+import righteous
+from .base import RighteousTestCase, response
+
+
+class SessionMockTestCase(RighteousTestCase):
+
+    def setUp(self):
+        self.initialise_settings()
+        righteous.initialise('user', 'pass', 'account_id')
+        config.settings.retry_counter = None
+        self.session_patcher = patch('righteous.api.base._session')
+        self.session = self.session_patcher.start().return_value
+        self.sleep_patcher = patch('righteous.api.base.time.sleep')
+        self.sleep_patcher.start()
+        self.events = []
+
+    def tearDown(self):
+        self.session_patcher.stop()
+        self.sleep_patcher.stop()
+        self.initialise_settings()
+
+
+class HooksTestCase(SessionMockTestCase):
+
+    def record(self, name):
+        def hook(event):
+            self.events.append((name, event.method, event.path,
+                                event.function, event.attempt,
+                                event.status_code))
+        return hook
+
+    def add_hooks(self):
+        for name in ('before_send', 'after_response', 'on_error',
+                     'on_retry'):
+            righteous.add_hook(name, self.record(name))
+
+    def test_path_template(self):
+        base = 'https://my.rightscale.com/api/acct/account_id'
+        self.assertEqual(path_template(base + '/servers/12.js'),
+                         '/servers/:id.js')
+        self.assertEqual(path_template(base + '/servers/12/settings.js'),
+                         '/servers/:id/settings.js')
+        self.assertEqual(
+            path_template(base + '/servers.js?filter=nickname=12'),
+            '/servers.js')
+        self.assertEqual(
+            path_template(base + '/ec2_server_templates/3'),
+            '/ec2_server_templates/:id')
+
+    def test_unknown_event(self):
+        self.assertRaises(ValueError, righteous.add_hook, 'after', Mock())
+
+    def test_events(self):
+        self.add_hooks()
+        self.session.request.return_value = response(200)
+        righteous.server_info('https://my.rightscale.com/server/ref')
+        righteous.api.base._request('/servers/1.js')
+        self.assertEqual(self.events, [
+            ('before_send', 'GET', '/server/ref.js', 'server_info', 0, None),
+            ('after_response', 'GET', '/server/ref.js', 'server_info', 0,
+             200),
+            ('before_send', 'GET', '/servers/:id.js', None, 0, None),
+            ('after_response', 'GET', '/servers/:id.js', None, 0, 200),
+        ])
+
+    def test_outermost_api_function(self):
+        self.add_hooks()
+        self.session.request.return_value = response(
+            200, b'[{"href": "/servers/1", "nickname": "test"}]')
+        righteous.server_info(None, nickname='test')
+        self.assertEqual(
+            set(event[3] for event in self.events), set(['server_info']))
+
+    def test_concurrent_api_functions(self):
+        self.add_hooks()
+        self.session.request.return_value = response(201, b'{}')
+        righteous.server_details(['/server/1', '/server/2'])
+        righteous.stop_servers(['/server/1'])
+        self.assertEqual(
+            sorted(set(event[3] for event in self.events)),
+            ['server_details', 'stop_servers'])
+
+    def test_retry_and_error_events(self):
+        self.add_hooks()
+        self.session.request.side_effect = [
+            response(503), RequestConnectionError(), response(200)]
+        righteous.api.base._request('/servers.js')
+        self.assertEqual([event[0] for event in self.events], [
+            'before_send', 'after_response', 'on_retry',
+            'before_send', 'on_error', 'on_retry',
+            'before_send', 'after_response'])
+        self.assertEqual([event[4] for event in self.events],
+                         [0, 0, 0, 1, 1, 1, 2, 2])
+
+    def test_failing_hook(self):
+        righteous.add_hook('after_response', Mock(side_effect=ValueError))
+        self.session.request.return_value = response(200)
+        self.assertEqual(
+            righteous.api.base._request('/test').status_code, 200)
+
+    def test_remove_hook(self):
+        hook = Mock()
+        righteous.add_hook('after_response', hook)
+        righteous.remove_hook('after_response', hook)
+        self.assertEqual(config.settings.hooks, {})
+
+    def test_no_hooks(self):
+        with patch('righteous.api.base.calling_function') as function:
+            self.session.request.return_value = response(200)
+            righteous.api.base._request('/test')
+            self.assertFalse(function.called)
+
+
+class MetricsCollectorTestCase(SessionMockTestCase):
+
+    def test_metrics(self):
+        self.session.request.side_effect = [
+            response(503, b''), response(200, b'12345'),
+            response(404, b'', {'content-length': '3'})]
+        with MetricsCollector(buckets=(1, 2)) as metrics:
+            righteous.api.base._request('/servers/1.js')
+            righteous.api.base._request('/servers/2', method='PUT',
+                                        body='a=b')
+        self.assertEqual(config.settings.hooks, {})
+
+        stats = metrics.stats()
+        endpoint = stats['endpoints']['GET /servers/:id.js']
+        self.assertEqual(endpoint['count'], 2)
+        self.assertEqual(endpoint['errors'], 1)
+        self.assertEqual(endpoint['retries'], 1)
+        self.assertEqual(endpoint['status_codes'], {503: 1, 200: 1})
+        self.assertEqual(endpoint['response_bytes'], 5)
+        self.assertEqual(endpoint['histogram'],
+                         [(1, 2), (2, 0), (float('inf'), 0)])
+        endpoint = stats['endpoints']['PUT /servers/:id']
+        self.assertEqual(endpoint['request_bytes'], 3)
+        self.assertEqual(endpoint['response_bytes'], 3)
+        self.assertEqual(stats['functions']['<unknown>']['count'], 3)
+
+        metrics.reset()
+        self.assertEqual(metrics.stats(), dict(endpoints={}, functions={}))
+
+    def test_pooled_function_metrics(self):
+        # the example of docs/index.rst
+        self.session.request.return_value = response(200)
+        with MetricsCollector() as metrics:
+            righteous.server_details(['/servers/1', '/servers/2'])
+        stats = metrics.stats()
+        self.assertEqual(list(stats['functions']), ['server_details'])
+        self.assertEqual(stats['functions']['server_details']['count'], 4)
+        self.assertTrue(
+            stats['functions']['server_details']['latency_total'] >= 0)
+        self.assertEqual(
+            stats['endpoints']['GET /servers/:id/settings.js']['count'], 2)
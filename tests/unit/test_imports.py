@@ -0,0 +1,46 @@
+import subprocess
+import sys
+import righteous
+from .base import unittest
+
+LAZY = sys.version_info >= (3, 7)
+
+
+def imported_modules(statement):
+    """
+    Modules loaded by a new interpreter running `statement`
+    """
+    output = subprocess.check_output([
+        sys.executable, '-c',
+        statement + '; import sys; print(" ".join(sorted(sys.modules)))'])
+    return set(output.decode('utf-8').split())
+
+
+class ImportsTestCase(unittest.TestCase):
+
+    @unittest.skipUnless(LAZY, 'module __getattr__ requires Python 3.7')
+    def test_lazy_imports(self):
+        modules = imported_modules('import righteous, righteous.cli')
+        for module in ('requests', 'clint', 'righteous.api.base',
+                       'righteous.client'):
+            self.assertFalse(module in modules, module)
+
+        modules = imported_modules('import righteous; righteous.find_server')
+        self.assertTrue('righteous.api.server' in modules)
+        self.assertFalse('righteous.api.deployment' in modules)
+
+        modules = imported_modules(
+            'import righteous; righteous.api.deployment.find_deployment')
+        self.assertTrue('righteous.api.deployment' in modules)
+        self.assertFalse('righteous.api.server' in modules)
+
+    def test_exports(self):
+        from righteous.api import server
+        self.assertTrue(righteous.find_server is server.find_server)
+        self.assertTrue(righteous.config.settings is not None)
+        self.assertTrue('create_and_start_servers' in righteous.__all__)
+        self.assertTrue('Client' in dir(righteous))
+        self.assertRaises(AttributeError, getattr, righteous, 'missing')
+        namespace = {}
+        exec('from righteous import *', namespace)
+        self.assertTrue(namespace['list_servers'] is righteous.list_servers)
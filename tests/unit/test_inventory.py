@@ -0,0 +1,167 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+from righteous.inventory import Inventory, server_owner
+import righteous
+from .base import FakeAPITestCase, unittest
+
+LAST_YEAR = '2025/01/01 00:00:00 +0000'
+
+
+class ServerOwnerTestCase(unittest.TestCase):
+
+    def test_server_owner(self):
+        self.assertEqual(server_owner(None), None)
+        self.assertEqual(server_owner([
+            {'name': 'APP', 'value': 'text:web'},
+            {'name': 'EMAIL', 'value': 'text:kirk@example.com'},
+        ]), 'kirk@example.com')
+
+
+class InventoryTestCase(FakeAPITestCase):
+
+    fake_options = dict(deployments=2, servers=3)
+
+    def setUp(self):
+        super(InventoryTestCase, self).setUp()
+        righteous.create_and_start_server(
+            'kirk', 'm1.large',
+            server_template_parameters={'EMAIL': 'kirk@example.com'})
+        self.backdate()
+        self.inventory = Inventory()
+
+    def tearDown(self):
+        self.inventory.close()
+        super(InventoryTestCase, self).tearDown()
+
+    def backdate(self):
+        # timestamps of past seconds, so syncs are incremental
+        righteous.list_deployments()
+        for server in self.fake.servers.values():
+            server['updated_at'] = LAST_YEAR
+
+    def test_lookups(self):
+        stats = self.inventory.sync()
+        self.assertEqual(stats['servers'], dict(
+            added=7, updated=0, removed=0, errors=0))
+        self.assertEqual(stats['deployments']['added'], 2)
+        self.assertEqual(self.inventory.stats(), dict(
+            deployments=2, server_templates=2, servers=7))
+        self.assertTrue(self.inventory.synced_at)
+
+        kirk = self.inventory.server('kirk')
+        self.assertEqual(kirk['state'], 'operational')
+        self.assertEqual(kirk['settings']['ec2-instance-type'], 'm1.large')
+        self.assertEqual(self.inventory.server(href=kirk['href']), kirk)
+        self.assertEqual(self.inventory.server('spock'), None)
+        self.assertEqual(
+            self.inventory.servers(owner='kirk@example.com'), [kirk])
+        self.assertEqual(
+            self.inventory.servers(
+                instance_type='m1.large', owner='kirk@example.com'), [kirk])
+
+        servers = [
+            server for deployment in righteous.list_deployments()
+            for server in deployment['servers']]
+        for criteria in (dict(state='stopped'),
+                         dict(server_template_href=kirk[
+                             'server_template_href'])):
+            expected = sorted(
+                server['href'] for server in servers
+                if all(server[key] == value
+                       for key, value in criteria.items()))
+            self.assertTrue(expected)
+            self.assertEqual(
+                sorted(server['href']
+                       for server in self.inventory.servers(**criteria)),
+                expected)
+        self.assertRaises(ValueError, self.inventory.servers, size='large')
+
+        deployment = self.inventory.server_deployment('kirk')
+        self.assertEqual(deployment['href'], kirk['deployment_href'])
+        self.assertEqual(
+            self.inventory.deployment(deployment['nickname']), deployment)
+        self.assertEqual(
+            self.inventory.server_template(
+                href=kirk['server_template_href'])['href'],
+            kirk['server_template_href'])
+
+    def test_incremental_sync(self):
+        self.inventory.sync()
+        self.fake.reset_stats()
+        stats = self.inventory.sync()
+        self.assertEqual(stats['servers'], dict(
+            added=0, updated=0, removed=0, errors=0))
+        # only the templates and deployments are listed
+        self.assertEqual(self.fake.stats['requests'], 2)
+
+        kirk = self.inventory.server('kirk')
+        righteous.stop_server(kirk['href'])
+        stopped = self.inventory.servers(state='stopped')
+        righteous.delete_server(stopped[0]['href'])
+        self.fake.reset_stats()
+        stats = self.inventory.sync()
+        self.assertEqual(stats['servers'], dict(
+            added=0, updated=1, removed=1, errors=0))
+        self.assertEqual(self.fake.stats['requests'], 4)
+        self.assertEqual(self.inventory.server('kirk')['state'], 'stopped')
+
+    def test_servers_failing_are_retried(self):
+        self.inventory.client = FailingClient()
+        stats = self.inventory.sync()
+        self.assertEqual(stats['servers']['errors'], 7)
+        self.assertEqual(self.inventory.server('kirk')['settings'], None)
+
+        self.inventory.client = righteous
+        stats = self.inventory.sync()
+        self.assertEqual(stats['servers']['updated'], 7)
+        self.assertTrue(self.inventory.server('kirk')['settings'])
+
+    def test_indexed_servers_failing_keep_details(self):
+        self.inventory.sync()
+        kirk = self.inventory.server('kirk')
+        for server in self.fake.servers.values():
+            server['updated_at'] = '2025/06/01 00:00:00 +0000'
+
+        self.inventory.client = FailingClient()
+        stats = self.inventory.sync()
+        self.assertEqual(stats['servers']['errors'], 7)
+        self.assertEqual(self.inventory.server('kirk'), kirk)
+
+        self.inventory.client = righteous
+        stats = self.inventory.sync()
+        self.assertEqual(stats['servers']['updated'], 7)
+
+    def test_persistent(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'inventory.db')
+        with Inventory(path) as inventory:
+            inventory.sync()
+        with Inventory(path) as inventory:
+            self.assertEqual(inventory.stats()['servers'], 7)
+
+        # indexes of another schema version are rebuilt
+        database = sqlite3.connect(path)
+        database.execute('PRAGMA user_version = 0')
+        database.close()
+        with Inventory(path) as inventory:
+            self.assertEqual(inventory.stats()['servers'], 0)
+            self.assertEqual(inventory.synced_at, None)
+
+
+class FailingClient(object):
+    """
+    Lists resources but fails to query server details
+    """
+
+    def iter_server_templates(self):
+        return iter(righteous.list_server_templates())
+
+    def iter_deployments(self):
+        return iter(righteous.list_deployments())
+
+    def server_details(self, server_hrefs, jobs=None):
+        return [dict(href=href, info=None, settings=None, error=Exception())
+                for href in server_hrefs]
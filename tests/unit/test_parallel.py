@@ -0,0 +1,51 @@
+import threading
+import time
+from righteous.api.parallel import imap_concurrently, map_concurrently
+from righteous import config
+from .base import RighteousTestCase
+
+
+class ParallelTestCase(RighteousTestCase):
+
+    def test_map_preserves_order(self):
+        def slow_square(item):
+            time.sleep(0.01 * (5 - item))
+            return item * item
+
+        results = map_concurrently(slow_square, range(5), jobs=5)
+        self.assertEqual(
+            results, [(i, i * i, None) for i in range(5)])
+
+    def test_failures_do_not_abort(self):
+        def fail_on_two(item):
+            if item == 2:
+                raise ValueError('two')
+            return item
+
+        results = map_concurrently(fail_on_two, range(4))
+        self.assertEqual([r[1] for r in results], [0, 1, None, 3])
+        self.assertTrue(isinstance(results[2][2], ValueError))
+
+    def test_jobs_bound_concurrency(self):
+        lock = threading.Lock()
+        state = {'running': 0, 'peak': 0}
+
+        def track(item):
+            with lock:
+                state['running'] += 1
+                state['peak'] = max(state['peak'], state['running'])
+            time.sleep(0.01)
+            with lock:
+                state['running'] -= 1
+
+        map_concurrently(track, range(12), jobs=3)
+        self.assertTrue(state['peak'] <= 3)
+
+    def test_default_jobs_setting(self):
+        config.settings.concurrency = 1
+        results = list(imap_concurrently(str, [1, 2], ordered=False))
+        self.assertEqual(sorted(r[1] for r in results), ['1', '2'])
+        config.settings.concurrency = 10
+
+    def test_no_items(self):
+        self.assertEqual(map_concurrently(str, []), [])
@@ -0,0 +1,118 @@
+import pickle
+import six
+from datetime import datetime
+from righteous.api.resources import (
+    Server, ServerSettings, ServerTemplate, Deployment, parse_timestamp,
+    typed
+)
+import righteous
+from .base import FakeAPITestCase, unittest
+
+SERVER = {
+    'href': '/servers/1', 'nickname': 'kirk', 'state': 'operational',
+    'server_type': 'ec2', 'tags': [],
+    'created_at': '2012/01/06 16:35:09 +0000',
+    'updated_at': '2012/01/07 08:00:00 +0000', 'deployment_href': '/d/1',
+    'server_template_href': '/t/1', 'current_instance_href': None,
+    'parameters': None,
+}
+
+
+class ResourceTestCase(unittest.TestCase):
+
+    def test_fields(self):
+        server = Server.from_json(SERVER)
+        self.assertEqual(server.nickname, 'kirk')
+        self.assertEqual(server['href'], '/servers/1')
+        self.assertEqual(server.get('missing', 'default'), 'default')
+        self.assertRaises(KeyError, lambda: server['missing'])
+        self.assertRaises(AttributeError, setattr, server, 'missing', 1)
+        self.assertFalse(hasattr(server, '__dict__'))
+
+    def test_lazy_timestamps(self):
+        server = Server.from_json(SERVER)
+        self.assertEqual(server._created_at, SERVER['created_at'])
+        self.assertEqual(server.created_at, datetime(2012, 1, 6, 16, 35, 9))
+        self.assertTrue(isinstance(server._created_at, datetime))
+        # the JSON value keeps the API format
+        self.assertEqual(server['created_at'], SERVER['created_at'])
+        self.assertEqual(parse_timestamp('yesterday'), 'yesterday')
+        self.assertEqual(parse_timestamp(None), None)
+
+    @unittest.skipIf(six.PY2, 'unicode strings are not interned')
+    def test_interned_states(self):
+        states = [''.join(['opera', 'tional']), ''.join(['operat', 'ional'])]
+        self.assertFalse(states[0] is states[1])
+        servers = [
+            Server.from_json(dict(SERVER, state=state)) for state in states]
+        self.assertTrue(servers[0].state is servers[1].state)
+
+    def test_round_trip(self):
+        server = Server.from_json(dict(SERVER, cloud='ec2'))
+        server.created_at
+        self.assertEqual(server.extra, {'cloud': 'ec2'})
+        self.assertEqual(server.to_dict(), dict(SERVER, cloud='ec2'))
+        self.assertEqual(server, Server.from_json(server.to_dict()))
+        self.assertNotEqual(server, Server.from_json(SERVER))
+        # fields missing from the response are not added
+        listed = Server.from_json({'href': '/servers/1'})
+        self.assertEqual(listed.parameters, None)
+        self.assertRaises(KeyError, lambda: listed['parameters'])
+        self.assertEqual(listed.to_dict(), {'href': '/servers/1'})
+        self.assertEqual(pickle.loads(pickle.dumps(server, 2)), server)
+
+    def test_settings_keys(self):
+        settings = ServerSettings.from_json(
+            {'ec2-instance-type': 'm1.small', 'aws-id': 'i-1'})
+        self.assertEqual(settings.ec2_instance_type, 'm1.small')
+        self.assertEqual(settings['ec2-instance-type'], 'm1.small')
+        self.assertEqual(settings.dns_name, None)
+
+    def test_deployment_servers(self):
+        deployment = Deployment.from_json(
+            {'href': '/d/1', 'nickname': 'prod', 'servers': [SERVER]})
+        self.assertEqual(deployment.servers, [Server.from_json(SERVER)])
+        self.assertEqual(deployment.to_dict()['servers'], [SERVER])
+
+    def test_typed(self):
+        self.assertEqual(typed(ServerTemplate, None), None)
+        self.assertEqual(
+            typed(ServerTemplate, [{'nickname': 'base'}])[0].nickname, 'base')
+        self.assertEqual(typed(Server, SERVER), Server.from_json(SERVER))
+
+
+class TypedApiTestCase(FakeAPITestCase):
+    fake_options = dict(servers=3)
+
+    def test_typed_results_match_dicts(self):
+        deployment = righteous.list_servers(typed=True)
+        self.assertEqual(deployment.to_dict(), righteous.list_servers())
+        self.assertEqual(
+            [server.to_dict() for server in righteous.iter_servers(
+                typed=True)],
+            righteous.list_servers()['servers'])
+
+        href = deployment.servers[0].href
+        server = righteous.server_info(href, typed=True)
+        self.assertTrue(isinstance(server, Server))
+        self.assertEqual(server.to_dict(), righteous.server_info(href))
+        self.assertEqual(
+            righteous.server_settings(href, typed=True).to_dict(),
+            righteous.server_settings(href))
+
+        for function in (righteous.list_deployments,
+                         righteous.iter_deployments,
+                         righteous.list_server_templates,
+                         righteous.iter_server_templates):
+            self.assertEqual(
+                [record.to_dict() for record in function(typed=True)],
+                list(function()))
+
+        template = righteous.list_server_templates()[0]
+        self.assertEqual(
+            righteous.server_template_info(
+                template['href'], typed=True).to_dict(),
+            righteous.server_template_info(template['href']))
+        self.assertEqual(
+            righteous.deployment_info(deployment.href, typed=True).nickname,
+            deployment.nickname)
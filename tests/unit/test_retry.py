@@ -0,0 +1,141 @@
+import requests
+from mock import patch
+from righteous import config
+from righteous.api.retry import TokenBucket, RetryCounter, retry_after
+import righteous
+from .base import RighteousTestCase, response, unittest
+
+
+class RetryTestCase(RighteousTestCase):
+
+    def setUp(self):
+        self.initialise_settings()
+        righteous.initialise('user', 'pass', 'account_id')
+        config.settings.retry_counter = None
+        self.session_patcher = patch('righteous.api.base._session')
+        self.session = self.session_patcher.start().return_value
+        self.sleep_patcher = patch('righteous.api.base.time.sleep')
+        self.sleep = self.sleep_patcher.start()
+
+    def tearDown(self):
+        self.session_patcher.stop()
+        self.sleep_patcher.stop()
+        config.settings.retries = {'GET': 3, 'DELETE': 3, 'PUT': 0, 'POST': 0}
+
+    def test_retry_server_errors(self):
+        self.session.request.side_effect = [
+            response(503), response(500), response(200)]
+        self.assertEqual(
+            righteous.api.base._request('/test').status_code, 200)
+        self.assertEqual(self.session.request.call_count, 3)
+        self.assertEqual(righteous.retry_stats(), dict(
+            retries=2, methods={'GET': 2}, reasons={503: 1, 500: 1}))
+
+    def test_retry_connection_errors(self):
+        self.session.request.side_effect = [
+            requests.exceptions.ConnectionError('reset'), response(200)]
+        righteous.api.base._request('/test', method='DELETE')
+        self.assertEqual(
+            righteous.retry_stats()['reasons'], {'ConnectionError': 1})
+
+    def test_retries_exhausted(self):
+        self.session.request.return_value = response(502)
+        self.assertEqual(
+            righteous.api.base._request('/test').status_code, 502)
+        self.assertEqual(self.session.request.call_count, 4)
+
+    def test_post_not_retried_by_default(self):
+        self.session.request.side_effect = [
+            requests.exceptions.ConnectionError('reset')]
+        self.assertRaises(
+            requests.exceptions.ConnectionError, righteous.api.base._request,
+            '/servers', method='POST')
+
+    def test_post_opt_in(self):
+        config.settings.retries = {'POST': 1}
+        self.session.request.side_effect = [response(429), response(201)]
+        self.assertEqual(righteous.api.base._request(
+            '/servers', method='POST').status_code, 201)
+
+    def test_partial_override(self):
+        righteous.initialise('user', 'pass', 'account_id', retries={'POST': 1})
+        self.session.request.side_effect = [
+            response(503), response(503), response(503), response(200)]
+        self.assertEqual(
+            righteous.api.base._request('/test').status_code, 200)
+        self.session.request.side_effect = [
+            requests.exceptions.ConnectionError('reset')]
+        self.assertRaises(
+            requests.exceptions.ConnectionError, righteous.api.base._request,
+            '/servers', method='PUT')
+
+    def test_retry_after(self):
+        self.session.request.side_effect = [
+            response(429, headers={'retry-after': '7'}), response(200)]
+        righteous.api.base._request('/test')
+        self.sleep.assert_called_once_with(7.0)
+
+    def test_backoff(self):
+        self.session.request.side_effect = [
+            response(500), response(500), response(500), response(200)]
+        righteous.api.base._request('/test')
+        delays = [c[0][0] for c in self.sleep.call_args_list]
+        self.assertTrue(0.25 <= delays[0] <= 0.5)
+        self.assertTrue(0.5 <= delays[1] <= 1)
+        self.assertTrue(1 <= delays[2] <= 2)
+
+    def test_rate_limit(self):
+        config.settings.rate_limit = 5
+        self.session.request.return_value = response(200)
+        with patch('righteous.api.base.TokenBucket') as bucket:
+            righteous.api.base._request('/test')
+            righteous.api.base._request('/test')
+            bucket.assert_called_once_with(5, None)
+            self.assertEqual(bucket.return_value.acquire.call_count, 2)
+        config.settings.rate_limit = None
+        config.settings.rate_limiter = None
+
+
+class TokenBucketTestCase(unittest.TestCase):
+
+    @patch('righteous.api.retry.time')
+    def test_acquire(self, mock_time):
+        clock = [0.0]
+        mock_time.time.side_effect = lambda: clock[0]
+
+        def sleep(seconds):
+            clock[0] += seconds
+        mock_time.sleep.side_effect = sleep
+
+        bucket = TokenBucket(2, capacity=2)
+        for _ in range(4):
+            bucket.acquire()
+        self.assertAlmostEqual(clock[0], 1.0)
+
+    @patch('righteous.api.retry.time')
+    def test_reserve(self, mock_time):
+        mock_time.time.return_value = 0.0
+        bucket = TokenBucket(2, capacity=2)
+        waits = [bucket.reserve() for _ in range(4)]
+        self.assertEqual(waits, [0.0, 0.0, 0.5, 1.0])
+
+        # reserved tokens delay blocking callers too
+        mock_time.time.return_value = 0.5
+        mock_time.sleep.side_effect = lambda seconds: setattr(
+            mock_time.time, 'return_value', 0.5 + seconds)
+        bucket.acquire()
+        self.assertEqual(mock_time.time.return_value, 1.5)
+
+
+class RetryHelpersTestCase(unittest.TestCase):
+
+    def test_retry_after(self):
+        self.assertEqual(retry_after('12'), 12.0)
+        self.assertEqual(retry_after(None), None)
+        self.assertEqual(retry_after('Thu, 01 Jan 1970 00:00:00 GMT'), 0.0)
+
+    def test_counter_reset(self):
+        counter = RetryCounter()
+        counter.increment('GET', 500)
+        counter.reset()
+        self.assertEqual(counter.stats()['retries'], 0)
@@ -1,5 +1,8 @@
+import json
+import requests
+from mock import patch, Mock
 from righteous.compat import urlencode
-from .base import ApiTestCase
+from .base import ApiTestCase, FakeAPITestCase
 import righteous
 from righteous.config import account_url
 
@@ -20,6 +23,46 @@ class ServerTestCase(ApiTestCase):
         righteous.list_servers()
         self.request.assert_called_once_with('/deployments/foo.js')
 
+    def test_iter_servers(self):
+        righteous.init(
+            'user', 'pass', 'account_id', default_deployment_id='foo')
+        self.response.iter_content.return_value = [
+            b'{"nickname": "foo", "servers": [{"href": "/servers/1"},',
+            b' {"href": "/servers/2"}], "href": "/deployments/foo"}']
+        servers = righteous.iter_servers()
+        self.request.assert_called_once_with(
+            '/deployments/foo.js', stream=True)
+        self.assertEqual(
+            list(servers), [{'href': '/servers/1'}, {'href': '/servers/2'}])
+        self.response.close.assert_called_once_with()
+
+    def test_list_servers_filtered(self):
+        self.response.content = json.dumps({'nickname': 'foo', 'servers': [
+            {'nickname': 'web-1', 'state': 'operational', 'href': '/s/1'},
+            {'nickname': 'web-2', 'state': 'stopped', 'href': '/s/2'},
+            {'nickname': 'db-web', 'state': 'operational', 'href': '/s/3'},
+        ]})
+        deployment = righteous.list_servers(
+            'foo', filters={'nickname': 'web-*', 'state': 'operational'},
+            fields=['href'])
+        # deployments are not filtered by the API
+        self.request.assert_called_once_with('/deployments/foo.js')
+        self.assertEqual(deployment['nickname'], 'foo')
+        self.assertEqual(deployment['servers'], [{'href': '/s/1'}])
+
+    def test_iter_servers_filtered(self):
+        self.response.iter_content.return_value = [json.dumps({'servers': [
+            {'nickname': 'web-1', 'state': 'operational'},
+            {'nickname': 'web-2', 'state': 'stopped'},
+        ]}).encode('ascii')]
+        self.assertEqual(
+            list(righteous.iter_servers(
+                'foo', filters={'state': 'stop'}, fields=['nickname'])),
+            [{'nickname': 'web-2'}])
+
+    def test_iter_servers_unconfigured(self):
+        self.assertRaises(Exception, righteous.iter_servers)
+
     def test_find_server_no_result(self):
         self.response.content = '[]'
         server = righteous.find_server('aldous')
@@ -39,6 +82,165 @@ class ServerTestCase(ApiTestCase):
         response = righteous.server_settings('/server/ref')
         self.assertEqual(response, {})
 
+    def test_server_details(self):
+        self.response.content = '{"state": "operational"}'
+        details = righteous.server_details(['/server/a', '/server/b'])
+        self.assertEqual(
+            [d['href'] for d in details], ['/server/a', '/server/b'])
+        self.assertEqual(details[0]['info'], {'state': 'operational'})
+        self.assertEqual(details[1]['settings'], {'state': 'operational'})
+        self.assertEqual(self.request.call_count, 4)
+        self.request.assert_any_call(
+            '/server/b/settings.js', prepend_api_base=False)
+
+    def test_server_details_failure(self):
+        self.response.content = '{}'
+
+        def failing_settings(server_href):
+            if server_href == '/server/a':
+                raise Exception('boom')
+            return {}
+
+        with patch('righteous.api.server.server_settings', failing_settings):
+            details = righteous.server_details(['/server/a', '/server/b'])
+        self.assertEqual(str(details[0]['error']), 'boom')
+        self.assertEqual(details[0]['info'], {})
+        self.assertEqual(details[1]['error'], None)
+
+    def find_server_responses(self, *nicknames):
+        """
+        Answers nickname lookups of the servers of nicknames, and other
+        requests with `self.response`
+        """
+        def request(path, **kwargs):
+            if not path.startswith('/servers.js?filter=nickname='):
+                return self.response
+            nickname = path.split('=')[-1]
+            servers = [{'nickname': nickname, 'href': '/server/' + nickname}]
+            return Mock(
+                spec=requests.Response, status_code=200, headers={},
+                content=json.dumps(servers if nickname in nicknames else []))
+        self.request.side_effect = request
+
+    def test_find_servers(self):
+        self.find_server_responses('spock')
+        servers = righteous.find_servers(['spock', 'sulu'])
+        self.request.assert_any_call('/servers.js?filter=nickname=spock')
+        self.request.assert_any_call('/servers.js?filter=nickname=sulu')
+        self.assertEqual(self.request.call_count, 2)
+        self.assertEqual(servers, {
+            'spock': {'nickname': 'spock', 'href': '/server/spock'}})
+
+    @patch('righteous.api.server.NICKNAME_LOOKUPS', 1)
+    def test_find_servers_listing(self):
+        self.response.iter_content.return_value = [json.dumps([
+            {'nickname': 'kirk', 'href': '/server/kirk'},
+            {'nickname': 'spock', 'href': '/server/spock'},
+            {'nickname': 'sulu', 'href': '/server/sulu'},
+        ]).encode('ascii')]
+        servers = righteous.find_servers(['kirk', 'spock'])
+        self.request.assert_called_once_with('/servers.js', stream=True)
+        self.assertEqual(sorted(servers), ['kirk', 'spock'])
+        # the listing is no longer read once all the servers are found
+        self.response.close.assert_called_once_with()
+
+    def test_find_servers_in_deployment(self):
+        self.response.iter_content.return_value = [json.dumps({'servers': [
+            {'nickname': 'kirk', 'href': '/server/kirk'},
+            {'nickname': 'spock', 'href': '/server/spock'},
+        ]}).encode('ascii')]
+        servers = righteous.find_servers(['kirk', 'sulu'], deployment_id='1')
+        self.request.assert_called_once_with('/deployments/1.js', stream=True)
+        self.assertEqual(servers, {
+            'kirk': {'nickname': 'kirk', 'href': '/server/kirk'}})
+        self.assertEqual(
+            righteous.api.base._lookup_cache().get('server', 'kirk'),
+            '/server/kirk')
+
+    def test_stop_servers(self):
+        self.response.status_code = 201
+        results = righteous.stop_servers(['/server/a', '/server/b'])
+        self.assertEqual(sorted(results.keys()), ['/server/a', '/server/b'])
+        assert results['/server/a']['success']
+        self.assertEqual(results['/server/b']['status_code'], 201)
+        self.request.assert_any_call(
+            '/server/b/stop', method='POST', prepend_api_base=False)
+
+    def test_start_servers_by_nickname(self):
+        self.response.status_code = 201
+        self.response.headers['location'] = '/instance/new'
+        self.find_server_responses('kirk')
+        results = righteous.start_servers(nicknames=['kirk', 'sulu'])
+
+        self.assertEqual(self.request.call_count, 3)
+        self.request.assert_any_call('/servers.js?filter=nickname=kirk')
+        self.request.assert_any_call(
+            '/server/kirk/start', method='POST', prepend_api_base=False)
+        self.assertEqual(results['kirk']['href'], '/server/kirk')
+        self.assertEqual(results['kirk']['location'], '/instance/new')
+        assert not results['sulu']['success']
+        assert results['sulu']['error']
+
+    def test_delete_servers(self):
+        self.request.side_effect = [self.response, Exception('timeout')]
+        results = righteous.delete_servers(['/server/a', '/server/b'], jobs=1)
+        assert results['/server/a']['success']
+        assert not results['/server/b']['success']
+        self.assertEqual(str(results['/server/b']['error']), 'timeout')
+        self.request.assert_any_call(
+            '/server/a', method='DELETE', prepend_api_base=False)
+
+    def deployment_response(self, **states):
+        return Mock(spec=requests.Response, content=json.dumps({'servers': [
+            {'href': '/server/%s' % name, 'state': state}
+            for name, state in states.items()]}))
+
+    @patch('righteous.api.server.time')
+    def test_wait_for_state(self, mock_time):
+        mock_time.time.return_value = 0
+        righteous.init(
+            'user', 'pass', 'account_id', default_deployment_id='foo')
+        self.request.side_effect = [
+            self.deployment_response(a='pending', b='booting'),
+            self.deployment_response(a='operational', b='booting'),
+            self.deployment_response(a='operational', b='operational'),
+        ]
+
+        results = list(righteous.wait_for_state(
+            ['/server/a', '/server/b'], 'operational', interval=4))
+        self.assertEqual(
+            results, [('/server/a', 'operational'),
+                      ('/server/b', 'operational')])
+        self.assertEqual(self.request.call_count, 3)
+        self.request.assert_called_with('/deployments/foo.js')
+
+        # exponential backoff with jitter
+        delays = [c[0][0] for c in mock_time.sleep.call_args_list]
+        self.assertTrue(2 <= delays[0] <= 4)
+        self.assertTrue(4 <= delays[1] <= 8)
+
+    @patch('righteous.api.server.time')
+    def test_wait_for_state_outside_deployment(self, mock_time):
+        mock_time.time.return_value = 0
+        self.response.content = json.dumps({'state': 'stopped'})
+
+        results = list(righteous.wait_for_state(
+            ['/server/a'], ['stopped', 'terminated']))
+        self.assertEqual(results, [('/server/a', 'stopped')])
+        self.request.assert_called_once_with(
+            '/server/a.js', prepend_api_base=False)
+        assert not mock_time.sleep.called
+
+    @patch('righteous.api.server.time')
+    def test_wait_for_state_timeout(self, mock_time):
+        mock_time.time.side_effect = [0, 5, 11]
+        self.response.content = json.dumps({'state': 'pending'})
+
+        results = list(righteous.wait_for_state(
+            ['/server/a'], 'operational', timeout=10, interval=1))
+        self.assertEqual(results, [('/server/a', None)])
+        self.assertEqual(self.request.call_count, 2)
+
     def test_start_server(self):
         self.response.content = '{}'
         righteous.start_server('/server/ref')
@@ -157,3 +359,87 @@ class ServerTestCase(ApiTestCase):
         # start server
         self.request.assert_any_call(
             new_server_href + '/start', method='POST', prepend_api_base=False)
+
+
+class FleetTestCase(FakeAPITestCase):
+    fake_options = dict(servers=0)
+
+    def test_find_servers_exact_nicknames(self):
+        for nickname in ('web-10', 'web-1'):
+            righteous.create_server(nickname, 'm1.small')
+        hrefs = dict((server['nickname'], server['href'])
+                     for server in righteous.list_servers()['servers'])
+        for lookups in (8, 0):
+            righteous.config.settings.lookup_cache = None
+            with patch('righteous.api.server.NICKNAME_LOOKUPS', lookups):
+                servers = righteous.find_servers(['web-1', 'web'])
+            self.assertEqual(list(servers), ['web-1'])
+            self.assertEqual(servers['web-1']['href'], hrefs['web-1'])
+            self.assertEqual(
+                righteous.api.base._lookup_cache().get('server', 'web-1'),
+                hrefs['web-1'])
+
+        results = righteous.delete_servers(nicknames=['web-1'])
+        self.assertEqual(results['web-1']['href'], hrefs['web-1'])
+        self.assertEqual(
+            [server['nickname']
+             for server in righteous.list_servers()['servers']], ['web-10'])
+
+    def test_create_and_start_servers(self):
+        specs = [
+            dict(nickname='web-%d' % index, instance_type='m1.small',
+                 server_template_parameters={'envname': 'web-%d' % index})
+            for index in range(4)]
+        results = righteous.create_and_start_servers(specs, jobs=2, wait=True)
+
+        self.assertEqual([result['nickname'] for result in results],
+                         ['web-0', 'web-1', 'web-2', 'web-3'])
+        for result in results:
+            self.assertTrue(result['success'])
+            self.assertEqual(result['stage'], 'wait')
+            self.assertEqual(result['state'], 'operational')
+            self.assertTrue(result['location'])
+            info = righteous.server_info(result['href'])
+            self.assertEqual(info['nickname'], result['nickname'])
+            self.assertEqual(info['parameters'], [
+                {'name': 'ENVNAME', 'value': 'text:' + result['nickname']}])
+
+    def test_create_and_start_servers_rollback(self):
+        set_server_parameters = righteous.set_server_parameters
+
+        def failing_parameters(server_href, parameters):
+            if parameters.get('fail'):
+                raise Exception('parameters rejected')
+            return set_server_parameters(server_href, parameters)
+
+        specs = [
+            dict(nickname='kirk', instance_type='m1.small'),
+            dict(nickname='spock', server_template_parameters={'fail': 1}),
+            dict(nickname='bones', instance_type='t1.micro'),
+        ]
+        with patch('righteous.api.server.set_server_parameters',
+                   failing_parameters):
+            results = righteous.create_and_start_servers(
+                specs, rollback=True)
+
+        kirk, spock, bones = results
+        self.assertTrue(kirk['success'])
+        self.assertEqual((kirk['stage'], kirk['state']), ('start', 'pending'))
+        self.assertEqual(spock['stage'], 'parameters')
+        self.assertEqual(str(spock['error']), 'parameters rejected')
+        self.assertTrue(spock['rolled_back'])
+        self.assertEqual(righteous.find_server('spock'), None)
+        self.assertEqual((bones['stage'], bones['href']), ('create', None))
+        self.assertFalse(bones['rolled_back'])
+        self.assertEqual(
+            [server['nickname'] for server in self.fake.servers.values()],
+            ['kirk'])
+
+    def test_create_and_start_servers_wait_timeout(self):
+        self.fake.boot_time = 60
+        results = righteous.create_and_start_servers(
+            [dict(nickname='kirk')], wait=True, timeout=0)
+        self.assertFalse(results[0]['success'])
+        self.assertEqual(results[0]['stage'], 'wait')
+        self.assertEqual(results[0]['state'], None)
+        self.assertTrue(results[0]['href'])
@@ -16,6 +16,20 @@ class ServerTemplateTestCase(ApiTestCase):
         righteous.list_server_templates()
         self.request.assert_called_once_with('/server_templates.js')
 
+    def test_list_server_templates_filtered(self):
+        self.response.content = '[]'
+        righteous.list_server_templates(
+            filters=[('nickname', 'base'), ('description', 'ubuntu')])
+        self.request.assert_called_once_with(
+            '/server_templates.js?filter[]=nickname=base&'
+            'filter[]=description=ubuntu')
+
+    def test_iter_server_templates(self):
+        self.response.iter_content.return_value = [b'[]']
+        self.assertEqual(list(righteous.iter_server_templates()), [])
+        self.request.assert_called_once_with(
+            '/server_templates.js', stream=True)
+
     def test_server_template_info(self):
         template_href = account_url + 'account_id/ec2_server_templates/111'
         server_template = [{
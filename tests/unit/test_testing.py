@@ -0,0 +1,76 @@
+from righteous import config
+from righteous.api.cache import MemoryResponseCache
+import righteous
+from .base import FakeAPITestCase
+
+
+class FakeRightScaleTestCase(FakeAPITestCase):
+    fake_options = dict(servers=5)
+    login = False
+
+    def test_initialise_restores_account_url(self):
+        self.assertEqual(config.account_url, self.fake.url)
+        self.fake.stop()
+        self.assertEqual(
+            config.account_url, 'https://my.rightscale.com/api/acct/')
+
+    def test_login_required(self):
+        self.assertEqual(
+            righteous.api.base._request('/servers.js').status_code, 401)
+        self.assertTrue(righteous.login())
+        self.assertEqual(len(righteous.list_servers()['servers']), 5)
+
+    def test_invalid_credentials(self):
+        righteous.initialise('user@example.com', 'wrong', '1234')
+        self.assertFalse(righteous.login())
+
+    def test_server_lifecycle(self):
+        righteous.login()
+        successful, _ = righteous.create_and_start_server(
+            'new-server', 'm1.small')
+        self.assertTrue(successful)
+        location = righteous.find_server('new-server')['href']
+        self.assertEqual(righteous.server_info(location)['state'],
+                         'operational')
+        self.assertFalse(righteous.delete_server(location))
+        self.assertTrue(righteous.stop_server(location))
+        self.assertTrue(righteous.delete_server(location))
+        self.assertEqual(len(righteous.list_servers()['servers']), 5)
+
+    def test_stats(self):
+        righteous.login()
+        self.fake.reset_stats()
+        righteous.list_servers()
+        righteous.list_deployments()
+        self.assertEqual(self.fake.stats['requests'], 2)
+        self.assertTrue(self.fake.stats['bytes_sent'] > 0)
+        self.assertEqual(sorted(self.fake.stats['routes']),
+                         ['deployment', 'list_deployments'])
+
+    def test_error_injection_is_retried(self):
+        righteous.login()
+        self.fake.error_rate = 0.5
+        config.settings.retries = {'GET': 20, 'DELETE': 3, 'PUT': 0,
+                                   'POST': 0}
+        try:
+            for _ in range(5):
+                self.assertEqual(len(righteous.list_servers()['servers']), 5)
+        finally:
+            config.settings.retries = {'GET': 3, 'DELETE': 3, 'PUT': 0,
+                                       'POST': 0}
+        self.assertTrue(self.fake.stats['errors'] > 0)
+
+    def test_expired_session_relogin(self):
+        righteous.login()
+        self.fake.sessions.clear()
+        self.assertEqual(len(righteous.list_servers()['servers']), 5)
+        self.assertEqual(self.fake.stats['routes']['login'], 2)
+
+    def test_conditional_get(self):
+        config.settings.response_cache = MemoryResponseCache()
+        righteous.login()
+        first = righteous.list_servers()
+        self.fake.reset_stats()
+        self.assertEqual(righteous.list_servers(), first)
+        self.assertEqual(self.fake.stats['routes'], {'deployment': 1})
+        self.assertTrue(self.fake.stats['bytes_sent'] < 100)
@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+import time
+from righteous.util import (
+    read_authentication, cache_authentication, read_session, cache_session
+)
+from .base import unittest
+
+
+class SessionCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.auth_file = os.path.join(self.directory, 'righteous')
+        cache_authentication('user', 'pass', '123', self.auth_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_no_session(self):
+        config = read_authentication(self.auth_file)
+        self.assertEqual(read_session(config), (None, None))
+
+    def test_cache_session(self):
+        expires = time.time() + 3600
+        cache_session('_session_id=a%2Fb; path=/', expires, 'user', '123',
+                      self.auth_file)
+
+        config = read_authentication(self.auth_file)
+        self.assertEqual(config.get('auth', 'username'), 'user')
+        cookie, cached_expires = read_session(config)
+        self.assertEqual(cookie, '_session_id=a%2Fb; path=/')
+        self.assertEqual(int(cached_expires), int(expires))
+
+    def test_session_without_expiry(self):
+        cache_session('_session_id=abc', None, 'user', '123', self.auth_file)
+        config = read_authentication(self.auth_file)
+        self.assertEqual(read_session(config), ('_session_id=abc', None))
+
+    def test_expired_session(self):
+        cache_session(
+            '_session_id=abc', time.time() + 5, 'user', '123', self.auth_file)
+        config = read_authentication(self.auth_file)
+        self.assertEqual(read_session(config), (None, None))
+
+    def test_session_of_other_account(self):
+        cache_session('_session_id=abc', None, 'user', '123', self.auth_file)
+        cache_authentication('user', 'pass', '456', self.auth_file)
+        config = read_authentication(self.auth_file)
+        self.assertEqual(read_session(config), (None, None))
+
+    def test_malformed_session(self):
+        for session in ('cookie = abc\n', 'expires = soon\ncookie = abc\n',
+                        'cookie = 100%\nexpires =\nusername = user\n'
+                        'account_id = 123\n'):
+            with open(self.auth_file, 'w') as config_file:
+                config_file.write(
+                    '[auth]\nusername = user\npassword = pass\n'
+                    'account_id = 123\n\n[session]\n' + session)
+            config = read_authentication(self.auth_file)
+            self.assertEqual(read_session(config), (None, None))